@@ -0,0 +1,292 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+import abc
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import time
+from urllib.parse import urlparse
+from django.conf import settings
+from restclients_core.dao import LiveDAO
+from restclients_core.models import MockHTTP
+from data_aggregator.ratelimit import RateLimitedCanvasLiveDAO
+
+
+# number of canvas api requests made by this process and any worker
+# processes forked from it
+_api_call_count = multiprocessing.get_context("fork").Value("q", 0)
+
+
+def get_replay_setting(name, default):
+    return getattr(settings, f"DATA_AGGREGATOR_CANVAS_REPLAY_{name}",
+                   default)
+
+
+def get_api_call_count():
+    """
+    Return the number of canvas api requests made through the recording,
+    replay and synthetic canvas DAO implementations.
+    """
+    return _api_call_count.value
+
+
+def _count_api_call():
+    with _api_call_count.get_lock():
+        _api_call_count.value += 1
+
+
+def get_recording_path(method, url):
+    """
+    Return the path of the file a canvas response is recorded to.
+
+    :param method: http method of the request
+    :type method: str
+    :param url: url of the request, including the query string
+    :type url: str
+    """
+    key = hashlib.sha1(f"{method} {url}".encode("utf-8")).hexdigest()
+    return os.path.join(get_replay_setting("DIR", "canvas_recordings"),
+                        method.lower(), f"{key}.json")
+
+
+def get_response(status, data=b"", headers=None):
+    response = MockHTTP()
+    response.status = status
+    response.data = data
+    response.headers = headers or {}
+    return response
+
+
+class RecordingCanvasLiveDAO(LiveDAO):
+    """
+    Live canvas DAO implementation that records every response to a file in
+    the DATA_AGGREGATOR_CANVAS_REPLAY_DIR directory so that it can be
+    replayed by ReplayCanvasDAO. Enable by setting
+    RESTCLIENTS_CANVAS_DAO_CLASS to
+    'data_aggregator.canvas_replay.RecordingCanvasLiveDAO'.
+    """
+
+    def load(self, method, url, headers, body):
+        _count_api_call()
+        response = super().load(method, url, headers, body)
+        data = response.data or b""
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        path = get_recording_path(method, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"method": method,
+                       "url": url,
+                       "status": response.status,
+                       "headers": dict(response.headers),
+                       "data": data}, f)
+        return response
+
+
+class RateLimitedRecordingCanvasLiveDAO(RecordingCanvasLiveDAO,
+                                        RateLimitedCanvasLiveDAO):
+    """
+    RecordingCanvasLiveDAO that paces the recorded requests with the
+    process rate limiter. Enable by setting RESTCLIENTS_CANVAS_DAO_CLASS to
+    'data_aggregator.canvas_replay.RateLimitedRecordingCanvasLiveDAO'.
+    """
+
+
+class SimulatedCanvasDAO(LiveDAO, metaclass=abc.ABCMeta):
+    """
+    Base canvas DAO implementation for answering canvas requests without
+    making them. Every request is delayed by DATA_AGGREGATOR_CANVAS_REPLAY_
+    LATENCY seconds and fails with a server error or a rate limit error at
+    the DATA_AGGREGATOR_CANVAS_REPLAY_ERROR_RATE and
+    DATA_AGGREGATOR_CANVAS_REPLAY_THROTTLE_RATE probabilities.
+    """
+
+    def load(self, method, url, headers, body):
+        _count_api_call()
+        latency = get_replay_setting("LATENCY", 0.0)
+        if latency:
+            time.sleep(latency)
+        rand = random.random()
+        error_rate = get_replay_setting("ERROR_RATE", 0.0)
+        if rand < error_rate:
+            return get_response(500, b"500 Internal Server Error (Injected)")
+        if rand < error_rate + get_replay_setting("THROTTLE_RATE", 0.0):
+            return get_response(403, b"403 Forbidden (Rate Limit Exceeded)")
+        return self.get_response(method, url)
+
+    @abc.abstractmethod
+    def get_response(self, method, url):
+        """
+        Return the MockHTTP response for a request that wasn't failed.
+        """
+
+
+class ReplayCanvasDAO(SimulatedCanvasDAO):
+    """
+    Canvas DAO implementation that replays the responses recorded by
+    RecordingCanvasLiveDAO. Requests that weren't recorded return a 404.
+    Enable by setting RESTCLIENTS_CANVAS_DAO_CLASS to
+    'data_aggregator.canvas_replay.ReplayCanvasDAO'.
+    """
+
+    def get_response(self, method, url):
+        path = get_recording_path(method, url)
+        if not os.path.exists(path):
+            return get_response(404, b"Not recorded")
+        with open(path) as f:
+            recording = json.load(f)
+        return get_response(recording["status"],
+                            recording["data"].encode("utf-8"),
+                            recording["headers"])
+
+
+class SyntheticCanvasDAO(SimulatedCanvasDAO):
+    """
+    Canvas DAO implementation that generates enrollment, assignment analytic
+    and participation analytic responses for the courses registered with
+    register_course. Generated analytics are the same for every request so
+    that repeated runs save identical rows. Enable by setting
+    RESTCLIENTS_CANVAS_DAO_CLASS to
+    'data_aggregator.canvas_replay.SyntheticCanvasDAO'.
+    """
+
+    # canvas_course_id -> (student ids, number of assignments)
+    courses = {}
+
+    ENROLLMENTS_PATH = re.compile(r"^/api/v1/courses/(\d+)/enrollments$")
+    ASSIGNMENTS_PATH = re.compile(
+        r"^/api/v1/courses/(\d+)/analytics/users/(\d+)/assignments$")
+    SUMMARIES_PATH = re.compile(
+        r"^/api/v1/courses/(\d+)/analytics/student_summaries$")
+
+    @classmethod
+    def register_course(cls, canvas_course_id, student_ids, num_assignments):
+        """
+        Register a synthetic course to generate responses for.
+
+        :param canvas_course_id: canvas course id of the course
+        :type canvas_course_id: int
+        :param student_ids: canvas user ids of the students in the course
+        :type student_ids: list
+        :param num_assignments: number of assignments in the course
+        :type num_assignments: int
+        """
+        cls.courses[int(canvas_course_id)] = (list(student_ids),
+                                              num_assignments)
+
+    @classmethod
+    def clear_courses(cls):
+        cls.courses.clear()
+
+    def get_response(self, method, url):
+        path = urlparse(url).path
+        match = self.ENROLLMENTS_PATH.match(path)
+        if match:
+            data = self.get_enrollments(int(match.group(1)))
+        else:
+            match = self.ASSIGNMENTS_PATH.match(path)
+            if match:
+                data = self.get_assignments(int(match.group(1)),
+                                            int(match.group(2)))
+            else:
+                match = self.SUMMARIES_PATH.match(path)
+                data = (self.get_student_summaries(int(match.group(1)))
+                        if match else None)
+        if data is None:
+            return get_response(404, b"Not found")
+        return get_response(200, json.dumps(data).encode("utf-8"),
+                            {"Content-Type": "application/json"})
+
+    def get_enrollments(self, canvas_course_id):
+        if canvas_course_id not in self.courses:
+            return None
+        student_ids, _ = self.courses[canvas_course_id]
+        return [{
+            "id": canvas_course_id * 100000 + i,
+            "course_id": canvas_course_id,
+            "course_section_id": canvas_course_id,
+            "sis_course_id": None,
+            "sis_section_id": None,
+            "sis_user_id": None,
+            "role": "StudentEnrollment",
+            "type": "StudentEnrollment",
+            "enrollment_state": "active",
+            "html_url": "",
+            "total_activity_time": 0,
+            "last_activity_at": None,
+            "limit_privileges_to_course_section": False,
+            "user_id": student_id,
+            "user": {"id": student_id,
+                     "name": f"Student {student_id}",
+                     "sortable_name": f"{student_id}, Student",
+                     "login_id": f"student{student_id}",
+                     "sis_user_id": None}
+        } for i, student_id in enumerate(student_ids)]
+
+    def get_assignments(self, canvas_course_id, student_id):
+        if canvas_course_id not in self.courses:
+            return None
+        student_ids, num_assignments = self.courses[canvas_course_id]
+        if student_id not in student_ids:
+            return None
+        rand = random.Random(f"{canvas_course_id}-{student_id}")
+        assignments = []
+        for assignment_id in range(1, num_assignments + 1):
+            # assignment properties are the same for every student
+            points_possible = random.Random(
+                f"{canvas_course_id}-assignment-{assignment_id}").choice(
+                    [10, 20, 50, 100])
+            assignments.append({
+                "assignment_id": assignment_id,
+                "title": f"Assignment {assignment_id}",
+                "unlock_at": None,
+                "points_possible": points_possible,
+                "non_digital_submission": False,
+                "due_at": "2099-10-01T06:59:59Z",
+                "status": rand.choice(["on_time", "late", "missing"]),
+                "muted": False,
+                "max_score": points_possible,
+                "min_score": 0,
+                "first_quartile": points_possible // 4,
+                "median": points_possible // 2,
+                "third_quartile": points_possible * 3 // 4,
+                "excused": False,
+                "submission": {
+                    "score": rand.randint(0, points_possible),
+                    "posted_at": "2099-10-02T06:59:59Z",
+                    "submitted_at": "2099-09-30T06:59:59Z"
+                }
+            })
+        return assignments
+
+    def get_student_summaries(self, canvas_course_id):
+        if canvas_course_id not in self.courses:
+            return None
+        student_ids, num_assignments = self.courses[canvas_course_id]
+        summaries = []
+        for student_id in student_ids:
+            rand = random.Random(f"{canvas_course_id}-{student_id}")
+            on_time = rand.randint(0, num_assignments)
+            late = rand.randint(0, num_assignments - on_time)
+            summaries.append({
+                "id": student_id,
+                "page_views": rand.randint(0, 500),
+                "max_page_views": 500,
+                "page_views_level": rand.randint(0, 3),
+                "participations": rand.randint(0, 50),
+                "max_participations": 50,
+                "participations_level": rand.randint(0, 3),
+                "tardiness_breakdown": {
+                    "total": num_assignments,
+                    "on_time": on_time,
+                    "late": late,
+                    "missing": num_assignments - on_time - late,
+                    "floating": 0
+                }
+            })
+        return summaries
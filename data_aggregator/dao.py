@@ -2,15 +2,23 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
+import json
 import logging
 import os
 import pymssql
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from csv import DictReader
 from django.conf import settings
 from django.db import transaction, connection
+from django.db.models import Count, Q
+from data_aggregator import partitions
 from data_aggregator.models import Adviser, AdviserTypes, Assignment, Course, \
-    Participation, TaskTypes, User, RadDbView, Term, Week, AnalyticTypes, \
-    Job, CompassDbView
+    Enrollment, JobStudentProgress, Participation, TaskTypes, User, \
+    RadDbView, Term, Week, AnalyticTypes, Job, CompassDbView, \
+    AssignmentDefinition, delete_week_analytics, split_analytic_versions
 from data_aggregator.utilities import get_view_name, set_gcs_base_path, \
     get_term_number
 from data_aggregator.report_builder import ReportBuilder
@@ -29,11 +37,18 @@ from uw_sws.adviser import get_advisers_by_regid
 
 import numpy as np
 import pandas as pd
-from io import IOBase, StringIO
+import pyarrow.parquet as pq
+from io import BytesIO, IOBase, StringIO
 from boto3 import client
 from google.cloud import storage
 from google.cloud.exceptions import NotFound
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+
+# pandas options are global so they only need to be configured once per
+# process
+_pandas_configured = False
+_pandas_lock = threading.Lock()
 
 
 class BaseDAO():
@@ -42,7 +57,12 @@ class BaseDAO():
     """
 
     def __init__(self, *args, **kwargs):
-        self.configure_pandas()
+        global _pandas_configured
+        if not _pandas_configured:
+            with _pandas_lock:
+                if not _pandas_configured:
+                    self.configure_pandas()
+                    _pandas_configured = True
 
     def configure_pandas(self):
         """
@@ -73,6 +93,21 @@ class BaseDAO():
     def get_gcs_num_retries(self):
         return getattr(settings, "GCS_NUM_RETRIES", 3)
 
+    def get_scd_storage_enabled(self):
+        # delta ingestion only writes changed analytics, which relies on the
+        # scd storage to resolve the unchanged analytics of a week
+        return (getattr(settings, "DATA_AGGREGATOR_SCD_STORAGE_ENABLED",
+                        False) or
+                getattr(settings, "DATA_AGGREGATOR_DELTA_INGESTION_ENABLED",
+                        False))
+
+    def get_analytics_model(self, analytic_type):
+        if analytic_type == AnalyticTypes.assignment:
+            return Assignment
+        elif analytic_type == AnalyticTypes.participation:
+            return Participation
+        raise ValueError(f"Unknown analytic type {analytic_type}.")
+
     def get_filenames_from_gcs_bucket(self, url_path, ending="csv"):
         """
         Lists files a given url_key path from the configured GCS bucket.
@@ -91,14 +126,14 @@ class BaseDAO():
                       f"{','.join(files)}")
         return files
 
-    def download_from_gcs_bucket(self, url_key):
+    def download_from_gcs_bucket(self, url_key, decode=True):
         """
         Downloads file a given url_key path from the configured GCS bucket.
 
         :param url_key: Path of the content to upload
         :type url_key: str
-        :param content: Content to upload
-        :type content: str or file object
+        :param decode: Decode the content as utf-8, otherwise return bytes
+        :type decode: bool
         """
         gcs_client = self.get_gcs_client()
         gcs_bucket_name = self.get_gcs_bucket_name()
@@ -110,7 +145,7 @@ class BaseDAO():
             content = blob.download_as_string(
                 timeout=self.get_gcs_timeout())
             if content:
-                return content.decode('utf-8')
+                return content.decode('utf-8') if decode else content
         except NotFound as ex:
             logging.error(f"gcp {url_key}: {ex}")
             raise
@@ -252,8 +287,7 @@ class CanvasDAO(BaseDAO):
 
     @retry(DataFailureException, tries=3, delay=2, backoff=2,
            status_codes=[0, 403, 408, 500])
-    def download_assignment_analytics(
-            self, canvas_course_id, student_id):
+    def download_assignment_analytics(self, canvas_course_id, student_id):
         """
         Download raw assignment analytics for a given canvas course id and
         student
@@ -270,6 +304,76 @@ class CanvasDAO(BaseDAO):
             analytic["canvas_course_id"] = canvas_course_id
         return analytics
 
+    def _download_student_assignment_analytics(self, canvas_course_id,
+                                               student_id):
+        """
+        Download raw assignment analytics for a student, returning an empty
+        list if canvas has no analytics for the student.
+        """
+        try:
+            return self.download_assignment_analytics(canvas_course_id,
+                                                      student_id)
+        except DataFailureException as e:
+            if e.status == 404:
+                logging.warning(e)
+                return []
+            raise
+
+    def _download_assignment_analytics_concurrently(
+            self, canvas_course_id, student_ids, num_parallel_downloads):
+        """
+        Download raw assignment analytics for students using a bounded pool
+        of worker threads, yielding results in the order of student_ids.
+        """
+        def download(student_id):
+            # uw_canvas clients keep paging state on the instance so each
+            # download checks out its own dao, reusing the clients of the
+            # process across jobs
+            with canvas_dao_registry.checkout() as cd:
+                return cd._download_student_assignment_analytics(
+                    canvas_course_id, student_id)
+
+        # keep enough requests queued to keep every worker busy without
+        # holding the results for the whole course in memory
+        max_pending = 2 * num_parallel_downloads
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=num_parallel_downloads)
+        try:
+            for student_id in student_ids:
+                pending.append(
+                    (student_id, executor.submit(download, student_id)))
+                if len(pending) >= max_pending:
+                    student_id, future = pending.popleft()
+                    yield student_id, future.result()
+            while pending:
+                student_id, future = pending.popleft()
+                yield student_id, future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def download_assignment_analytics_for_students(
+            self, canvas_course_id, student_ids, num_parallel_downloads=1):
+        """
+        Download raw assignment analytics for a list of students in a canvas
+        course. Yields a (student_id, analytics) tuple for each student in
+        the order of student_ids.
+
+        :param canvas_course_id: canvas course id to download analytics for
+        :type canvas_course_id: int
+        :param student_ids: canvas user ids to download analytics for
+        :type student_ids: list
+        :param num_parallel_downloads: number of students to download
+            analytics for concurrently. (default is 1)
+        :type num_parallel_downloads: int
+        """
+        if num_parallel_downloads > 1:
+            yield from self._download_assignment_analytics_concurrently(
+                canvas_course_id, student_ids, num_parallel_downloads)
+        else:
+            for student_id in student_ids:
+                yield student_id, self._download_student_assignment_analytics(
+                    canvas_course_id, student_id)
+
     @retry(DataFailureException, tries=3, delay=2, backoff=2,
            status_codes=[0, 403, 408, 500])
     def download_participation_analytics(
@@ -289,7 +393,8 @@ class CanvasDAO(BaseDAO):
         return analytics
 
     def download_raw_analytics_for_course(
-            self, canvas_course_id, analytic_type):
+            self, canvas_course_id, analytic_type, num_parallel_downloads=1,
+            student_ids=None):
         """
         Download raw analytics for a given canvas course id
 
@@ -298,21 +403,25 @@ class CanvasDAO(BaseDAO):
         :param analytic_type:
         :type analytic_type: str (AnalyticTypes.assignment or
             AnalyticTypes.participation)
+        :param num_parallel_downloads: number of students to download
+            assignment analytics for concurrently. (default is 1)
+        :type num_parallel_downloads: int
+        :param student_ids: canvas user ids of the students to download
+            assignment analytics for. (default is to download the list of
+            students enrolled in the course)
+        :type student_ids: list
         """
         if analytic_type == AnalyticTypes.assignment:
             # we need to request assignment analytics per student
-            user_ids = self.download_student_ids_for_course(canvas_course_id)
-            for user_id in user_ids:
-                try:
-                    for analytic in self.download_assignment_analytics(
-                                                    canvas_course_id, user_id):
-                        yield analytic
-                except DataFailureException as e:
-                    if e.status == 404:
-                        logging.warning(e)
-                        continue
-                    else:
-                        raise
+            if student_ids is None:
+                student_ids = self.download_student_ids_for_course(
+                    canvas_course_id)
+            for _, analytics in \
+                    self.download_assignment_analytics_for_students(
+                        canvas_course_id, student_ids,
+                        num_parallel_downloads=num_parallel_downloads):
+                for analytic in analytics:
+                    yield analytic
         elif analytic_type == AnalyticTypes.participation:
             # we request all student summaries for the entire course in one
             # request
@@ -375,6 +484,72 @@ class CanvasDAO(BaseDAO):
         self.reports.delete_report(user_report)
         return sis_data
 
+    def download_enrollment_provisioning_report(self, sis_term_id=None):
+        """
+        Download canvas enrollment provisioning report, including deleted
+        enrollments
+
+        :param sis_term_id: sis term id to load enrollments report for
+        :type sis_term_id: str
+        """
+        term, _ = Term.objects.get_or_create_term_from_sis_term_id(
+            sis_term_id=sis_term_id)
+        # get canvas term using sis-term-id
+        canvas_term = self.terms.get_term_by_sis_id(term.sis_term_id)
+        # get enrollments provisioning report for canvas term
+        enrollment_report = \
+            self.reports.create_enrollments_provisioning_report(
+                settings.ACADEMIC_CANVAS_ACCOUNT_ID,
+                term_id=canvas_term.term_id,
+                params={"include_deleted": True})
+        logging.info(f"Downloading enrollment provisioning report: "
+                     f"term={sis_term_id}")
+        sis_data = self.reports.get_report_data(enrollment_report)
+        self.reports.delete_report(enrollment_report)
+        return sis_data
+
+
+class CanvasDAORegistry():
+    """
+    Process scoped registry of CanvasDAO instances so that canvas clients
+    are created once per worker thread instead of once per job. Canvas
+    clients keep paging state, so an instance is only ever checked out by
+    one thread at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = {}
+
+    @contextmanager
+    def checkout(self):
+        """
+        Context manager yielding a CanvasDAO that is returned to the
+        registry when the context exits.
+        """
+        # instances are kept per class so that replacing CanvasDAO (e.g.
+        # in tests) never hands out an instance of the old class
+        dao_class = CanvasDAO
+        with self._lock:
+            free = self._free.setdefault(dao_class, [])
+            dao = free.pop() if free else None
+        if dao is None:
+            dao = dao_class()
+        try:
+            yield dao
+        finally:
+            with self._lock:
+                self._free.setdefault(dao_class, []).append(dao)
+
+    def clear(self):
+        with self._lock:
+            self._free = {}
+
+
+canvas_dao_registry = CanvasDAORegistry()
+# forked worker processes start with an empty registry
+os.register_at_fork(after_in_child=canvas_dao_registry.clear)
+
 
 class JobDAO(BaseDAO):
     """
@@ -384,23 +559,85 @@ class JobDAO(BaseDAO):
     def __init__(self):
         super().__init__()
 
+    def get_num_parallel_downloads(self):
+        return getattr(settings, "DATA_AGGREGATOR_NUM_PARALLEL_DOWNLOADS", 1)
+
+    def get_analytics_chunk_size(self):
+        return getattr(settings, "DATA_AGGREGATOR_ANALYTICS_CHUNK_SIZE", 1000)
+
+    def get_job_lease_seconds(self):
+        return getattr(settings, "DATA_AGGREGATOR_JOB_LEASE_SECONDS", 600)
+
+    def get_job_heartbeat_interval(self):
+        # refresh a lease several times before it expires
+        return self.get_job_lease_seconds() / 4
+
     def delete_data_for_job(self, job):
         """
-        Delete data associated with job
+        Delete data associated with job. Returns the number of deleted rows.
 
         :param job: Job to delete data for
         :type job: data_aggregator.models.Job
         """
-        if job.type.type == AnalyticTypes.assignment:
-            # get assignment data associated with job
-            old_analytics = Assignment.objects.filter(job=job)
-        elif job.type.type == AnalyticTypes.participation:
-            # get participation data associated with job
-            old_analytics = Participation.objects.filter(job=job)
-        else:
-            raise ValueError(f"Unable to delete records. Unknown job type "
-                             f"{job.type.type}.")
-        old_analytics.delete()
+        model = self.get_analytics_model(job.type.type)
+        week = Week.objects.filter(
+            term__sis_term_id=job.context.get("sis_term_id"),
+            week=job.context.get("week")).first()
+        if week is None:
+            # analytics are saved to an existing week, so a job for a week
+            # that doesn't exist yet has never written any rows
+            return 0
+        with transaction.atomic():
+            if self.get_scd_storage_enabled():
+                # keep the later weeks of versions the job saved that were
+                # extended past the job's week
+                split_analytic_versions(
+                    model,
+                    model.objects
+                    .filter(week=week, job=job, valid_to_week__gt=week.week)
+                    .values_list("id", flat=True),
+                    week)
+            return delete_week_analytics(model, week, job=job)
+
+    def delete_data_for_week(self, analytic_type, sis_term_id, week_num):
+        """
+        Delete all data of the given analytic type for a term and week
+        before the week is rerun. The week is split out of versions of
+        analytics that are valid for other weeks too (see
+        split_analytic_versions) so that only the week's analytics are
+        removed. Returns the number of deleted rows.
+
+        :param analytic_type: AnalyticTypes.assignment or
+            AnalyticTypes.participation
+        :type analytic_type: str
+        :param sis_term_id: sis term id of the week to delete data for
+        :type sis_term_id: str
+        :param week_num: week number to delete data for
+        :type week_num: int
+        """
+        model = self.get_analytics_model(analytic_type)
+        week = Week.objects.filter(term__sis_term_id=sis_term_id,
+                                   week=week_num).first()
+        if week is None:
+            return 0
+        with transaction.atomic():
+            split_analytic_versions(
+                model,
+                model.objects
+                .filter(Q(valid_from_week__lt=week.week) |
+                        Q(valid_to_week__gt=week.week),
+                        week__term=week.term,
+                        valid_from_week__lte=week.week,
+                        valid_to_week__gte=week.week)
+                .values_list("id", flat=True),
+                week)
+            deleted = delete_week_analytics(model, week)
+            if model == Assignment:
+                # definitions are only referenced by the week's assignments
+                delete_week_analytics(AssignmentDefinition, week)
+        logging.info(f"Deleted {deleted} {analytic_type} records for "
+                     f"{sis_term_id} week {week_num}")
+        return deleted
 
     def run_analytics_job(self, job):
         """
@@ -418,22 +655,131 @@ class JobDAO(BaseDAO):
         # that cached responses are ordered by term and week
         set_gcs_base_path(sis_term_id, week_num)
 
-        # delete existing assignment data in case of a job restart
-        self.delete_data_for_job(job)
+        if JobStudentProgress.objects.filter(job=job).exists():
+            # resume a restarted assignment job, keeping the analytics of
+            # students that were already saved
+            logging.info(f"Resuming {analytic_type} job for "
+                         f"course={canvas_course_id}")
+        else:
+            # delete existing analytics data in case of a job restart
+            self.delete_data_for_job(job)
+
+        num_parallel_downloads = job.context.get(
+            "num_parallel_downloads", self.get_num_parallel_downloads())
 
-        cd = CanvasDAO()
+        chunk_size = self.get_analytics_chunk_size()
+
+        # canvas clients are reused across jobs run by this process
+        with canvas_dao_registry.checkout() as cd:
+            analytics_dao = AnalyticsDAO(
+                scd_storage=self.get_scd_storage_enabled())
+            if analytic_type == AnalyticTypes.assignment:
+                self._run_assignment_job(cd, analytics_dao, job, chunk_size,
+                                         num_parallel_downloads)
+            else:
+                # save analytics in fixed size chunks as they are downloaded
+                # so that memory use is bounded by the chunk size, not the
+                # course size
+                analytics = []
+                for analytic in cd.download_raw_analytics_for_course(
+                        canvas_course_id, analytic_type):
+                    analytics.append(analytic)
+                    if len(analytics) >= chunk_size:
+                        self._save_analytics(analytics_dao, analytics, job)
+                        analytics = []
+
+                if analytics:
+                    # save remaining analytics to db
+                    self._save_analytics(analytics_dao, analytics, job)
+
+        # the job is complete so a rerun starts from scratch
+        JobStudentProgress.objects.filter(job=job).delete()
+
+    def _run_assignment_job(self, cd, analytics_dao, job, chunk_size,
+                            num_parallel_downloads):
+        """
+        Download and save assignment analytics for the students of the job's
+        course. Students are checkpointed in the same transaction as their
+        analytics so that a restarted job only downloads students that
+        weren't saved yet.
+        """
+        canvas_course_id = job.context["canvas_course_id"]
+        sis_term_id = job.context["sis_term_id"]
+
+        # resolve the user ids for every student in the course with a single
+        # query so saving analytics doesn't look users up per row
+        enrolled_ids = self.get_student_ids_for_course(
+            cd, sis_term_id, canvas_course_id)
+        user_ids = analytics_dao.load_user_ids(enrolled_ids)
+        # analytics for students that aren't in the User table would be
+        # skipped when saved, so don't spend api requests downloading them
+        student_ids = [student_id for student_id in enrolled_ids
+                       if user_ids.get(student_id) is not None]
+        skipped_student_count = len(enrolled_ids) - len(student_ids)
+        job.context["skipped_student_count"] = skipped_student_count
+        if skipped_student_count:
+            logging.info(f"Skipping {skipped_student_count} students that "
+                         f"don't exist in Canvas Analytics DB for "
+                         f"course={canvas_course_id}")
 
+        saved_student_ids = JobStudentProgress.objects.get_saved_student_ids(
+            job)
+        if saved_student_ids:
+            student_ids = [student_id for student_id in student_ids
+                           if student_id not in saved_student_ids]
+            logging.info(f"Skipping {len(saved_student_ids)} students that "
+                         f"were already saved for course={canvas_course_id}")
+
+        # save analytics in fixed size chunks at student boundaries as they
+        # are downloaded so that memory use is bounded by the chunk size,
+        # not the course size
         analytics = []
-        for analytic in cd.download_raw_analytics_for_course(
-                                            canvas_course_id, analytic_type):
-            analytics.append(analytic)
+        downloaded_student_ids = []
+        try:
+            for student_id, student_analytics in \
+                    cd.download_assignment_analytics_for_students(
+                        canvas_course_id, student_ids,
+                        num_parallel_downloads=num_parallel_downloads):
+                analytics.extend(student_analytics)
+                downloaded_student_ids.append(student_id)
+                if len(analytics) >= chunk_size:
+                    analytics_dao.save_assignments_to_db(
+                        analytics, job, student_ids=downloaded_student_ids)
+                    analytics = []
+                    downloaded_student_ids = []
+        except DataFailureException:
+            # save the students that were downloaded before the failure so
+            # that a restarted job doesn't download them again
+            if downloaded_student_ids:
+                analytics_dao.save_assignments_to_db(
+                    analytics, job, student_ids=downloaded_student_ids)
+            raise
 
-        analytics_dao = AnalyticsDAO()
-        if analytics and analytic_type == AnalyticTypes.assignment:
-            # save remaining assignments to db
+        if downloaded_student_ids:
+            # save remaining analytics to db
+            analytics_dao.save_assignments_to_db(
+                analytics, job, student_ids=downloaded_student_ids)
+
+    def get_student_ids_for_course(self, cd, sis_term_id, canvas_course_id):
+        """
+        Return list of canvas user ids of the students in a course. The
+        term's enrollment snapshot is used when one has been loaded,
+        otherwise the enrollments are downloaded from canvas.
+        """
+        student_ids = Enrollment.objects.get_student_ids_for_course(
+            sis_term_id, canvas_course_id)
+        if student_ids is None:
+            student_ids = cd.download_student_ids_for_course(
+                canvas_course_id)
+        return student_ids
+
+    def _save_analytics(self, analytics_dao, analytics, job):
+        """
+        Save a chunk of analytics for the given job to the database.
+        """
+        if job.type.type == AnalyticTypes.assignment:
             analytics_dao.save_assignments_to_db(analytics, job)
-        elif analytics and analytic_type == AnalyticTypes.participation:
-            # save remaining participations to db
+        elif job.type.type == AnalyticTypes.participation:
             analytics_dao.save_participations_to_db(analytics, job)
 
     def run_task_job(self, job):
@@ -453,11 +799,15 @@ class JobDAO(BaseDAO):
             TaskDAO().create_or_update_courses(sis_term_id=sis_term_id)
         elif job_type == TaskTypes.create_or_update_users:
             TaskDAO().create_or_update_users(sis_term_id=sis_term_id)
+        elif job_type == TaskTypes.create_or_update_enrollments:
+            TaskDAO().create_or_update_enrollments(sis_term_id=sis_term_id)
         elif job_type == TaskTypes.create_student_categories_data_file:
             EdwDAO().create_student_categories_data_file(
                 sis_term_id=sis_term_id)
         elif job_type == TaskTypes.reload_advisers:
-            TaskDAO().reload_advisers()
+            TaskDAO().reload_advisers(
+                incremental=job.context.get("incremental", False),
+                sis_term_id=sis_term_id)
         elif job_type == TaskTypes.create_assignment_db_view:
             TaskDAO().create_assignment_db_view(sis_term_id=sis_term_id,
                                                 week_num=week_num)
@@ -506,9 +856,10 @@ class JobDAO(BaseDAO):
             JobDAO().run_task_job(job)
 
     def create_job(self, job_type, target_date_start, target_date_end,
-                   context=None):
+                   context=None, priority=0):
         """
-        Create a job for the given type.
+        Create a job for the given type. Jobs with a higher priority are
+        claimed first.
         """
         if context is None:
             context = {}
@@ -517,9 +868,46 @@ class JobDAO(BaseDAO):
         job.target_date_start = target_date_start
         job.target_date_end = target_date_end
         job.context = context
+        job.priority = priority
         job.save()
         return job
 
+    def get_course_priorities(self, job_type, week):
+        """
+        Return dictionary mapping course id to the number of analytics saved
+        for the course in the week preceding the given week. The row count is
+        used as an estimate of how long a course's job will take so that
+        the largest courses can be started first.
+
+        :param job_type: analytic job type to estimate course sizes for
+        :type job_type: data_aggregator.models.JobType
+        :param week: week jobs are being created for
+        :type week: data_aggregator.models.Week
+        """
+        if job_type.type == AnalyticTypes.assignment:
+            model = Assignment
+        elif job_type.type == AnalyticTypes.participation:
+            model = Participation
+        else:
+            raise ValueError(f"Unknown analytic type: {job_type.type}")
+        previous_week = Week.objects.filter(term=week.term,
+                                            week=week.week - 1).first()
+        if previous_week is None:
+            return {}
+        if self.get_scd_storage_enabled():
+            # rows are versions valid for a range of weeks of the term so
+            # count the versions that were valid in the previous week
+            analytics = model.objects.filter(
+                week__term=week.term,
+                valid_from_week__lte=previous_week.week,
+                valid_to_week__gte=previous_week.week)
+        else:
+            analytics = model.objects.filter(week=previous_week)
+        return dict(analytics
+                    .values("course_id")
+                    .annotate(row_count=Count("id"))
+                    .values_list("course_id", "row_count"))
+
     def create_analytic_jobs(self, job_type, target_date_start,
                              target_date_end, context=None):
         """
@@ -562,6 +950,9 @@ class JobDAO(BaseDAO):
                     f'create {job_type.type} jobs for.')
             else:
                 jobs_count = 0
+                # largest courses are claimed first so that they don't end up
+                # defining the total run time by starting last
+                priorities = self.get_course_priorities(job_type, week)
                 with transaction.atomic():
                     for course in courses:
                         # create jobs
@@ -569,12 +960,16 @@ class JobDAO(BaseDAO):
                             f"Adding {job_type.type} jobs for course "
                             f"{course.sis_course_id} "
                             f"({course.canvas_course_id})")
-                        context["sis_term_id"] = term.sis_term_id
-                        context["week"] = week.week
-                        context["sis_course_id"] = course.sis_course_id
-                        context["canvas_course_id"] = course.canvas_course_id
-                        job = self.create_job(job_type, target_date_start,
-                                              target_date_end, context=context)
+                        job_context = dict(context)
+                        job_context["sis_term_id"] = term.sis_term_id
+                        job_context["week"] = week.week
+                        job_context["sis_course_id"] = course.sis_course_id
+                        job_context["canvas_course_id"] = \
+                            course.canvas_course_id
+                        job = self.create_job(
+                            job_type, target_date_start, target_date_end,
+                            context=job_context,
+                            priority=priorities.get(course.id, 0))
                         jobs.append(job)
                         jobs_count += 1
                 logging.info(f'Created {jobs_count} {job_type.type} jobs.')
@@ -583,7 +978,40 @@ class JobDAO(BaseDAO):
 
 class AnalyticsDAO(BaseDAO):
 
-    def save_assignments_to_db(self, assignment_dicts, job):
+    def __init__(self, *args, scd_storage=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        # canvas_user_id -> User id for every canvas user id looked up by
+        # this dao, None for canvas user ids that don't exist in the db
+        self.user_ids = {}
+        # unchanged analytics extend their stored version instead of being
+        # saved for every week
+        self.scd_storage = scd_storage
+
+    def load_user_ids(self, canvas_user_ids):
+        """
+        Return dictionary mapping canvas_user_id to User id for the given
+        canvas user ids. Only canvas user ids that haven't been looked up
+        before by this dao are queried, in a single IN query. Unknown canvas
+        user ids map to None.
+
+        :param canvas_user_ids: canvas user ids to resolve
+        :type canvas_user_ids: iterable
+        """
+        canvas_user_ids = set(canvas_user_ids)
+        missing_ids = canvas_user_ids.difference(self.user_ids)
+        if missing_ids:
+            self.user_ids.update(dict.fromkeys(missing_ids))
+            self.user_ids.update(User.objects.get_user_ids(missing_ids))
+        return {canvas_user_id: self.user_ids[canvas_user_id]
+                for canvas_user_id in canvas_user_ids}
+
+    def _get_user_ids_for_analytics(self, analytic_dicts):
+        return self.load_user_ids(
+            analytic_dict.get('canvas_user_id')
+            for analytic_dict in analytic_dicts)
+
+    def save_assignments_to_db(self, assignment_dicts, job,
+                               student_ids=None):
         """
         Save list of assignment dictionaries to the db for the given job
 
@@ -592,11 +1020,18 @@ class AnalyticsDAO(BaseDAO):
         :type assignment_dicts: dict
         :param job: Job associated with the assignment analytics to save
         :type job: data_aggregator.models.Job
+        :param student_ids: canvas user ids of the students whose analytics
+            are all included in assignment_dicts. They are recorded as saved
+            for the job in the same transaction.
+        :type student_ids: list
         """
         canvas_course_id = job.context["canvas_course_id"]
         sis_term_id = job.context["sis_term_id"]
         week_num = job.context["week"]
 
+        if student_ids and not assignment_dicts:
+            JobStudentProgress.objects.record_saved_students(job, student_ids)
+
         if assignment_dicts:
             course = Course.objects.get(
                         canvas_course_id=canvas_course_id,
@@ -604,24 +1039,24 @@ class AnalyticsDAO(BaseDAO):
             week = Week.objects.get(
                         term__sis_term_id=sis_term_id,
                         week=week_num)
-            update_count = 0
-            create_count = 0
             with transaction.atomic():
-                for raw_assign_dict in assignment_dicts:
-                    _, created = (
-                        Assignment.objects.create_or_update_assignment(
-                            job, week, course, raw_assign_dict)
-                    )
-                    if created:
-                        create_count += 1
-                    else:
-                        update_count += 1
-            logging.info(f"Created {create_count} assignments for "
-                         f"term={sis_term_id}, week={week_num}, "
-                         f"course={canvas_course_id}")
-            logging.info(f"Updated {update_count} assignments for "
+                saved_count, skipped_count = (
+                    Assignment.objects.bulk_create_or_update_assignments(
+                        job, week, course, assignment_dicts,
+                        user_ids=self._get_user_ids_for_analytics(
+                            assignment_dicts),
+                        scd_storage=self.scd_storage)
+                )
+                if student_ids:
+                    JobStudentProgress.objects.record_saved_students(
+                        job, student_ids)
+            logging.info(f"Saved {saved_count} assignments for "
                          f"term={sis_term_id}, week={week_num}, "
                          f"course={canvas_course_id}")
+            if skipped_count:
+                logging.info(f"Skipped {skipped_count} assignments for "
+                             f"term={sis_term_id}, week={week_num}, "
+                             f"course={canvas_course_id}")
 
     def save_participations_to_db(self, participation_dicts, job):
         """
@@ -644,25 +1079,21 @@ class AnalyticsDAO(BaseDAO):
             week = Week.objects.get(
                         term__sis_term_id=sis_term_id,
                         week=week_num)
-            update_count = 0
-            create_count = 0
-
             with transaction.atomic():
-                for raw_partic_dict in participation_dicts:
-                    _, created = (
-                        Participation.objects.create_or_update_participation(
-                            job, week, course, raw_partic_dict)
-                    )
-                    if created:
-                        create_count += 1
-                    else:
-                        update_count += 1
-            logging.info(f"Created {create_count} participations for "
-                         f"term={sis_term_id}, week={week_num}, "
-                         f"course={canvas_course_id}")
-            logging.info(f"Updated {update_count} participations for "
+                saved_count, skipped_count = (
+                    Participation.objects.bulk_create_or_update_participations(
+                        job, week, course, participation_dicts,
+                        user_ids=self._get_user_ids_for_analytics(
+                            participation_dicts),
+                        scd_storage=self.scd_storage)
+                )
+            logging.info(f"Saved {saved_count} participations for "
                          f"term={sis_term_id}, week={week_num}, "
                          f"course={canvas_course_id}")
+            if skipped_count:
+                logging.info(f"Skipped {skipped_count} participations for "
+                             f"term={sis_term_id}, week={week_num}, "
+                             f"course={canvas_course_id}")
 
 
 class TaskDAO(BaseDAO):
@@ -670,6 +1101,38 @@ class TaskDAO(BaseDAO):
     Data Access Object for processing tasks necessary for running jobs
     """
 
+    def _bulk_create_or_update(self, model, existing_objs, objs, fields,
+                               batch_size=5000):
+        """
+        Insert the objects that don't exist yet and update the existing
+        objects whose fields differ, writing each in batches. Existing
+        objects that haven't changed aren't written.
+
+        :param model: model of the objects
+        :param existing_objs: dictionary mapping key to existing object
+        :type existing_objs: dict
+        :param objs: dictionary mapping key to object with the new values
+        :type objs: dict
+        :param fields: fields to compare and update
+        :type fields: list
+        :param batch_size: number of objects to write per query
+        :type batch_size: int
+        """
+        create_objs = []
+        update_objs = []
+        for key, obj in objs.items():
+            existing_obj = existing_objs.get(key)
+            if existing_obj is None:
+                create_objs.append(obj)
+            elif any(getattr(existing_obj, field) != getattr(obj, field)
+                     for field in fields):
+                for field in fields:
+                    setattr(existing_obj, field, getattr(obj, field))
+                update_objs.append(existing_obj)
+        model.objects.bulk_create(create_objs, batch_size=batch_size)
+        model.objects.bulk_update(update_objs, fields, batch_size=batch_size)
+        return len(create_objs), len(update_objs)
+
     def create_or_update_courses(self, sis_term_id=None):
         """
         Create and or updates course list for a term
@@ -686,70 +1149,166 @@ class TaskDAO(BaseDAO):
         sis_data = \
             cd.download_course_provisioning_report(sis_term_id=sis_term_id)
 
-        update_count = 0
-        create_count = 0
+        # load the term's courses with a single query and diff the report
+        # against them in memory so that only new and changed courses are
+        # written
+        existing_courses = {course.canvas_course_id: course
+                            for course in Course.objects.filter(term=term)}
+        courses = {}
         course_count = 0
+        for row in DictReader(sis_data):
+            if not len(row):
+                continue
+            created_by_sis = row['created_by_sis']
+            if created_by_sis:
+                canvas_course_id = int(row['canvas_course_id'])
+                canvas_account_id = row['canvas_account_id']
+                courses[canvas_course_id] = Course(
+                    canvas_course_id=canvas_course_id,
+                    term=term,
+                    sis_course_id=row['course_id'],
+                    short_name=row['short_name'],
+                    long_name=row['long_name'],
+                    canvas_account_id=(int(canvas_account_id)
+                                       if canvas_account_id else None),
+                    sis_account_id=row['account_id'],
+                    status=row['status'])
+                course_count += 1
 
         with transaction.atomic():
-            for row in DictReader(sis_data):
-                if not len(row):
-                    continue
-                created_by_sis = row['created_by_sis']
-                if created_by_sis:
-                    canvas_course_id = row['canvas_course_id']
-                    try:
-                        course = Course.objects.filter(
-                                        canvas_course_id=canvas_course_id,
-                                        term=term).get()
-                        create_count += 1
-                    except Course.DoesNotExist:
-                        course = Course()
-                        update_count += 1
-                    # we always update the course data
-                    course.canvas_course_id = canvas_course_id
-                    course.term = term
-                    course.sis_course_id = row['course_id']
-                    course.short_name = row['short_name']
-                    course.long_name = row['long_name']
-                    course.canvas_account_id = row['canvas_account_id']
-                    course.sis_account_id = row['account_id']
-                    course.status = row['status']
-                    course.save()
-                    course_count += 1
+            create_count, update_count = self._bulk_create_or_update(
+                Course, existing_courses, courses,
+                ['sis_course_id', 'short_name', 'long_name',
+                 'canvas_account_id', 'sis_account_id', 'status'])
         logging.info(f'Created {create_count} courses.')
         logging.info(f'Updated {update_count} courses.')
         return course_count
 
-    def reload_advisers(self):
+    def create_or_update_enrollments(self, sis_term_id=None):
+        """
+        Replace the student enrollment snapshot for a term with the term's
+        canvas enrollment provisioning report
+
+        :param sis_term_id: sis term id to load enrollments for. (default is
+            the current term)
+        :type sis_term_id: str
+        """
+        term, _ = Term.objects.get_or_create_term_from_sis_term_id(
+            sis_term_id=sis_term_id)
+
+        cd = CanvasDAO()
+        sis_data = cd.download_enrollment_provisioning_report(
+            sis_term_id=term.sis_term_id)
+
+        enrollments = []
+        for row in DictReader(sis_data):
+            if not len(row):
+                continue
+            # match the enrollments returned by the enrollments api for
+            # a course
+            if row['base_role_type'] == 'StudentEnrollment' and \
+                    row['status'] in ('active', 'deleted', 'inactive') and \
+                    row['canvas_course_id'] and row['canvas_user_id']:
+                enrollments.append(Enrollment(
+                    term=term,
+                    canvas_course_id=int(row['canvas_course_id']),
+                    canvas_user_id=int(row['canvas_user_id'])))
+
+        with transaction.atomic():
+            Enrollment.objects.filter(term=term).delete()
+            Enrollment.objects.bulk_create(enrollments, batch_size=5000)
+        logging.info(f'Loaded {len(enrollments)} enrollments for term '
+                     f'{term.sis_term_id}.')
+        return len(enrollments)
+
+    def get_num_parallel_adviser_downloads(self):
+        return getattr(settings,
+                       "DATA_AGGREGATOR_NUM_PARALLEL_ADVISER_DOWNLOADS", 10)
+
+    def download_advisers(self, user):
+        """
+        Download sws advisers for a user, returning an empty list if the
+        user has no advisers
+
+        :param user: user to download advisers for
+        :type user: data_aggregator.models.User
+        """
+        try:
+            return get_advisers_by_regid(user.sis_user_id)
+        except DataFailureException:
+            logging.debug(f"No adviser found for user with login_id "
+                          f"{user.login_id}.")
+            return []
+
+    def get_adviser_max_age_days(self):
+        return getattr(settings, "DATA_AGGREGATOR_ADVISER_MAX_AGE_DAYS", 7)
+
+    def reload_advisers(self, incremental=False, sis_term_id=None):
         """
         Create and or updates advisers for all users in the database
+
+        :param incremental: only refresh the advisers of users whose
+            advisers weren't checked in the last
+            DATA_AGGREGATOR_ADVISER_MAX_AGE_DAYS days and users enrolled in
+            the term. (default is False)
+        :type incremental: bool
+        :param sis_term_id: sis term id whose enrolled students are
+            refreshed in incremental mode. (default is the current term)
+        :type sis_term_id: str
         """
-        users = User.objects.filter(status='active')
+        if incremental:
+            term, _ = Term.objects.get_or_create_term_from_sis_term_id(
+                sis_term_id=sis_term_id)
+            stale_before = datetime.now(timezone.utc) - timedelta(
+                days=self.get_adviser_max_age_days())
+            users = list(User.objects.get_users_for_adviser_refresh(
+                stale_before, term))
+        else:
+            users = list(User.objects.filter(status='active'))
+
+        # download advisers with a bounded pool of threads before touching
+        # the adviser table so that locks are only held while the new
+        # advisers are swapped in
+        advisers = []
+        checked = datetime.now(timezone.utc)
+        with ThreadPoolExecutor(
+                max_workers=self.get_num_parallel_adviser_downloads()) \
+                as executor:
+            for user, sws_advisers in zip(
+                    users, executor.map(self.download_advisers, users)):
+                for sws_adviser in sws_advisers:
+                    adviser = Adviser()
+                    adviser.regid = sws_adviser.regid
+                    adviser.uwnetid = sws_adviser.uwnetid
+                    adviser.full_name = sws_adviser.full_name
+                    adviser.pronouns = sws_adviser.pronouns
+                    adviser.email_address = sws_adviser.email_address
+                    adviser.phone_number = sws_adviser.phone_number
+                    adviser.program = sws_adviser.program
+                    adviser.booking_url = sws_adviser.booking_url
+                    adviser.metadata = sws_adviser.metadata
+                    adviser.is_active = sws_adviser.is_active
+                    adviser.is_dept_adviser = sws_adviser.is_dept_adviser
+                    adviser.timestamp = sws_adviser.timestamp
+                    adviser.user = user
+                    advisers.append(adviser)
+
+        # readers keep seeing the previous advisers until the swap commits
         with transaction.atomic():
-            Adviser.objects.all().delete()
-            for user in users:
-                try:
-                    sws_advisers = get_advisers_by_regid(user.sis_user_id)
-                    for sws_adviser in sws_advisers:
-                        adviser = Adviser()
-                        adviser.regid = sws_adviser.regid
-                        adviser.uwnetid = sws_adviser.uwnetid
-                        adviser.full_name = sws_adviser.full_name
-                        adviser.pronouns = sws_adviser.pronouns
-                        adviser.email_address = sws_adviser.email_address
-                        adviser.phone_number = sws_adviser.phone_number
-                        adviser.program = sws_adviser.program
-                        adviser.booking_url = sws_adviser.booking_url
-                        adviser.metadata = sws_adviser.metadata
-                        adviser.is_active = sws_adviser.is_active
-                        adviser.is_dept_adviser = sws_adviser.is_dept_adviser
-                        adviser.timestamp = sws_adviser.timestamp
-                        adviser.user = user
-                        adviser.save()
-                except DataFailureException:
-                    logging.debug(f"No adviser found for user with login_id "
-                                  f"{user.login_id}.")
-                    pass
+            if incremental:
+                user_ids = [user.id for user in users]
+                for i in range(0, len(user_ids), 5000):
+                    Adviser.objects.filter(
+                        user_id__in=user_ids[i:i + 5000]).delete()
+                # advisers of users that are no longer active aren't kept
+                Adviser.objects.exclude(user__status='active').delete()
+            else:
+                Adviser.objects.all().delete()
+            Adviser.objects.bulk_create(advisers, batch_size=5000)
+            User.objects.set_advisers_checked([user.id for user in users],
+                                              checked)
+        logging.info(f"Loaded {len(advisers)} advisers for {len(users)} "
+                     f"users.")
 
     def create_or_update_users(self, sis_term_id=None):
         """
@@ -768,40 +1327,39 @@ class TaskDAO(BaseDAO):
                      f"containing {len(sis_data)} rows.")
 
         pws = PWS()
-        update_count = 0
-        create_count = 0
+        users = {}
         user_count = 0
+        for row in DictReader(sis_data):
+            if not len(row):
+                continue
+            created_by_sis = row['created_by_sis']
+            status = row['status']
+            sis_user_id = row['user_id']
+            if created_by_sis == "true" and status == "active" and \
+                    pws.valid_uwregid(sis_user_id):
+                canvas_user_id = int(row['canvas_user_id'])
+                users[canvas_user_id] = User(
+                    canvas_user_id=canvas_user_id,
+                    sis_user_id=sis_user_id,
+                    login_id=row['login_id'],
+                    first_name=row['first_name'],
+                    last_name=row['last_name'],
+                    full_name=row['full_name'],
+                    sortable_name=row['sortable_name'],
+                    email=row['email'],
+                    status=status)
+                user_count += 1
 
         with transaction.atomic():
-            for row in DictReader(sis_data):
-                if not len(row):
-                    continue
-                created_by_sis = row['created_by_sis']
-                status = row['status']
-                sis_user_id = row['user_id']
-                if created_by_sis == "true" and status == "active" and \
-                        pws.valid_uwregid(sis_user_id):
-
-                    canvas_user_id = int(row['canvas_user_id'])
-                    try:
-                        user = User.objects.filter(
-                                        canvas_user_id=canvas_user_id).get()
-                        create_count += 1
-                    except User.DoesNotExist:
-                        user = User()
-                        update_count += 1
-
-                    user.canvas_user_id = canvas_user_id
-                    user.sis_user_id = sis_user_id
-                    user.login_id = row['login_id']
-                    user.first_name = row['first_name']
-                    user.last_name = row['last_name']
-                    user.full_name = row['full_name']
-                    user.sortable_name = row['sortable_name']
-                    user.email = row['email']
-                    user.status = status
-                    user.save()
-                    user_count += 1
+            # load the existing users with a single query and diff the
+            # report against them in memory so that users that haven't
+            # changed aren't rewritten
+            existing_users = User.objects.in_bulk(
+                list(users.keys()), field_name="canvas_user_id")
+            create_count, update_count = self._bulk_create_or_update(
+                User, existing_users, users,
+                ['sis_user_id', 'login_id', 'first_name', 'last_name',
+                 'full_name', 'sortable_name', 'email', 'status'])
         logging.info(f"Created {create_count} user(s).")
         logging.info(f"Updated {update_count} user(s).")
         return user_count
@@ -1143,6 +1701,35 @@ class TaskDAO(BaseDAO):
         )
         return True
 
+    def get_week_snapshot_sql(self, alias, week):
+        """
+        Return the week_id column and WHERE clause that select the analytics
+        of the given week from the analytics table with the given alias.
+
+        :param alias: alias of the assignment or participation table
+        :type alias: str
+        :param week: week to select analytics for
+        :type week: data_aggregator.models.Week
+        """
+        if self.get_scd_storage_enabled():
+            # rows are versions that are valid for a range of weeks of the
+            # term rather than copies saved for every week. a version is
+            # saved to the week it starts in, so only the partitions of the
+            # term's weeks up to the given week are scanned.
+            week_ids = sorted(Week.objects
+                              .filter(term_id=week.term_id,
+                                      week__lte=week.week)
+                              .values_list("id", flat=True))
+            return (f"{week.id} AS week_id",
+                    f"{alias}.week_id IN "
+                    f"({', '.join(str(week_id) for week_id in week_ids)}) "
+                    f"AND {alias}.valid_from_week <= {week.week} "
+                    f"AND {alias}.valid_to_week >= {week.week}")
+        # filter on the partition key so that only the week's partition is
+        # scanned
+        return ("data_aggregator_week.id AS week_id",
+                f"{alias}.week_id = {week.id}")
+
     def create_participation_db_view(self, sis_term_id=None, week_num=None):
         """
         Create participation db view for given week and sis-term-id
@@ -1162,6 +1749,7 @@ class TaskDAO(BaseDAO):
 
         view_name = get_view_name(term.sis_term_id, week.week,
                                   "participations")
+        week_id_column, week_filter = self.get_week_snapshot_sql("p", week)
 
         cursor = connection.cursor()
 
@@ -1177,7 +1765,7 @@ class TaskDAO(BaseDAO):
             {create_action} AS
             SELECT
                 data_aggregator_term.id AS term_id,
-                data_aggregator_week.id AS week_id,
+                {week_id_column},
                 p.course_id,
                 p.user_id,
                 p.participations AS participations,
@@ -1197,8 +1785,7 @@ class TaskDAO(BaseDAO):
                 p.week_id = data_aggregator_week.id
             JOIN data_aggregator_term on
                 data_aggregator_week.term_id = data_aggregator_term.id
-            WHERE data_aggregator_week.week = {week.week}
-            AND data_aggregator_term.sis_term_id = '{term.sis_term_id}'
+            WHERE {week_filter}
             '''
         )
         return True
@@ -1221,6 +1808,7 @@ class TaskDAO(BaseDAO):
                                                   week_num=week_num)
 
         view_name = get_view_name(term.sis_term_id, week.week, "assignments")
+        week_id_column, week_filter = self.get_week_snapshot_sql("a", week)
 
         cursor = connection.cursor()
 
@@ -1236,31 +1824,32 @@ class TaskDAO(BaseDAO):
             {create_action} AS
             SELECT
                 data_aggregator_term.id AS term_id,
-                data_aggregator_week.id AS week_id,
+                {week_id_column},
                 a.course_id,
                 a.user_id,
                 a.assignment_id,
                 a.score,
-                a.due_at,
-                a.points_possible,
+                d.due_at,
+                d.points_possible,
                 a.status,
                 a.excused,
-                a.first_quartile,
-                a.max_score,
-                a.median,
-                a.min_score,
-                a.muted,
-                a.non_digital_submission,
+                d.first_quartile,
+                d.max_score,
+                d.median,
+                d.min_score,
+                d.muted,
+                d.non_digital_submission,
                 a.posted_at,
                 a.submitted_at,
-                a.third_quartile,
-                a.title
+                d.third_quartile,
+                d.title
             FROM data_aggregator_assignment a
+            LEFT JOIN data_aggregator_assignmentdefinition d ON
+            a.definition_id = d.id
             JOIN data_aggregator_week ON a.week_id = data_aggregator_week.id
             JOIN data_aggregator_term ON
             data_aggregator_week.term_id = data_aggregator_term.id
-            WHERE data_aggregator_week.week = {week.week} AND
-            data_aggregator_term.sis_term_id = '{term.sis_term_id}'
+            WHERE {week_filter}
             '''
         )
         return True
@@ -1593,6 +2182,264 @@ class LoadCompassDAO(LoadRadDAO):
             raise RuntimeError(error_msg)
 
 
+class ArchiveDAO(BaseDAO):
+    """
+    Data Access Object for archiving the analytics of finished terms to
+    parquet files in the GCS bucket and pruning them from the database
+    """
+
+    # analytics of a week joined to their user, course, term and week keys
+    ARCHIVE_QUERIES = {
+        AnalyticTypes.assignment: """
+            SELECT
+                t.sis_term_id,
+                w.week,
+                c.canvas_course_id,
+                c.sis_course_id,
+                u.canvas_user_id,
+                u.sis_user_id,
+                u.login_id,
+                a.valid_from_week,
+                a.valid_to_week,
+                a.assignment_id,
+                d.title,
+                d.unlock_at,
+                d.points_possible,
+                d.non_digital_submission,
+                d.due_at,
+                d.muted,
+                d.min_score,
+                d.max_score,
+                d.first_quartile,
+                d.median,
+                d.third_quartile,
+                a.status,
+                a.excused,
+                a.score,
+                a.posted_at,
+                a.submitted_at
+            FROM data_aggregator_assignment a
+            LEFT JOIN data_aggregator_assignmentdefinition d ON
+                a.definition_id = d.id
+            JOIN data_aggregator_week w ON a.week_id = w.id
+            JOIN data_aggregator_term t ON w.term_id = t.id
+            JOIN data_aggregator_course c ON a.course_id = c.id
+            JOIN data_aggregator_user u ON a.user_id = u.id
+            WHERE a.week_id = %s
+            """,
+        AnalyticTypes.participation: """
+            SELECT
+                t.sis_term_id,
+                w.week,
+                c.canvas_course_id,
+                c.sis_course_id,
+                u.canvas_user_id,
+                u.sis_user_id,
+                u.login_id,
+                p.valid_from_week,
+                p.valid_to_week,
+                p.page_views,
+                p.max_page_views,
+                p.page_views_level,
+                p.participations,
+                p.max_participations,
+                p.participations_level,
+                p.time_total,
+                p.time_on_time,
+                p.time_late,
+                p.time_missing,
+                p.time_floating
+            FROM data_aggregator_participation p
+            JOIN data_aggregator_week w ON p.week_id = w.id
+            JOIN data_aggregator_term t ON w.term_id = t.id
+            JOIN data_aggregator_course c ON p.course_id = c.id
+            JOIN data_aggregator_user u ON p.user_id = u.id
+            WHERE p.week_id = %s
+            """
+    }
+
+    def get_archive_path(self, sis_term_id, file_name):
+        return f"archive/{sis_term_id}/{file_name}"
+
+    def get_archive_file_name(self, analytic_type, week_num):
+        return f"{analytic_type}/week-{week_num}.parquet"
+
+    def get_archive_df(self, analytic_type, week):
+        """
+        Return data frame of the analytics of the given type saved for the
+        given week.
+
+        :param analytic_type: assignment or participation
+        :type analytic_type: str
+        :param week: week to return analytics for
+        :type week: data_aggregator.models.Week
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(self.ARCHIVE_QUERIES[analytic_type], [week.id])
+            columns = [column[0] for column in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    def archive_week(self, analytic_type, week):
+        """
+        Upload the analytics of the given type saved for the given week to a
+        compressed parquet file in the GCS bucket and verify that the
+        uploaded file has as many rows as the database. Returns the number
+        of rows archived.
+
+        :param analytic_type: assignment or participation
+        :type analytic_type: str
+        :param week: week to archive analytics for
+        :type week: data_aggregator.models.Week
+        """
+        model = self.get_analytics_model(analytic_type)
+        db_count = model.objects.filter(week=week).count()
+        if db_count == 0:
+            return 0
+        df = self.get_archive_df(analytic_type, week)
+        url_key = self.get_archive_path(
+            week.term.sis_term_id,
+            self.get_archive_file_name(analytic_type, week.week))
+        file_obj = BytesIO()
+        df.to_parquet(file_obj, index=False, compression="zstd")
+        file_obj.seek(0)
+        self.upload_to_gcs_bucket(url_key, file_obj)
+
+        content = self.download_from_gcs_bucket(url_key, decode=False)
+        archived_count = pq.ParquetFile(BytesIO(content)).metadata.num_rows
+        if archived_count != db_count:
+            error_msg = (f"Archived {archived_count} {analytic_type} rows to "
+                         f"{url_key} but the database has {db_count} rows "
+                         f"for term {week.term.sis_term_id} and week "
+                         f"{week.week}.")
+            logging.critical(error_msg)
+            raise RuntimeError(error_msg)
+        return archived_count
+
+    def archive_term(self, sis_term_id, force=False):
+        """
+        Archive the analytics of a finished term to parquet files in the GCS
+        bucket, then prune the term's analytics, assignment definitions,
+        jobs and db views from the database. A manifest of the archived
+        files and their row counts is uploaded with the files. Returns the
+        manifest.
+
+        :param sis_term_id: sis term id of the term to archive
+        :type sis_term_id: str
+        :param force: archive the term even if its grade submission
+            deadline hasn't passed
+        :type force: bool
+        """
+        term = Term.objects.get_term_for_sis_term_id(sis_term_id)
+        if term is None:
+            raise ValueError(f"Unknown term {sis_term_id}.")
+        now = datetime.now(timezone.utc)
+        if not force and (term.grade_submission_deadline is None or
+                          term.grade_submission_deadline > now):
+            raise RuntimeError(f"Term {sis_term_id} hasn't finished.")
+        for analytic_type in [AnalyticTypes.assignment,
+                              AnalyticTypes.participation]:
+            active_jobs = (Job.objects
+                           .get_pending_or_running_jobs(analytic_type)
+                           .filter(context__sis_term_id=sis_term_id))
+            if active_jobs.exists():
+                error_msg = (f"Skipping archiving term {sis_term_id}. There "
+                             f"are {active_jobs.count()} pending or running "
+                             f"{analytic_type} jobs for the term.")
+                logging.critical(error_msg)
+                raise RuntimeError(error_msg)
+
+        manifest = {"sis_term_id": sis_term_id,
+                    "archive_date": now.isoformat(),
+                    "files": {}}
+        weeks = list(Week.objects.filter(term=term).order_by("week"))
+        for week in weeks:
+            for analytic_type in [AnalyticTypes.assignment,
+                                  AnalyticTypes.participation]:
+                row_count = self.archive_week(analytic_type, week)
+                if row_count:
+                    file_name = self.get_archive_file_name(analytic_type,
+                                                           week.week)
+                    manifest["files"][file_name] = {
+                        "analytic_type": analytic_type,
+                        "week": week.week,
+                        "row_count": row_count}
+                    logging.info(f"Archived {row_count} {analytic_type} rows "
+                                 f"for term {sis_term_id} and week "
+                                 f"{week.week}")
+        self.upload_to_gcs_bucket(
+            self.get_archive_path(sis_term_id, "manifest.json"),
+            json.dumps(manifest))
+
+        self.prune_term(term, weeks)
+        return manifest
+
+    def prune_term(self, term, weeks):
+        """
+        Delete the analytics, assignment definitions, jobs and db views of
+        the given term.
+        """
+        with connection.cursor() as cursor:
+            for week in weeks:
+                # rad and compass views are built on the assignment and
+                # participation views
+                for label in ["rad", "compass", "assignments",
+                              "participations"]:
+                    view_name = get_view_name(term.sis_term_id, week.week,
+                                              label)
+                    cursor.execute(f'DROP VIEW IF EXISTS "{view_name}"')
+        week_ids = [week.id for week in weeks]
+        with transaction.atomic():
+            # dropping the weeks' partitions is much faster than deleting
+            # their rows, which is only done when the tables aren't
+            # partitioned
+            if not partitions.drop_week_partitions(week_ids):
+                for week in weeks:
+                    delete_week_analytics(Assignment, week)
+                    delete_week_analytics(Participation, week)
+            for week in weeks:
+                delete_week_analytics(AssignmentDefinition, week)
+            Job.objects.filter(context__sis_term_id=term.sis_term_id).delete()
+        logging.info(f"Pruned analytics, jobs and db views for term "
+                     f"{term.sis_term_id}")
+
+    def get_archive_manifest(self, sis_term_id):
+        return json.loads(self.download_from_gcs_bucket(
+            self.get_archive_path(sis_term_id, "manifest.json")))
+
+    def read_archived_analytics(self, sis_term_id, analytic_type,
+                                week_num=None):
+        """
+        Return data frame of the archived analytics of the given type for an
+        archived term. Archives are read-only.
+
+        :param sis_term_id: sis term id of the archived term
+        :type sis_term_id: str
+        :param analytic_type: assignment or participation
+        :type analytic_type: str
+        :param week_num: only return the analytics of the given week
+        :type week_num: int
+        """
+        manifest = self.get_archive_manifest(sis_term_id)
+        dfs = []
+        for file_name, archive_file in manifest["files"].items():
+            if archive_file["analytic_type"] != analytic_type:
+                continue
+            # rows are valid from the week they were saved for, so files of
+            # later weeks can't have rows for the week
+            if week_num is not None and archive_file["week"] > week_num:
+                continue
+            content = self.download_from_gcs_bucket(
+                self.get_archive_path(sis_term_id, file_name), decode=False)
+            dfs.append(pd.read_parquet(BytesIO(content)))
+        if not dfs:
+            return pd.DataFrame()
+        df = pd.concat(dfs, ignore_index=True)
+        if week_num is not None:
+            df = df[(df["valid_from_week"] <= week_num) &
+                    (df["valid_to_week"] >= week_num)]
+        return df
+
+
 class EdwDAO(BaseDAO):
 
     def get_connection(self, database):
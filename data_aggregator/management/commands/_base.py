@@ -11,7 +11,7 @@ from data_aggregator.models import AnalyticTypes, Job, JobType, TaskTypes, \
     Term
 from data_aggregator.utilities import datestring_to_datetime, get_relative_week
 from data_aggregator.dao import JobDAO
-from data_aggregator.threads import ThreadPool
+from data_aggregator.threads import ProcessPool, ThreadPool
 from restclients_core.exceptions import DataFailureException
 
 
@@ -26,6 +26,7 @@ class RunJobCommand(BaseCommand, RunJobMixin):
                                 TaskTypes.create_terms,
                                 TaskTypes.create_or_update_users,
                                 TaskTypes.create_or_update_courses,
+                                TaskTypes.create_or_update_enrollments,
                                 TaskTypes.reload_advisers,
                                 TaskTypes.create_assignment_db_view,
                                 TaskTypes.create_participation_db_view,
@@ -45,9 +46,34 @@ class RunJobCommand(BaseCommand, RunJobMixin):
                             required=False)
         parser.add_argument("--num_parallel_jobs",
                             type=int,
-                            help=("Size of job thread pool"),
+                            help=("Size of job thread pool, or number of "
+                                  "worker processes when using the process "
+                                  "executor"),
                             default=20,
                             required=False)
+        parser.add_argument("--executor",
+                            type=str,
+                            choices=["thread", "process"],
+                            help=("Run jobs in a thread pool or in worker "
+                                  "processes. Default is thread."),
+                            default="thread",
+                            required=False)
+        parser.add_argument("--threads_per_process",
+                            type=int,
+                            help=("Number of jobs each worker process runs "
+                                  "concurrently when using the process "
+                                  "executor"),
+                            default=1,
+                            required=False)
+        parser.add_argument("--reclaim",
+                            action="store_true",
+                            help=("Reclaim claimed or running jobs whose "
+                                  "lease expired when there are no pending "
+                                  "jobs, in case a crashed process left them "
+                                  "running."))
+
+    def run_job_by_id(self, job_id):
+        return self.run_job(Job.objects.get(id=job_id))
 
     def handle(self, *args, **options):
         """
@@ -58,14 +84,29 @@ class RunJobCommand(BaseCommand, RunJobMixin):
         job_name = options["job_name"]  # required
         num_parallel_jobs = options["num_parallel_jobs"]
         job_batch_size = options["job_batch_size"]  # defaults to all jobs
+        executor = options.get("executor", "thread")
+        threads_per_process = options.get("threads_per_process", 1)
 
+        # stored job statuses are only updated on save, so mark jobs that
+        # expired since the last run
+        Job.objects.expire_jobs()
         jobs = Job.objects.claim_batch_of_jobs(
             job_name,
-            batchsize=job_batch_size
+            batchsize=job_batch_size,
+            reclaim=options.get("reclaim", False),
+            lease_seconds=JobDAO().get_job_lease_seconds()
         )
         try:
             if jobs:
-                if settings.DATA_AGGREGATOR_THREADING_ENABLED:
+                if executor == "process":
+                    # worker processes load the claimed jobs by id with
+                    # their own db connections
+                    with ProcessPool(
+                            processes=num_parallel_jobs,
+                            threads_per_process=threads_per_process) as pool:
+                        pool.map(self.run_job_by_id,
+                                 [job.id for job in jobs])
+                elif settings.DATA_AGGREGATOR_THREADING_ENABLED:
                     with ThreadPool(processes=num_parallel_jobs) as pool:
                         pool.map(self.run_job, jobs)
                 else:
@@ -104,6 +145,9 @@ class CreateJobCommand(BaseCommand):
                        include_term=True, include_week=False,
                        include_course=False, include_account=False,
                        include_force=False,
+                       include_parallel_downloads=False,
+                       include_incremental=False,
+                       include_clear_week=False,
                        default_sis_term_id=None,
                        default_week=None):
         subparser = subparsers.add_parser(
@@ -149,6 +193,28 @@ class CreateJobCommand(BaseCommand):
                 '--force',
                 action='store_true',
                 help='Force action.')
+        if include_parallel_downloads:
+            subparser.add_argument(
+                "--num_parallel_downloads",
+                type=int,
+                help=("Number of students to download analytics for "
+                      "concurrently within each job."),
+                default=None,
+                required=False)
+        if include_incremental:
+            subparser.add_argument(
+                "--incremental",
+                action="store_true",
+                help=("Only refresh users that are new, stale or enrolled "
+                      "in the term."),
+                default=None)
+        if include_clear_week:
+            subparser.add_argument(
+                "--clear_week",
+                action="store_true",
+                help=("Delete all analytics saved for the term and week "
+                      "before creating jobs to rerun it."),
+                default=None)
         subparser.add_argument("--target_start_time",
                                type=str,
                                help=("iso8601 UTC start time for which the "
@@ -201,10 +267,18 @@ class CreateJobCommand(BaseCommand):
             ),
             default_sis_term_id=curr_sis_term_id)
 
+        subparsers = self._add_subparser(
+            subparsers,
+            TaskTypes.create_or_update_enrollments,
+            command_help_message=(
+                "Loads the student enrollment snapshot for the current term."
+            ),
+            default_sis_term_id=curr_sis_term_id)
+
         subparsers = self._add_subparser(
             subparsers,
             TaskTypes.reload_advisers,
-            include_term=False,
+            include_incremental=True,
             command_help_message=(
                 "Loads or updates list of advisers for all students in the db."
             ))
@@ -304,6 +378,8 @@ class CreateJobCommand(BaseCommand):
             AnalyticTypes.assignment,
             include_week=True,
             include_course=True,
+            include_clear_week=True,
+            include_parallel_downloads=True,
             command_help_message=(
                 "Run active assignment jobs."
             ),
@@ -315,6 +391,7 @@ class CreateJobCommand(BaseCommand):
             AnalyticTypes.participation,
             include_week=True,
             include_course=True,
+            include_clear_week=True,
             command_help_message=(
                 "Run active participation jobs."
             ),
@@ -337,6 +414,8 @@ class CreateJobCommand(BaseCommand):
         context.pop("no_color", None)
         context.pop("force_color", None)
         context.pop("skip_checks", None)
+        # clearing the week is done once when creating the jobs
+        context.pop("clear_week", None)
         return context
 
     def create(self, options):
@@ -360,6 +439,10 @@ class CreateJobCommand(BaseCommand):
         job_type, _ = JobType.objects.get_or_create(type=job_name)
         if job_type.type == AnalyticTypes.assignment or \
                 job_type.type == AnalyticTypes.participation:
+            if options.get("clear_week"):
+                JobDAO().delete_data_for_week(job_type.type,
+                                              context.get("sis_term_id"),
+                                              context.get("week"))
             jobs = JobDAO().create_analytic_jobs(
                 job_type, target_date_start, target_date_end, context=context)
         else:
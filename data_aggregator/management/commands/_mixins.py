@@ -5,6 +5,7 @@
 import logging
 import traceback
 from data_aggregator.dao import JobDAO
+from data_aggregator.threads import Heartbeat
 
 
 class RunJobMixin():
@@ -19,7 +20,11 @@ class RunJobMixin():
     def run_job(self, job):
         try:
             job.start_job()
-            self.work(job)
+            # refresh the job's lease while it runs so that it isn't
+            # reclaimed by another process
+            with Heartbeat(job.refresh_heartbeat,
+                           JobDAO().get_job_heartbeat_interval()):
+                self.work(job)
             job.end_job()
         except Exception as err:
             # save error message if one occurs
@@ -0,0 +1,37 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.core.management.base import BaseCommand, CommandError
+from data_aggregator.dao import ArchiveDAO
+
+
+class Command(BaseCommand):
+
+    help = ("Archive the assignment and participation analytics of a "
+            "finished term to parquet files in the GCS bucket, verify the "
+            "archived row counts and prune the term's analytics, jobs and db "
+            "views from the database. Archived analytics can be read with "
+            "the query_archive command.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("sis_term_id",
+                            type=str,
+                            help=("Term to archive."))
+        parser.add_argument("--force",
+                            action="store_true",
+                            help=("Archive the term even if its grade "
+                                  "submission deadline hasn't passed."))
+
+    def handle(self, *args, **options):
+        sis_term_id = options["sis_term_id"]
+        try:
+            manifest = ArchiveDAO().archive_term(sis_term_id,
+                                                 force=options["force"])
+        except (ValueError, RuntimeError) as ex:
+            raise CommandError(str(ex))
+        row_count = sum(archive_file["row_count"]
+                        for archive_file in manifest["files"].values())
+        self.stdout.write(f"Archived {row_count} rows in "
+                          f"{len(manifest['files'])} files for term "
+                          f"{sis_term_id}")
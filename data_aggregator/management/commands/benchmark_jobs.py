@@ -0,0 +1,260 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+import time
+from datetime import date
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from data_aggregator.canvas_replay import SyntheticCanvasDAO, \
+    get_api_call_count
+from data_aggregator.dao import JobDAO
+from data_aggregator.models import AnalyticTypes, Assignment, Course, \
+    Enrollment, Job, JobStatusTypes, JobType, Participation, Term, User
+
+
+# synthetic data is created in a term and with canvas ids that don't
+# collide with real canvas data
+BENCHMARK_SIS_TERM_ID = "2099-autumn"
+BENCHMARK_CANVAS_ID_BASE = 9000000000
+
+
+class Command(BaseCommand):
+
+    help = ("Benchmark analytic jobs by running them with run_jobs against "
+            "synthetic or replayed canvas responses instead of live canvas. "
+            "Reports jobs/sec, api calls/sec and rows/sec. Benchmark jobs "
+            "and the analytics they save are deleted afterwards. Don't run "
+            "against a production database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("job_name",
+                            type=str,
+                            choices=[AnalyticTypes.assignment,
+                                     AnalyticTypes.participation],
+                            help=("Name of job to benchmark."))
+        parser.add_argument("--canvas_dao",
+                            type=str,
+                            choices=["synthetic", "replay"],
+                            help=("Generate synthetic courses or replay "
+                                  "responses recorded by "
+                                  "RecordingCanvasLiveDAO. Default is "
+                                  "synthetic."),
+                            default="synthetic")
+        parser.add_argument("--course_sizes",
+                            type=int,
+                            nargs="+",
+                            help=("Number of students in each synthetic "
+                                  "course size."),
+                            default=[50])
+        parser.add_argument("--courses_per_size",
+                            type=int,
+                            help=("Number of synthetic courses of each "
+                                  "size."),
+                            default=1)
+        parser.add_argument("--num_assignments",
+                            type=int,
+                            help=("Number of assignments in each synthetic "
+                                  "course."),
+                            default=20)
+        parser.add_argument("--sis_term_id",
+                            type=str,
+                            help=("Term of the replayed courses. Required "
+                                  "when replaying."),
+                            default=None)
+        parser.add_argument("--week",
+                            type=int,
+                            help=("Week of the replayed analytics. Required "
+                                  "when replaying."),
+                            default=None)
+        parser.add_argument("--replay_dir",
+                            type=str,
+                            help=("Directory containing recorded canvas "
+                                  "responses."),
+                            default=None)
+        parser.add_argument("--latency",
+                            type=float,
+                            help=("Seconds each canvas request takes."),
+                            default=0.0)
+        parser.add_argument("--error_rate",
+                            type=float,
+                            help=("Probability of a canvas request failing "
+                                  "with a server error."),
+                            default=0.0)
+        parser.add_argument("--throttle_rate",
+                            type=float,
+                            help=("Probability of a canvas request failing "
+                                  "with a rate limit error."),
+                            default=0.0)
+        parser.add_argument("--num_parallel_downloads",
+                            type=int,
+                            help=("Number of students to download analytics "
+                                  "for concurrently within each job."),
+                            default=None)
+        parser.add_argument("--num_parallel_jobs",
+                            type=int,
+                            help=("Size of job thread pool, or number of "
+                                  "worker processes when using the process "
+                                  "executor"),
+                            default=20)
+        parser.add_argument("--executor",
+                            type=str,
+                            choices=["thread", "process"],
+                            help=("Run jobs in a thread pool or in worker "
+                                  "processes. Default is thread."),
+                            default="thread")
+        parser.add_argument("--threads_per_process",
+                            type=int,
+                            help=("Number of jobs each worker process runs "
+                                  "concurrently when using the process "
+                                  "executor"),
+                            default=1)
+        parser.add_argument("--keep_data",
+                            action="store_true",
+                            help=("Keep the benchmark jobs, analytics and "
+                                  "synthetic courses and users."))
+
+    def create_synthetic_courses(self, course_sizes, courses_per_size,
+                                 num_assignments):
+        """
+        Create a benchmark term with synthetic courses, users and an
+        enrollment snapshot and register the courses with
+        SyntheticCanvasDAO.
+        """
+        self.delete_synthetic_data()
+        student_ids = [BENCHMARK_CANVAS_ID_BASE + i
+                       for i in range(max(course_sizes))]
+        with transaction.atomic():
+            term = Term.objects.create(sis_term_id=BENCHMARK_SIS_TERM_ID,
+                                       year=2099,
+                                       quarter="autumn",
+                                       label="Benchmark",
+                                       first_day_quarter=date(2099, 9, 24))
+            User.objects.bulk_create(
+                [User(canvas_user_id=student_id,
+                      login_id=f"student{student_id}",
+                      full_name=f"Student {student_id}",
+                      status="active")
+                 for student_id in student_ids],
+                batch_size=5000)
+            course_num = 0
+            enrollments = []
+            for course_size in course_sizes:
+                for _ in range(courses_per_size):
+                    course_num += 1
+                    canvas_course_id = BENCHMARK_CANVAS_ID_BASE + course_num
+                    Course.objects.create(
+                        canvas_course_id=canvas_course_id,
+                        sis_course_id=(f"{BENCHMARK_SIS_TERM_ID}-BENCHMARK-"
+                                       f"{course_num}"),
+                        status="active",
+                        term=term)
+                    course_student_ids = student_ids[:course_size]
+                    SyntheticCanvasDAO.register_course(
+                        canvas_course_id, course_student_ids,
+                        num_assignments)
+                    enrollments.extend(
+                        [Enrollment(term=term,
+                                    canvas_course_id=canvas_course_id,
+                                    canvas_user_id=student_id)
+                         for student_id in course_student_ids])
+            Enrollment.objects.bulk_create(enrollments, batch_size=5000)
+        return term
+
+    def delete_synthetic_data(self):
+        # deleting the term cascades to its weeks, courses, enrollments and
+        # the analytics saved for them
+        Term.objects.filter(sis_term_id=BENCHMARK_SIS_TERM_ID).delete()
+        User.objects.filter(
+            canvas_user_id__gte=BENCHMARK_CANVAS_ID_BASE).delete()
+
+    def get_canvas_settings(self, options):
+        canvas_settings = {
+            "RESTCLIENTS_DAO_CACHE_CLASS": None,
+            "DATA_AGGREGATOR_CANVAS_REPLAY_LATENCY": options["latency"],
+            "DATA_AGGREGATOR_CANVAS_REPLAY_ERROR_RATE": options["error_rate"],
+            "DATA_AGGREGATOR_CANVAS_REPLAY_THROTTLE_RATE":
+                options["throttle_rate"]
+        }
+        if options["canvas_dao"] == "replay":
+            canvas_settings["RESTCLIENTS_CANVAS_DAO_CLASS"] = \
+                "data_aggregator.canvas_replay.ReplayCanvasDAO"
+            if options["replay_dir"]:
+                canvas_settings["DATA_AGGREGATOR_CANVAS_REPLAY_DIR"] = \
+                    options["replay_dir"]
+        else:
+            canvas_settings["RESTCLIENTS_CANVAS_DAO_CLASS"] = \
+                "data_aggregator.canvas_replay.SyntheticCanvasDAO"
+        return canvas_settings
+
+    def handle(self, *args, **options):
+        job_name = options["job_name"]
+        canvas_dao = options["canvas_dao"]
+        if canvas_dao == "replay" and (options["sis_term_id"] is None or
+                                       options["week"] is None):
+            raise CommandError("--sis_term_id and --week are required when "
+                               "replaying recorded responses.")
+        if Job.objects.get_pending_or_running_jobs(job_name).exists():
+            # run_jobs would claim them along with the benchmark jobs
+            raise CommandError(f"Unable to benchmark while there are pending "
+                               f"or running {job_name} jobs.")
+
+        if canvas_dao == "synthetic":
+            term = self.create_synthetic_courses(
+                options["course_sizes"], options["courses_per_size"],
+                options["num_assignments"])
+            sis_term_id = term.sis_term_id
+            week_num = 1
+        else:
+            sis_term_id = options["sis_term_id"]
+            week_num = options["week"]
+
+        context = {"sis_term_id": sis_term_id, "week": week_num}
+        if options["num_parallel_downloads"] is not None:
+            context["num_parallel_downloads"] = \
+                options["num_parallel_downloads"]
+        job_type, _ = JobType.objects.get_or_create(type=job_name)
+        jobs = JobDAO().create_analytic_jobs(
+            job_type, Job.get_default_target_start(),
+            Job.get_default_target_end(), context=context)
+        job_ids = [job.id for job in jobs]
+
+        try:
+            with override_settings(**self.get_canvas_settings(options)):
+                api_call_count = get_api_call_count()
+                start = time.perf_counter()
+                call_command("run_jobs", job_name,
+                             num_parallel_jobs=options["num_parallel_jobs"],
+                             executor=options["executor"],
+                             threads_per_process=options[
+                                 "threads_per_process"])
+                elapsed = time.perf_counter() - start
+                api_call_count = get_api_call_count() - api_call_count
+
+            model = (Assignment if job_name == AnalyticTypes.assignment
+                     else Participation)
+            row_count = model.objects.filter(job_id__in=job_ids).count()
+            statuses = [job.status for job in
+                        Job.objects.filter(id__in=job_ids)]
+            self.report(job_name, elapsed, len(job_ids),
+                        statuses.count(JobStatusTypes.completed),
+                        statuses.count(JobStatusTypes.failed),
+                        api_call_count, row_count)
+        finally:
+            if not options["keep_data"]:
+                Job.objects.filter(id__in=job_ids).delete()
+                if canvas_dao == "synthetic":
+                    self.delete_synthetic_data()
+            SyntheticCanvasDAO.clear_courses()
+
+    def report(self, job_name, elapsed, job_count, completed_count,
+               failed_count, api_call_count, row_count):
+        elapsed = max(elapsed, 1e-9)
+        self.stdout.write(
+            f"{job_name} jobs: {job_count} ({completed_count} completed, "
+            f"{failed_count} failed) in {elapsed:.2f}s\n"
+            f"jobs/sec: {job_count / elapsed:.2f}\n"
+            f"api calls/sec: {api_call_count / elapsed:.2f}\n"
+            f"rows/sec: {row_count / elapsed:.2f}")
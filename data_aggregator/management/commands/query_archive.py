@@ -0,0 +1,41 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.core.management.base import BaseCommand
+from data_aggregator.dao import ArchiveDAO
+from data_aggregator.models import AnalyticTypes
+
+
+class Command(BaseCommand):
+
+    help = ("Export the archived analytics of a term archived by the "
+            "archive_term command as csv.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("sis_term_id",
+                            type=str,
+                            help=("Archived term to read."))
+        parser.add_argument("analytic_type",
+                            type=str,
+                            choices=[AnalyticTypes.assignment,
+                                     AnalyticTypes.participation],
+                            help=("Type of analytics to read."))
+        parser.add_argument("--week",
+                            type=int,
+                            help=("Only read the analytics of the week."),
+                            default=None)
+        parser.add_argument("--output",
+                            type=str,
+                            help=("Path of the csv file to write. Default "
+                                  "is stdout."),
+                            default=None)
+
+    def handle(self, *args, **options):
+        df = ArchiveDAO().read_archived_analytics(
+            options["sis_term_id"], options["analytic_type"],
+            week_num=options["week"])
+        if options["output"]:
+            df.to_csv(options["output"], index=False)
+        else:
+            self.stdout.write(df.to_csv(index=False))
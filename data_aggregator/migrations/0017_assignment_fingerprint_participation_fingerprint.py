@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0016_alter_adviser_user_alter_jobtype_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='participation',
+            name='fingerprint',
+            field=models.CharField(max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0017_assignment_fingerprint_participation_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanvasRateLimit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('process', models.CharField(max_length=255, unique=True)),
+                ('interval', models.FloatField(default=0.0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
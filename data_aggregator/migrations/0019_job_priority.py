@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0018_canvasratelimit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='priority',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+    ]
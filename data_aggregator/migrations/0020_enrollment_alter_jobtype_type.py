@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0019_job_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Enrollment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canvas_course_id', models.BigIntegerField()),
+                ('canvas_user_id', models.BigIntegerField()),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_aggregator.term')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'canvas_course_id'], name='enrollment_term_course_idx')],
+            },
+        ),
+        migrations.AlterField(
+            model_name='jobtype',
+            name='type',
+            field=models.CharField(choices=[('assignment', 'AssignmentJob'), ('participation', 'ParticipationJob'), ('create_terms', 'CreateTermsJob'), ('create_or_update_courses', 'CreateOrUpdateCoursesJob'), ('create_or_update_users', 'CreateOrUpdateUsersJob'), ('create_assignment_db_view', 'CreateAssignmentDBViewJob'), ('create_participation_db_view', 'CreateParticipationDBViewJob'), ('create_rad_db_view', 'CreateRadDBViewJob'), ('create_rad_data_file', 'CreateRadDataFileJob'), ('create_compass_db_view', 'CreateCompassDBViewJob'), ('create_compass_data_file', 'CreateCompassDataFileJob'), ('create_student_categories_data_file', 'CreateStudentCategoriesDataFileJob'), ('create_or_update_enrollments', 'CreateOrUpdateEnrollmentsJob')], max_length=64),
+        ),
+    ]
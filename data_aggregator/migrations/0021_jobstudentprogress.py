@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0020_enrollment_alter_jobtype_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobStudentProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canvas_user_id', models.BigIntegerField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_aggregator.job')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('job', 'canvas_user_id'), name='unique_job_student_progress')],
+            },
+        ),
+    ]
@@ -0,0 +1,167 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations
+
+
+# the tables, constraints and helpers are frozen as of this migration so
+# that later changes to data_aggregator.partitions don't change it.
+
+# table -> unique constraint and foreign keys recreated on the rebuilt
+# table. unique constraints of partitioned tables must include week_id.
+PARTITIONED_TABLES = {
+    "data_aggregator_assignment": {
+        "unique": ("unique_assignment",
+                   ["user_id", "course_id", "assignment_id", "week_id"]),
+        "foreign_keys": {"course_id": "data_aggregator_course",
+                         "job_id": "data_aggregator_job",
+                         "user_id": "data_aggregator_user",
+                         "week_id": "data_aggregator_week"}
+    },
+    "data_aggregator_participation": {
+        "unique": ("unique_participation",
+                   ["user_id", "course_id", "week_id"]),
+        "foreign_keys": {"course_id": "data_aggregator_course",
+                         "job_id": "data_aggregator_job",
+                         "user_id": "data_aggregator_user",
+                         "week_id": "data_aggregator_week"}
+    }
+}
+
+
+def get_partition_name(table, week_id):
+    return f"{table}_week_{week_id}"
+
+
+def get_default_partition_name(table):
+    return f"{table}_default"
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table "
+                   "WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def _get_dependent_views(cursor, tables):
+    # views built on the tables, including views built on those views,
+    # ordered so that every view comes after the views it selects from
+    cursor.execute(
+        """
+        WITH RECURSIVE deps(oid, depth) AS (
+            SELECT DISTINCT r.ev_class, 1
+            FROM pg_depend d
+            JOIN pg_rewrite r ON d.objid = r.oid
+            WHERE d.classid = 'pg_rewrite'::regclass
+            AND d.refobjid = ANY(%s::regclass[])
+            AND r.ev_class <> d.refobjid
+            UNION
+            SELECT DISTINCT r.ev_class, deps.depth + 1
+            FROM pg_depend d
+            JOIN pg_rewrite r ON d.objid = r.oid
+            JOIN deps ON d.refobjid = deps.oid
+            WHERE d.classid = 'pg_rewrite'::regclass
+            AND r.ev_class <> deps.oid
+        )
+        SELECT c.relname, pg_get_viewdef(c.oid), MAX(deps.depth)
+        FROM deps
+        JOIN pg_class c ON c.oid = deps.oid
+        WHERE c.relkind = 'v'
+        GROUP BY c.oid, c.relname
+        ORDER BY MAX(deps.depth), c.relname
+        """, [list(tables)])
+    return [(name, definition) for name, definition, _ in cursor.fetchall()]
+
+
+def _move_id_sequence(cursor, old_table, table):
+    # give the rebuilt table its own id sequence continuing from the old
+    # table's sequence, which may be a serial or an identity sequence
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old_table])
+    sequence = cursor.fetchone()[0]
+    cursor.execute(f"SELECT last_value FROM {sequence}")
+    last_value = cursor.fetchone()[0]
+    cursor.execute("SELECT attidentity FROM pg_attribute "
+                   "WHERE attrelid = to_regclass(%s) AND attname = 'id'",
+                   [old_table])
+    if cursor.fetchone()[0]:
+        cursor.execute(f'ALTER TABLE "{old_table}" ALTER COLUMN id '
+                       f'DROP IDENTITY')
+    else:
+        cursor.execute(f'ALTER TABLE "{old_table}" ALTER COLUMN id '
+                       f'DROP DEFAULT')
+        cursor.execute(f"DROP SEQUENCE {sequence}")
+    cursor.execute(f'CREATE SEQUENCE "{table}_id_seq"')
+    cursor.execute("SELECT setval(%s, %s)", [f"{table}_id_seq", last_value])
+    cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN id SET DEFAULT '
+                   f'nextval(\'"{table}_id_seq"\')')
+    cursor.execute(f'ALTER SEQUENCE "{table}_id_seq" OWNED BY "{table}".id')
+
+
+def _rebuild_table(cursor, table, partitioned):
+    spec = PARTITIONED_TABLES[table]
+    old_table = f"{table}_old"
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old_table}"')
+    partition_clause = " PARTITION BY LIST (week_id)" if partitioned else ""
+    cursor.execute(f'CREATE TABLE "{table}" (LIKE "{old_table}" '
+                   f'INCLUDING DEFAULTS){partition_clause}')
+    _move_id_sequence(cursor, old_table, table)
+    if partitioned:
+        cursor.execute(f'CREATE TABLE "{get_default_partition_name(table)}" '
+                       f'PARTITION OF "{table}" DEFAULT')
+        cursor.execute("SELECT id FROM data_aggregator_week")
+        for (week_id,) in cursor.fetchall():
+            partition = get_partition_name(table, week_id)
+            cursor.execute(f'CREATE TABLE "{partition}" PARTITION OF '
+                           f'"{table}" FOR VALUES IN ({week_id})')
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old_table}"')
+    cursor.execute(f'DROP TABLE "{old_table}"')
+
+    # primary keys of partitioned tables must include the partition key
+    pk_columns = "id, week_id" if partitioned else "id"
+    cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" '
+                   f'PRIMARY KEY ({pk_columns})')
+    unique_name, unique_columns = spec["unique"]
+    cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{unique_name}" '
+                   f'UNIQUE ({", ".join(unique_columns)})')
+    for column, ref_table in spec["foreign_keys"].items():
+        cursor.execute(f'CREATE INDEX "{table}_{column}_idx" '
+                       f'ON "{table}" ({column})')
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT '
+                       f'"{table}_{column}_fk" FOREIGN KEY ({column}) '
+                       f'REFERENCES "{ref_table}" (id) '
+                       f'DEFERRABLE INITIALLY DEFERRED')
+
+
+def _rebuild_tables(schema_editor, partitioned):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        views = _get_dependent_views(cursor, PARTITIONED_TABLES.keys())
+        for name, _ in reversed(views):
+            cursor.execute(f'DROP VIEW IF EXISTS "{name}"')
+        for table in PARTITIONED_TABLES:
+            if is_partitioned(cursor, table) != partitioned:
+                _rebuild_table(cursor, table, partitioned)
+        for name, definition in views:
+            cursor.execute(f'CREATE VIEW "{name}" AS {definition}')
+
+
+def partition_tables(apps, schema_editor):
+    # rebuild the analytic tables partitioned by week with a partition for
+    # every existing week
+    _rebuild_tables(schema_editor, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor):
+    # rebuild the analytic tables as regular tables
+    _rebuild_tables(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0021_jobstudentprogress'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,186 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+DEFINITION_COLUMNS = ["title", "unlock_at", "points_possible",
+                      "non_digital_submission", "due_at", "muted",
+                      "min_score", "max_score", "first_quartile", "median",
+                      "third_quartile"]
+
+# columns of the weekly assignment views after the term, week, course, user
+# and assignment ids, in the order the views were created with
+VIEW_COLUMNS = ["score", "due_at", "points_possible", "status", "excused",
+                "first_quartile", "max_score", "median", "min_score",
+                "muted", "non_digital_submission", "posted_at",
+                "submitted_at", "third_quartile", "title"]
+
+
+def create_definitions(apps, schema_editor):
+    # one definition per course, assignment and week, taken from the first
+    # student row of the assignment
+    columns = ", ".join(DEFINITION_COLUMNS)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO data_aggregator_assignmentdefinition
+                (course_id, week_id, assignment_id, {columns})
+            SELECT course_id, week_id, assignment_id, {columns}
+            FROM data_aggregator_assignment
+            WHERE id IN (
+                SELECT MIN(id) FROM data_aggregator_assignment
+                WHERE assignment_id IS NOT NULL
+                GROUP BY course_id, assignment_id, week_id)
+            """)
+        cursor.execute(
+            """
+            UPDATE data_aggregator_assignment SET definition_id = (
+                SELECT d.id FROM data_aggregator_assignmentdefinition d
+                WHERE d.course_id = data_aggregator_assignment.course_id
+                AND d.assignment_id = data_aggregator_assignment.assignment_id
+                AND d.week_id = data_aggregator_assignment.week_id)
+            """)
+
+
+def copy_definitions_back(apps, schema_editor):
+    set_clause = ", ".join(
+        f"{column} = (SELECT d.{column} "
+        f"FROM data_aggregator_assignmentdefinition d "
+        f"WHERE d.id = data_aggregator_assignment.definition_id)"
+        for column in DEFINITION_COLUMNS)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"UPDATE data_aggregator_assignment SET {set_clause}")
+
+
+def _replace_assignment_views(apps, schema_editor, use_definitions):
+    # the weekly assignment views select the columns that move to the
+    # definition table. replace them in place so that the columns can be
+    # dropped without cascading to the views and the views built on them.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    # replaced views must have the same columns in the same order
+    select_columns = ", ".join(
+        f"d.{column}" if use_definitions and column in DEFINITION_COLUMNS
+        else f"a.{column}" for column in VIEW_COLUMNS)
+    join = ("LEFT JOIN data_aggregator_assignmentdefinition d "
+            "ON a.definition_id = d.id" if use_definitions else "")
+    Week = apps.get_model("data_aggregator", "Week")
+    with schema_editor.connection.cursor() as cursor:
+        for week in Week.objects.select_related("term"):
+            sis_term_id = week.term.sis_term_id.replace("-", "_")
+            view_name = f"{sis_term_id}_week_{week.week}_assignments"
+            cursor.execute("SELECT to_regclass(%s)", [f'"{view_name}"'])
+            if cursor.fetchone()[0] is None:
+                continue
+            cursor.execute(
+                f'''
+                CREATE OR REPLACE VIEW "{view_name}" AS
+                SELECT
+                    data_aggregator_term.id AS term_id,
+                    data_aggregator_week.id AS week_id,
+                    a.course_id,
+                    a.user_id,
+                    a.assignment_id,
+                    {select_columns}
+                FROM data_aggregator_assignment a
+                {join}
+                JOIN data_aggregator_week ON
+                a.week_id = data_aggregator_week.id
+                JOIN data_aggregator_term ON
+                data_aggregator_week.term_id = data_aggregator_term.id
+                WHERE a.week_id = {week.id}
+                ''')
+
+
+def use_definitions_in_views(apps, schema_editor):
+    _replace_assignment_views(apps, schema_editor, use_definitions=True)
+
+
+def use_assignment_columns_in_views(apps, schema_editor):
+    _replace_assignment_views(apps, schema_editor, use_definitions=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0022_partition_analytics_by_week'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentDefinition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assignment_id', models.IntegerField()),
+                ('title', models.TextField(null=True)),
+                ('unlock_at', models.DateTimeField(null=True)),
+                ('points_possible', models.DecimalField(decimal_places=3, max_digits=13, null=True)),
+                ('non_digital_submission', models.BooleanField(null=True)),
+                ('due_at', models.DateTimeField(null=True)),
+                ('muted', models.BooleanField(null=True)),
+                ('min_score', models.DecimalField(decimal_places=3, max_digits=13, null=True)),
+                ('max_score', models.DecimalField(decimal_places=3, max_digits=13, null=True)),
+                ('first_quartile', models.IntegerField(null=True)),
+                ('median', models.IntegerField(null=True)),
+                ('third_quartile', models.IntegerField(null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_aggregator.course')),
+                ('week', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='data_aggregator.week')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('course', 'assignment_id', 'week'), name='unique_assignment_definition')],
+            },
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='definition',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='data_aggregator.assignmentdefinition'),
+        ),
+        migrations.RunPython(create_definitions, copy_definitions_back),
+        migrations.RunPython(use_definitions_in_views,
+                             use_assignment_columns_in_views),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='title',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='unlock_at',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='points_possible',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='non_digital_submission',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='due_at',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='muted',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='min_score',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='max_score',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='first_quartile',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='median',
+        ),
+        migrations.RemoveField(
+            model_name='assignment',
+            name='third_quartile',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+def set_valid_weeks(apps, schema_editor):
+    # rows saved before versioning are valid for the week they were saved
+    # for only
+    with schema_editor.connection.cursor() as cursor:
+        for table in ["data_aggregator_assignment",
+                      "data_aggregator_participation"]:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET
+                    valid_from_week = (
+                        SELECT w.week FROM data_aggregator_week w
+                        WHERE w.id = {table}.week_id),
+                    valid_to_week = (
+                        SELECT w.week FROM data_aggregator_week w
+                        WHERE w.id = {table}.week_id)
+                """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0023_assignmentdefinition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='valid_from_week',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='valid_to_week',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='participation',
+            name='valid_from_week',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='participation',
+            name='valid_to_week',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.RunPython(set_valid_weeks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+def set_job_status(apps, schema_editor):
+    # same rules as Job.get_status, checked in the same order
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE data_aggregator_job SET status = CASE
+                WHEN pid IS NOT NULL AND start IS NOT NULL
+                    AND "end" IS NOT NULL
+                    AND (message IS NULL OR message = '') THEN 'completed'
+                WHEN message IS NOT NULL AND message <> '' THEN 'failed'
+                WHEN pid IS NOT NULL AND start IS NOT NULL
+                    AND "end" IS NULL THEN 'running'
+                WHEN target_date_end < CURRENT_TIMESTAMP THEN 'expired'
+                WHEN pid IS NULL AND start IS NULL
+                    AND "end" IS NULL THEN 'pending'
+                WHEN pid IS NOT NULL AND start IS NULL
+                    AND "end" IS NULL THEN 'claimed'
+            END
+            """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0024_analytics_valid_weeks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='status',
+            field=models.CharField(db_index=True, default='pending', max_length=16, null=True),
+        ),
+        migrations.RunPython(set_job_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0025_job_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_aggregator', '0026_job_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='advisers_checked',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -6,11 +6,13 @@ import os
 import csv
 import logging
 from datetime import datetime, date, timedelta, timezone as dt_timezone
-from django.db import models, IntegrityError
-from django.db.models import Q, Prefetch
+from django.db import connection, models, transaction
+from django.db.models import F, Q, Case, CharField, Prefetch, Value, When
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from data_aggregator.exceptions import TermNotStarted
-from data_aggregator import utilities
+from data_aggregator import partitions, utilities
 from uw_sws.term import get_term_by_date, get_term_by_year_and_quarter
 from uw_sws import SWS_TIMEZONE
 
@@ -181,6 +183,13 @@ class Week(models.Model):
         unique_together = ('term', 'week',)
 
 
+@receiver(post_save, sender=Week)
+def create_partitions_for_week(sender, instance, created, **kwargs):
+    # analytics for a new week are saved to their own partitions
+    if created:
+        partitions.create_week_partitions(instance.id)
+
+
 class Course(models.Model):
 
     canvas_course_id = models.BigIntegerField()
@@ -194,8 +203,101 @@ class Course(models.Model):
                              on_delete=models.CASCADE)
 
 
+class EnrollmentManager(models.Manager):
+
+    def get_student_ids_for_course(self, sis_term_id, canvas_course_id):
+        """
+        Return list of canvas user ids of the students enrolled in a course
+        according to the term's enrollment snapshot, or None if no snapshot
+        has been loaded for the term.
+
+        :param sis_term_id: sis term id of the course
+        :type sis_term_id: str
+        :param canvas_course_id: canvas course id to get students for
+        :type canvas_course_id: int
+        """
+        enrollments = self.get_queryset().filter(
+            term__sis_term_id=sis_term_id)
+        student_ids = list(enrollments
+                           .filter(canvas_course_id=canvas_course_id)
+                           .values_list("canvas_user_id", flat=True)
+                           .distinct())
+        if not student_ids and not enrollments.exists():
+            return None
+        return student_ids
+
+
+class Enrollment(models.Model):
+    """
+    Represents a student enrollment in a course from the term enrollment
+    provisioning report snapshot
+    """
+
+    objects = EnrollmentManager()
+    term = models.ForeignKey(Term,
+                             on_delete=models.CASCADE)
+    canvas_course_id = models.BigIntegerField()
+    canvas_user_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'canvas_course_id'],
+                         name='enrollment_term_course_idx')
+        ]
+
+
+class UserManager(models.Manager):
+
+    def get_user_ids(self, canvas_user_ids):
+        """
+        Return dictionary mapping canvas_user_id to User primary key for the
+        supplied canvas user ids. Unknown canvas user ids are omitted.
+
+        :param canvas_user_ids: canvas user ids to look up
+        :type canvas_user_ids: iterable
+        """
+        return dict(self.get_queryset()
+                    .filter(canvas_user_id__in=list(canvas_user_ids))
+                    .values_list("canvas_user_id", "id"))
+
+    def get_users_for_adviser_refresh(self, stale_before, term):
+        """
+        Return the active users whose advisers need to be refreshed. These
+        are users whose advisers have never been checked or were last
+        checked before stale_before, and users enrolled in the given term.
+
+        :param stale_before: advisers checked before this time are stale
+        :type stale_before: datetime.datetime
+        :param term: term whose enrolled students are always refreshed
+        :type term: data_aggregator.models.Term
+        """
+        enrolled_ids = (Enrollment.objects
+                        .filter(term=term)
+                        .values("canvas_user_id"))
+        return (self.get_queryset()
+                .filter(status='active')
+                .filter(Q(advisers_checked__isnull=True) |
+                        Q(advisers_checked__lt=stale_before) |
+                        Q(canvas_user_id__in=enrolled_ids)))
+
+    def set_advisers_checked(self, user_ids, checked):
+        """
+        Record when the advisers of the given users were last downloaded.
+
+        :param user_ids: ids of the users whose advisers were downloaded
+        :type user_ids: list
+        :param checked: time the advisers were downloaded
+        :type checked: datetime.datetime
+        """
+        for i in range(0, len(user_ids), 5000):
+            (self.get_queryset()
+             .filter(id__in=user_ids[i:i + 5000])
+             .update(advisers_checked=checked))
+
+
 class User(models.Model):
 
+    objects = UserManager()
     canvas_user_id = models.BigIntegerField(unique=True)
     login_id = models.TextField(null=True)
     sis_user_id = models.TextField(null=True)
@@ -205,6 +307,8 @@ class User(models.Model):
     sortable_name = models.TextField(null=True)
     email = models.TextField(null=True)
     status = models.TextField(null=True)
+    # time the user's advisers were last downloaded from sws
+    advisers_checked = models.DateTimeField(null=True)
 
 
 class AdviserTypes():
@@ -276,25 +380,107 @@ class JobManager(models.Manager):
         jobs = self.get_pending_jobs(jobtype) | self.get_running_jobs(jobtype)
         return jobs
 
-    def claim_batch_of_jobs(self, jobtype, batchsize=None):
-        # check for pending jobs to claim
-        jobs = self.get_pending_jobs(jobtype)
-        if jobs.count() == 0:
-            # Check to see if we can instead reclaim jobs in case another
-            # process crashed and left the db in a stale state. This only
-            # works since there is only one daemon process per job type so
-            # worker cronjobs aren't competing with each other.
-            jobs = self.get_pending_or_running_jobs(jobtype)
-            if jobs.count() > 0:
-                logging.warning(f"Reclaiming {jobs.count()} jobs.")
+    def get_expired_lease_jobs(self, jobtype, lease_seconds):
+        """
+        Return claimed or running jobs of the given type whose heartbeat
+        wasn't refreshed within the last lease_seconds, which means the
+        process that claimed them stopped.
+        """
+        cutoff = timezone.now() - timedelta(seconds=lease_seconds)
+        return (self.get_running_jobs(jobtype)
+                .filter(Q(heartbeat__lt=cutoff) | Q(heartbeat=None)))
 
+    def _claim_jobs(self, jobs, batchsize=None):
+        """
+        Claim the given jobs for this process with a single UPDATE ...
+        RETURNING over the rows selected with SELECT ... FOR UPDATE SKIP
+        LOCKED, so that concurrent workers never claim the same job. Rows
+        locked by another worker's claim are skipped rather than waited on.
+        Returns the list of claimed jobs.
+        """
+        # claim the highest priority (largest) jobs first
+        jobs = (jobs.order_by('-priority', 'id')
+                .select_for_update(skip_locked=True, of=('self',))
+                .values('id'))
         if batchsize is not None:
             jobs = jobs[:batchsize]
+        qn = connection.ops.quote_name
+        with transaction.atomic():
+            select_sql, params = jobs.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {qn(Job._meta.db_table)} SET "
+                    f"{qn('pid')} = %s, {qn('start')} = NULL, "
+                    f"{qn('end')} = NULL, {qn('message')} = '', "
+                    f"{qn('status')} = %s, {qn('heartbeat')} = %s "
+                    f"WHERE {qn('id')} IN ({select_sql}) "
+                    f"RETURNING {qn('id')}",
+                    [os.getpid(), JobStatusTypes.claimed,
+                     connection.ops.adapt_datetimefield_value(timezone.now())]
+                    + list(params))
+                job_ids = [job_id for (job_id,) in cursor.fetchall()]
+        if not job_ids:
+            return []
+        return list(self.get_queryset()
+                    .select_related('type')
+                    .filter(id__in=job_ids)
+                    .order_by('-priority', 'id'))
+
+    def claim_batch_of_jobs(self, jobtype, batchsize=None, reclaim=False,
+                            lease_seconds=600):
+        """
+        Claim a batch of pending jobs of the given type. Any number of
+        worker processes can claim jobs of the same type concurrently.
+
+        :param jobtype: type of jobs to claim
+        :type jobtype: str
+        :param batchsize: maximum number of jobs to claim, default is all
+        :type batchsize: int
+        :param reclaim: if there are no pending jobs, reclaim claimed or
+            running jobs whose lease expired because the process running
+            them crashed. Running jobs keep their lease by refreshing their
+            heartbeat.
+        :type reclaim: bool
+        :param lease_seconds: number of seconds after the last heartbeat
+            that a job's lease expires
+        :type lease_seconds: int
+        """
+        jobs = self._claim_jobs(self.get_pending_jobs(jobtype),
+                                batchsize=batchsize)
+        if not jobs and reclaim:
+            jobs = self._claim_jobs(
+                self.get_expired_lease_jobs(jobtype, lease_seconds),
+                batchsize=batchsize)
+            if jobs:
+                logging.warning(f"Reclaimed {len(jobs)} jobs.")
+        return jobs
 
-        for job in jobs:
-            job.claim_job()
+    def expire_jobs(self):
+        """
+        Mark pending and claimed jobs whose target end date has passed as
+        expired. Run periodically since a job's stored status is only
+        updated when the job is saved. Returns the number of expired jobs.
+        """
+        return (self.get_queryset()
+                .filter(status__in=[JobStatusTypes.pending,
+                                    JobStatusTypes.claimed])
+                .filter(target_date_end__lt=timezone.now())
+                .update(status=JobStatusTypes.expired))
 
-        return jobs
+    def with_current_status(self):
+        """
+        Annotate jobs with current_status, their stored status with pending
+        and claimed jobs whose target end date has passed read as expired,
+        without waiting for expire_jobs to mark them.
+        """
+        return self.get_queryset().annotate(
+            current_status=Case(
+                When(status__in=[JobStatusTypes.pending,
+                                 JobStatusTypes.claimed],
+                     target_date_end__lt=timezone.now(),
+                     then=Value(JobStatusTypes.expired)),
+                default=F("status"),
+                output_field=CharField()))
 
     def restart_jobs(self, job_ids, *args, **kwargs):
         jobs = self.filter(id__in=job_ids)
@@ -328,6 +514,7 @@ class TaskTypes():
     create_compass_data_file = "create_compass_data_file"
     build_subaccount_activity_report = "build_subaccount_activity_report"
     export_subaccount_activity_report = "export_subaccount_activity_report"
+    create_or_update_enrollments = "create_or_update_enrollments"
 
 
 class JobType(models.Model):
@@ -346,7 +533,9 @@ class JobType(models.Model):
         (TaskTypes.create_compass_db_view, 'CreateCompassDBViewJob'),
         (TaskTypes.create_compass_data_file, 'CreateCompassDataFileJob'),
         (TaskTypes.create_student_categories_data_file,
-         'CreateStudentCategoriesDataFileJob'))
+         'CreateStudentCategoriesDataFileJob'),
+        (TaskTypes.create_or_update_enrollments,
+         'CreateOrUpdateEnrollmentsJob'))
     type = models.CharField(max_length=64, choices=JOB_CHOICES)
 
 
@@ -378,7 +567,17 @@ class Job(models.Model):
     start = models.DateTimeField(null=True)
     end = models.DateTimeField(null=True)
     message = models.TextField()
-    created = models.DateTimeField(auto_now_add=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    priority = models.IntegerField(default=0, db_index=True)
+    # stored so that jobs can be filtered, counted and sorted by status in
+    # the database. kept up to date on save, expired jobs are marked by
+    # JobManager.expire_jobs.
+    status = models.CharField(max_length=16, null=True,
+                              default=JobStatusTypes.pending, db_index=True)
+    # refreshed by the process that claimed the job while it holds the job.
+    # claimed and running jobs whose heartbeat is older than the lease can
+    # be reclaimed.
+    heartbeat = models.DateTimeField(null=True)
 
     @staticmethod
     def get_default_target_start():
@@ -390,8 +589,7 @@ class Job(models.Model):
         tomorrow = now + timedelta(days=1)
         return tomorrow
 
-    @property
-    def status(self):
+    def get_status(self):
         # The order of these checks matters. We always want to display
         # completed, failed, aand running jobs, while pending and claimed
         # jobs may expire.
@@ -410,6 +608,10 @@ class Job(models.Model):
                 not self.message):
             return JobStatusTypes.claimed
 
+    def save(self, *args, **kwargs):
+        self.status = self.get_status()
+        super(Job, self).save(*args, **kwargs)
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -427,17 +629,28 @@ class Job(models.Model):
 
     def claim_job(self, *args, **kwargs):
         self.pid = os.getpid()
+        self.heartbeat = timezone.now()
         self.start = None
         self.end = None
         self.message = ''
+        self.status = self.get_status()
         if kwargs.get("save", True) is True:
             super(Job, self).save(*args, **kwargs)
 
+    def refresh_heartbeat(self):
+        """
+        Refresh the job's lease without saving its other fields.
+        """
+        self.heartbeat = timezone.now()
+        Job.objects.filter(id=self.id).update(heartbeat=self.heartbeat)
+
     def start_job(self, *args, **kwargs):
         if self.pid:
             self.start = timezone.now()
+            self.heartbeat = self.start
             self.end = None
             self.message = ''
+            self.status = self.get_status()
             if kwargs.get("save", True) is True:
                 super(Job, self).save(*args, **kwargs)
         else:
@@ -449,6 +662,7 @@ class Job(models.Model):
         if self.pid and self.start:
             self.end = timezone.now()
             self.message = ''
+            self.status = self.get_status()
             if kwargs.get("save", True) is True:
                 super(Job, self).save(*args, **kwargs)
         else:
@@ -456,33 +670,320 @@ class Job(models.Model):
                                "and/or claimed. Perhaps this was a running "
                                "job that was restarted.")
 
-    def restart_job(self, *args, **kwargs):
+    def restart_job(self, *args, resume=False, **kwargs):
+        """
+        Reset the job so that it is claimed and run again. Unless resume is
+        True the job's student progress is cleared so that the rerun
+        reloads all of its analytics instead of resuming.
+        """
         self.pid = None
         self.start = None
         self.end = None
         self.target_date_start = Job.get_default_target_start()
         self.target_date_end = Job.get_default_target_end()
         self.message = ""
+        self.status = self.get_status()
         if kwargs.get("save", True) is True:
             super(Job, self).save(*args, **kwargs)
+            if not resume:
+                JobStudentProgress.objects.filter(job=self).delete()
+
+
+def split_analytic_versions(model, row_ids, week):
+    """
+    Remove the given week from versions of analytics that are valid for the
+    week so that a rerun of the week can save the week's analytics without
+    changing the weeks around it. The part of a version after the week is
+    copied to a new version that starts the week after, and the version
+    itself is ended the week before, or limited to the week if it starts in
+    the week. Returns the number of versions copied.
+
+    :param model: Assignment or Participation
+    :param row_ids: ids of the versions to split
+    :type row_ids: list
+    :param week: week to remove from the versions
+    :type week: data_aggregator.models.Week
+    """
+    row_ids = list(row_ids)
+    if not row_ids:
+        return 0
+    later_ids = list(model.objects
+                     .filter(id__in=row_ids, valid_to_week__gt=week.week)
+                     .values_list('id', flat=True))
+    if later_ids:
+        next_week, _ = Week.objects.get_or_create(term_id=week.term_id,
+                                                  week=week.week + 1)
+        qn = connection.ops.quote_name
+        columns = []
+        values = []
+        params = []
+        for field in model._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            columns.append(qn(field.column))
+            if field.name == 'week':
+                values.append('%s')
+                params.append(next_week.id)
+            elif field.name == 'valid_from_week':
+                values.append('%s')
+                params.append(next_week.week)
+            elif field.name == 'definition':
+                # copies reference the definition for the week after when
+                # there is one
+                values.append(
+                    f"COALESCE((SELECT d.id FROM "
+                    f"{qn(field.related_model._meta.db_table)} d "
+                    f"WHERE d.course_id = src.course_id "
+                    f"AND d.assignment_id = src.assignment_id "
+                    f"AND d.week_id = %s), src.{qn(field.column)})")
+                params.append(next_week.id)
+            else:
+                values.append(f"src.{qn(field.column)}")
+        sql = (
+            f"INSERT INTO {qn(model._meta.db_table)} "
+            f"({', '.join(columns)}) "
+            f"SELECT {', '.join(values)} "
+            f"FROM {qn(model._meta.db_table)} src "
+            f"WHERE src.{qn(model._meta.pk.column)} IN "
+            f"({', '.join(['%s'] * len(later_ids))})"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + later_ids)
+    (model.objects
+     .filter(id__in=row_ids, valid_from_week__lt=week.week)
+     .update(valid_to_week=week.week - 1))
+    (model.objects
+     .filter(id__in=row_ids, valid_from_week=week.week)
+     .update(valid_to_week=week.week))
+    return len(later_ids)
+
+
+def extend_unchanged_analytics(model, analytics, course, week, key_fields):
+    """
+    Slowly changing dimension storage of analytics. Each stored row is a
+    version of an analytic that is valid from valid_from_week through
+    valid_to_week of the course's term, saved to the week it starts in.
+    Analytics that are unchanged from their version for the given week, or
+    from their version for the previous week if none is valid for the
+    given week, aren't written again:
+
+    - versions for the previous week are extended through the given week
+    - versions for the given week are left as they are
+
+    When a changed analytic replaces a version that is valid for the given
+    week, the week is split out of the version (see split_analytic_versions)
+    so that saving a week again, after later weeks were saved, doesn't
+    change the later weeks. Returns the number of unchanged analytics, which
+    are removed from analytics.
+
+    :param model: Assignment or Participation
+    :param analytics: mapping of key to unsaved analytic, modified in place
+    :type analytics: dict
+    :param course: course the analytics are for
+    :type course: data_aggregator.models.Course
+    :param week: week the analytics are being saved for
+    :type week: data_aggregator.models.Week
+    :param key_fields: fields the analytics mapping is keyed on
+    :type key_fields: list
+    """
+    if not analytics:
+        return 0
+    rows = (model.objects
+            .filter(course=course,
+                    user_id__in={analytic.user_id
+                                 for analytic in analytics.values()},
+                    valid_from_week__lte=week.week,
+                    valid_to_week__gte=week.week - 1)
+            .values_list(*key_fields, 'id', 'fingerprint', 'valid_to_week'))
+    current_versions = {}
+    previous_versions = {}
+    for row in rows:
+        key = row[0] if len(key_fields) == 1 else row[:len(key_fields)]
+        row_id, fingerprint, valid_to_week = row[len(key_fields):]
+        if valid_to_week >= week.week:
+            current_versions[key] = (row_id, fingerprint)
+        else:
+            previous_versions[key] = (row_id, fingerprint)
+    extend_ids = []
+    split_ids = []
+    unchanged_count = 0
+    for key, analytic in list(analytics.items()):
+        if key in current_versions:
+            row_id, fingerprint = current_versions[key]
+            if analytic.fingerprint == fingerprint:
+                del analytics[key]
+                unchanged_count += 1
+            else:
+                split_ids.append(row_id)
+        elif key in previous_versions:
+            row_id, fingerprint = previous_versions[key]
+            if analytic.fingerprint == fingerprint:
+                extend_ids.append(row_id)
+                del analytics[key]
+                unchanged_count += 1
+    model.objects.filter(id__in=extend_ids).update(valid_to_week=week.week)
+    split_analytic_versions(model, split_ids, week)
+    return unchanged_count
+
+
+def delete_week_analytics(model, week, job=None):
+    """
+    Delete the analytic rows saved for the given week, or only the rows
+    saved by the given job, with a single DELETE statement. Nothing
+    references analytic rows, so unlike QuerySet.delete() no rows need to
+    be collected first. Filtering on the week lets PostgreSQL only scan the
+    week's partition. Returns the number of deleted rows.
+
+    :param model: Assignment or Participation
+    :param week: week to delete the rows of
+    :type week: data_aggregator.models.Week
+    :param job: if given, only delete rows saved by this job
+    :type job: data_aggregator.models.Job
+    """
+    qn = connection.ops.quote_name
+    sql = (f"DELETE FROM {qn(model._meta.db_table)} "
+           f"WHERE {qn(model._meta.get_field('week').column)} = %s")
+    params = [week.id]
+    if job is not None:
+        sql += f" AND {qn(model._meta.get_field('job').column)} = %s"
+        params.append(job.id)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+class JobStudentProgressManager(models.Manager):
+
+    def get_saved_student_ids(self, job):
+        """
+        Return set of canvas user ids of the students whose analytics have
+        been saved for the given job.
+        """
+        return set(self.get_queryset()
+                   .filter(job=job)
+                   .values_list("canvas_user_id", flat=True))
+
+    def record_saved_students(self, job, canvas_user_ids):
+        """
+        Record that the analytics of the given students have been saved for
+        the given job.
+        """
+        self.bulk_create(
+            [JobStudentProgress(job=job, canvas_user_id=canvas_user_id)
+             for canvas_user_id in canvas_user_ids],
+            ignore_conflicts=True)
+
+
+class JobStudentProgress(models.Model):
+    """
+    Represents a student whose analytics have been saved by a job that hasn't
+    completed yet
+    """
+
+    objects = JobStudentProgressManager()
+    job = models.ForeignKey(Job,
+                            on_delete=models.CASCADE)
+    canvas_user_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'canvas_user_id'],
+                                    name='unique_job_student_progress')
+        ]
+
+
+class AssignmentDefinitionManager(models.Manager):
+
+    # fields overwritten when an assignment definition already exists
+    UPDATE_FIELDS = ['title', 'unlock_at', 'points_possible',
+                     'non_digital_submission', 'due_at', 'muted',
+                     'min_score', 'max_score', 'first_quartile', 'median',
+                     'third_quartile']
+
+    def bulk_create_or_update_definitions(self, week, course,
+                                          raw_assign_dicts):
+        """
+        Create or update the definitions of the assignments in a batch of
+        raw assignment dictionaries using a single upsert statement keyed on
+        the unique_assignment_definition constraint.
+
+        Returns a mapping of assignment_id to AssignmentDefinition id.
+        """
+        definitions = {}
+        for raw_assign_dict in raw_assign_dicts:
+            assignment_id = raw_assign_dict.get('assignment_id')
+            if assignment_id is None:
+                continue
+            definition = AssignmentDefinition(course=course, week=week,
+                                              assignment_id=assignment_id)
+            for field in self.UPDATE_FIELDS:
+                setattr(definition, field, raw_assign_dict.get(field))
+            definitions[assignment_id] = definition
+        if not definitions:
+            return {}
+        self.bulk_create(
+            definitions.values(),
+            update_conflicts=True,
+            unique_fields=['course', 'assignment_id', 'week'],
+            update_fields=self.UPDATE_FIELDS)
+        # not every database returns the ids of upserted rows
+        return dict(self.get_queryset()
+                    .filter(course=course, week=week,
+                            assignment_id__in=definitions.keys())
+                    .values_list('assignment_id', 'id'))
+
+
+class AssignmentDefinition(models.Model):
+    """
+    Represents the properties of an assignment that are shared by every
+    student in the course for a week
+    """
+
+    objects = AssignmentDefinitionManager()
+
+    course = models.ForeignKey(Course,
+                               on_delete=models.CASCADE)
+    week = models.ForeignKey(Week,
+                             on_delete=models.CASCADE)
+    assignment_id = models.IntegerField()
+    title = models.TextField(null=True)
+    unlock_at = models.DateTimeField(null=True)
+    points_possible = \
+        models.DecimalField(null=True, max_digits=13, decimal_places=3)
+    non_digital_submission = models.BooleanField(null=True)
+    due_at = models.DateTimeField(null=True)
+    muted = models.BooleanField(null=True)
+    min_score = models.DecimalField(null=True, max_digits=13, decimal_places=3)
+    max_score = models.DecimalField(null=True, max_digits=13, decimal_places=3)
+    first_quartile = models.IntegerField(null=True)
+    median = models.IntegerField(null=True)
+    third_quartile = models.IntegerField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'assignment_id',
+                                            'week'],
+                                    name='unique_assignment_definition')
+        ]
 
 
 class AssignmentManager(models.Manager):
 
+    # fields overwritten when an assignment already exists
+    UPDATE_FIELDS = ['job', 'definition', 'status', 'excused', 'score',
+                     'posted_at', 'submitted_at', 'fingerprint']
+
+    def with_definitions(self):
+        """
+        Return assignments annotated with the fields of their assignment
+        definition.
+        """
+        return self.get_queryset().annotate(
+            **{field: F(f'definition__{field}') for field in
+               AssignmentDefinition.objects.UPDATE_FIELDS})
+
     def _map_assignment_data(self, assign, raw_assign_dict):
-        assign.title = raw_assign_dict.get('title')
-        assign.unlock_at = raw_assign_dict.get('unlock_at')
-        assign.points_possible = raw_assign_dict.get('points_possible')
-        assign.non_digital_submission = \
-            raw_assign_dict.get('non_digital_submission')
-        assign.due_at = raw_assign_dict.get('due_at')
         assign.status = raw_assign_dict.get('status')
-        assign.muted = raw_assign_dict.get('muted')
-        assign.max_score = raw_assign_dict.get('max_score')
-        assign.min_score = raw_assign_dict.get('min_score')
-        assign.first_quartile = raw_assign_dict.get('first_quartile')
-        assign.median = raw_assign_dict.get('median')
-        assign.third_quartile = raw_assign_dict.get('third_quartile')
         assign.excused = raw_assign_dict.get('excused')
         submission = raw_assign_dict.get('submission')
         if submission:
@@ -492,44 +993,80 @@ class AssignmentManager(models.Manager):
                 submission.get('submitted_at')
         return assign
 
-    def create_or_update_assignment(self, job, week, course, raw_assign_dict):
-        created = True
-        assignment_id = raw_assign_dict.get('assignment_id')
-        student_id = raw_assign_dict.get('canvas_user_id')
-        try:
-            user = User.objects.get(canvas_user_id=student_id)
-        except User.DoesNotExist:
+    def bulk_create_or_update_assignments(self, job, week, course,
+                                          raw_assign_dicts, user_ids=None,
+                                          scd_storage=False):
+        """
+        Create or update assignments for a batch of raw assignment
+        dictionaries using a single upsert statement keyed on the
+        unique_assignment constraint. Analytics for users that don't exist in
+        the database are skipped.
+
+        Returns a tuple of the number of assignments saved and the number of
+        analytics skipped.
+
+        :param user_ids: mapping of canvas_user_id to User id. Users are
+            looked up in the database when not supplied.
+        :type user_ids: dict
+        :param scd_storage: when True, assignments that are unchanged from
+            their latest version extend that version's valid_to_week instead
+            of being written again. See extend_unchanged_analytics.
+        :type scd_storage: bool
+        """
+        if user_ids is None:
+            user_ids = User.objects.get_user_ids(
+                {raw_assign_dict.get('canvas_user_id')
+                 for raw_assign_dict in raw_assign_dicts})
+        resolved_assign_dicts = []
+        unknown_student_ids = set()
+        skip_count = 0
+        for raw_assign_dict in raw_assign_dicts:
+            student_id = raw_assign_dict.get('canvas_user_id')
+            user_id = user_ids.get(student_id)
+            if user_id is None:
+                unknown_student_ids.add(student_id)
+                skip_count += 1
+                continue
+            resolved_assign_dicts.append((user_id, raw_assign_dict))
+        # definitions are only built from the analytics that are saved
+        definition_ids = \
+            AssignmentDefinition.objects.bulk_create_or_update_definitions(
+                week, course,
+                [raw_assign_dict for _, raw_assign_dict
+                 in resolved_assign_dicts])
+        assigns = {}
+        for user_id, raw_assign_dict in resolved_assign_dicts:
+            assign = Assignment()
+            assign.job = job
+            assign.user_id = user_id
+            assign.week = week
+            assign.valid_from_week = week.week
+            assign.valid_to_week = week.week
+            assign.course = course
+            assign.assignment_id = raw_assign_dict.get('assignment_id')
+            assign.definition_id = definition_ids.get(assign.assignment_id)
+            assign = self._map_assignment_data(assign, raw_assign_dict)
+            assign.fingerprint = utilities.get_analytic_fingerprint(
+                raw_assign_dict)
+            # a row can only be upserted once per statement so the last
+            # analytic for a user and assignment wins
+            assigns[(user_id, assign.assignment_id)] = assign
+        for student_id in unknown_student_ids:
             logging.warning(
                 f"User with canvas_user_id {student_id} does not "
                 f"exist in Canvas Analytics DB. Skipping.")
-            return None, created
-        assign = Assignment()
-        assign.job = job
-        assign.user = user
-        assign.week = week
-        assign.course = course
-        assign.assignment_id = assignment_id
-        assign = self._map_assignment_data(assign, raw_assign_dict)
-        try:
-            assign.save()
-        except IntegrityError:
-            # we update only if the unique contraint isn't satisified in order
-            # to avoid checking for an assignment on every insert
-            created = False
-            assign = (Assignment.objects
-                      .get(user=user,
-                           assignment_id=assignment_id,
-                           week=week))
-            assign = self._map_assignment_data(assign, raw_assign_dict)
-            assign.save()
-            logging.warning(
-                f"Found existing assignment entry for "
-                f"canvas_course_id: {course.canvas_course_id}, "
-                f"user: {user.canvas_user_id}, "
-                f"sis-term-id: {week.term.sis_term_id}, "
-                f"week: {week.week}")
-
-        return assign, created
+        unchanged_count = 0
+        if scd_storage:
+            unchanged_count = extend_unchanged_analytics(
+                Assignment, assigns, course, week,
+                ['user_id', 'assignment_id'])
+        if assigns:
+            Assignment.objects.bulk_create(
+                assigns.values(),
+                update_conflicts=True,
+                unique_fields=['user', 'course', 'assignment_id', 'week'],
+                update_fields=self.UPDATE_FIELDS)
+        return len(assigns) + unchanged_count, skip_count
 
 
 class Assignment(models.Model):
@@ -544,24 +1081,19 @@ class Assignment(models.Model):
                              on_delete=models.CASCADE)
     user = models.ForeignKey(User,
                              on_delete=models.CASCADE)
+    # first and last week number of the term the row is valid for
+    valid_from_week = models.IntegerField(null=True)
+    valid_to_week = models.IntegerField(null=True)
     assignment_id = models.IntegerField(null=True)
-    title = models.TextField(null=True)
-    unlock_at = models.DateTimeField(null=True)
-    points_possible = \
-        models.DecimalField(null=True, max_digits=13, decimal_places=3)
-    non_digital_submission = models.BooleanField(null=True)
-    due_at = models.DateTimeField(null=True)
+    definition = models.ForeignKey(AssignmentDefinition,
+                                   null=True,
+                                   on_delete=models.CASCADE)
     status = models.TextField(null=True)
-    muted = models.BooleanField(null=True)
-    min_score = models.DecimalField(null=True, max_digits=13, decimal_places=3)
-    max_score = models.DecimalField(null=True, max_digits=13, decimal_places=3)
-    first_quartile = models.IntegerField(null=True)
-    median = models.IntegerField(null=True)
-    third_quartile = models.IntegerField(null=True)
     excused = models.BooleanField(null=True)
     score = models.DecimalField(null=True, max_digits=13, decimal_places=3)
     posted_at = models.DateTimeField(null=True)
     submitted_at = models.DateTimeField(null=True)
+    fingerprint = models.CharField(max_length=32, null=True)
 
     class Meta:
         constraints = [
@@ -573,6 +1105,13 @@ class Assignment(models.Model):
 
 class ParticipationManager(models.Manager):
 
+    # fields overwritten when a participation already exists
+    UPDATE_FIELDS = ['job', 'page_views', 'max_page_views',
+                     'page_views_level', 'participations',
+                     'max_participations', 'participations_level',
+                     'time_total', 'time_on_time', 'time_late',
+                     'time_missing', 'time_floating', 'fingerprint']
+
     def _map_participation_data(self, partic, raw_partic_dict):
         partic.page_views = raw_partic_dict.get('page_views')
         partic.max_page_views = raw_partic_dict.get('max_page_views')
@@ -595,41 +1134,68 @@ class ParticipationManager(models.Manager):
                                     .get('floating'))
         return partic
 
-    def create_or_update_participation(self, job, week, course,
-                                       raw_partic_dict):
-        created = True
-        student_id = raw_partic_dict.get('canvas_user_id')
-        try:
-            user = User.objects.get(canvas_user_id=student_id)
-        except User.DoesNotExist:
+    def bulk_create_or_update_participations(self, job, week, course,
+                                             raw_partic_dicts, user_ids=None,
+                                             scd_storage=False):
+        """
+        Create or update participations for a batch of raw participation
+        dictionaries using a single upsert statement keyed on the
+        unique_participation constraint. Analytics for users that don't exist
+        in the database are skipped.
+
+        Returns a tuple of the number of participations saved and the number
+        of analytics skipped.
+
+        :param user_ids: mapping of canvas_user_id to User id. Users are
+            looked up in the database when not supplied.
+        :type user_ids: dict
+        :param scd_storage: when True, participations that are unchanged
+            from their latest version extend that version's valid_to_week
+            instead of being written again. See extend_unchanged_analytics.
+        :type scd_storage: bool
+        """
+        if user_ids is None:
+            user_ids = User.objects.get_user_ids(
+                {raw_partic_dict.get('canvas_user_id')
+                 for raw_partic_dict in raw_partic_dicts})
+        partics = {}
+        unknown_student_ids = set()
+        skip_count = 0
+        for raw_partic_dict in raw_partic_dicts:
+            student_id = raw_partic_dict.get('canvas_user_id')
+            user_id = user_ids.get(student_id)
+            if user_id is None:
+                unknown_student_ids.add(student_id)
+                skip_count += 1
+                continue
+            partic = Participation()
+            partic.job = job
+            partic.user_id = user_id
+            partic.week = week
+            partic.valid_from_week = week.week
+            partic.valid_to_week = week.week
+            partic.course = course
+            partic = self._map_participation_data(partic, raw_partic_dict)
+            partic.fingerprint = utilities.get_analytic_fingerprint(
+                raw_partic_dict)
+            # a row can only be upserted once per statement so the last
+            # analytic for a user wins
+            partics[user_id] = partic
+        for student_id in unknown_student_ids:
             logging.warning(
                 f"User with canvas_user_id {student_id} does not "
                 f"exist in Canvas Analytics DB. Skipping.")
-            return None, created
-        partic = Participation()
-        partic.job = job
-        partic.user = user
-        partic.week = week
-        partic.course = course
-        partic = self._map_participation_data(partic, raw_partic_dict)
-        try:
-            partic.save()
-        except IntegrityError:
-            # we update only if the unique contraint isn't satisified in order
-            # to avoid checking for a participation on every insert
-            created = False
-            partic = (Participation.objects.get(user=user,
-                                                week=week,
-                                                course=course))
-            partic = self._map_participation_data(partic, raw_partic_dict)
-            partic.save()
-            logging.warning(
-                f"Found existing participation entry for "
-                f"canvas_course_id: {course.canvas_course_id}, "
-                f"user: {user.canvas_user_id}, "
-                f"sis-term-id: {week.term.sis_term_id}, "
-                f"week: {week.week}")
-        return partic, created
+        unchanged_count = 0
+        if scd_storage:
+            unchanged_count = extend_unchanged_analytics(
+                Participation, partics, course, week, ['user_id'])
+        if partics:
+            Participation.objects.bulk_create(
+                partics.values(),
+                update_conflicts=True,
+                unique_fields=['user', 'course', 'week'],
+                update_fields=self.UPDATE_FIELDS)
+        return len(partics) + unchanged_count, skip_count
 
 
 class Participation(models.Model):
@@ -644,6 +1210,9 @@ class Participation(models.Model):
                              on_delete=models.CASCADE)
     user = models.ForeignKey(User,
                              on_delete=models.CASCADE)
+    # first and last week number of the term the row is valid for
+    valid_from_week = models.IntegerField(null=True)
+    valid_to_week = models.IntegerField(null=True)
     page_views = models.IntegerField(null=True)
     max_page_views = models.IntegerField(null=True)
     page_views_level = models.IntegerField(null=True)
@@ -655,6 +1224,7 @@ class Participation(models.Model):
     time_late = models.IntegerField(null=True)
     time_missing = models.IntegerField(null=True)
     time_floating = models.IntegerField(null=True)
+    fingerprint = models.CharField(max_length=32, null=True)
 
     class Meta:
         constraints = [
@@ -924,3 +1494,40 @@ class SubaccountActivity(models.Model):
             self.pages_views or 0,
             self.quizzes_views or 0,
         ]
+
+
+class CanvasRateLimitManager(models.Manager):
+
+    def publish_interval(self, process, interval):
+        """
+        Record the request interval currently used by the given process.
+        """
+        self.update_or_create(process=process,
+                              defaults={"interval": interval})
+
+    def get_shared_interval(self, stale_after):
+        """
+        Return the largest request interval published by a process within
+        the last stale_after seconds, deleting records that are older.
+
+        :param stale_after: number of seconds after which a published
+            interval is ignored
+        :type stale_after: int
+        """
+        cutoff = timezone.now() - timedelta(seconds=stale_after)
+        self.get_queryset().filter(updated__lt=cutoff).delete()
+        return (self.get_queryset()
+                .aggregate(models.Max("interval"))["interval__max"]) or 0.0
+
+
+class CanvasRateLimit(models.Model):
+    """
+    Represents the canvas request pacing of a running process so that
+    processes can share rate limit backoff
+    """
+
+    objects = CanvasRateLimitManager()
+
+    process = models.CharField(max_length=255, unique=True)
+    interval = models.FloatField(default=0.0)
+    updated = models.DateTimeField(auto_now=True)
@@ -0,0 +1,73 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+from django.db import connection
+
+
+# On PostgreSQL the assignment and participation tables are list partitioned
+# by week so that queries for a week only scan that week's partition and the
+# analytics of a week can be removed by dropping its partitions instead of
+# deleting rows. Rows for weeks without a partition go to a default
+# partition. Partitioning is a no-op on other databases.
+
+# analytic tables partitioned by week. see migration 0022 for how they are
+# rebuilt as partitioned tables.
+PARTITIONED_TABLES = ["data_aggregator_assignment",
+                      "data_aggregator_participation"]
+
+
+def get_partition_name(table, week_id):
+    return f"{table}_week_{week_id}"
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table "
+                   "WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def create_week_partitions(week_id, using=None):
+    """
+    Create the partitions of the analytic tables for a week.
+
+    :param week_id: id of the week to create partitions for
+    :type week_id: int
+    """
+    using = using or connection
+    if using.vendor != "postgresql":
+        return
+    with using.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            if is_partitioned(cursor, table):
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS '
+                    f'"{get_partition_name(table, week_id)}" '
+                    f'PARTITION OF "{table}" FOR VALUES IN ({int(week_id)})')
+
+
+def drop_week_partitions(week_ids, using=None):
+    """
+    Detach and drop the partitions of the analytic tables for the given
+    weeks, removing their analytics without deleting rows. Returns False
+    if the tables aren't partitioned, in which case nothing is dropped.
+
+    :param week_ids: ids of the weeks to drop partitions for
+    :type week_ids: list
+    """
+    using = using or connection
+    if using.vendor != "postgresql":
+        return False
+    with using.cursor() as cursor:
+        if not all(is_partitioned(cursor, table)
+                   for table in PARTITIONED_TABLES):
+            return False
+        for table in PARTITIONED_TABLES:
+            for week_id in week_ids:
+                partition = get_partition_name(table, week_id)
+                cursor.execute("SELECT to_regclass(%s)", [partition])
+                if cursor.fetchone()[0] is not None:
+                    cursor.execute(f'ALTER TABLE "{table}" '
+                                   f'DETACH PARTITION "{partition}"')
+                    cursor.execute(f'DROP TABLE "{partition}"')
+    return True
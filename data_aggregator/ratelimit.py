@@ -0,0 +1,171 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+import logging
+import os
+import socket
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from restclients_core.dao import LiveDAO
+from data_aggregator.models import CanvasRateLimit
+
+
+class CanvasRateLimiter():
+    """
+    Paces canvas api requests made by all threads of a process.
+
+    The interval between requests is adapted from the X-Rate-Limit-Remaining
+    header canvas returns with every response. The interval is doubled when
+    a request is throttled or the remaining quota drops below low_water and
+    is reduced by a fixed step while the remaining quota is above
+    high_water (additive increase, multiplicative decrease of the request
+    rate). The interval is shared with other processes through the
+    CanvasRateLimit model so that a throttled process slows all of them
+    down.
+    """
+
+    def __init__(self, low_water=None, high_water=None, step=None,
+                 max_interval=None, sync_interval=None, stale_after=None):
+        self.low_water = (low_water if low_water is not None
+                          else get_rate_limit_setting("LOW_WATER", 200))
+        self.high_water = (high_water if high_water is not None
+                           else get_rate_limit_setting("HIGH_WATER", 500))
+        self.step = (step if step is not None
+                     else get_rate_limit_setting("STEP", 0.01))
+        self.max_interval = (max_interval if max_interval is not None
+                             else get_rate_limit_setting("MAX_INTERVAL", 10))
+        self.sync_interval = (sync_interval if sync_interval is not None
+                              else get_rate_limit_setting("SYNC_INTERVAL", 5))
+        self.stale_after = (stale_after if stale_after is not None
+                            else get_rate_limit_setting("STALE_AFTER", 60))
+        self.process = f"{socket.gethostname()}-{os.getpid()}"
+        self.interval = 0.0
+        self.shared_interval = 0.0
+        self._next_request_time = 0.0
+        self._lock = threading.Lock()
+        self._sync_thread = None
+
+    def get_interval(self):
+        return max(self.interval, self.shared_interval)
+
+    def acquire(self):
+        """
+        Block until the calling thread is allowed to make a request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            request_time = max(now, self._next_request_time)
+            self._next_request_time = request_time + self.get_interval()
+        if request_time > now:
+            time.sleep(request_time - now)
+
+    def record_response(self, remaining=None, throttled=False):
+        """
+        Adapt the request interval to a canvas response.
+
+        :param remaining: value of the X-Rate-Limit-Remaining header
+        :type remaining: float
+        :param throttled: whether canvas rejected the request because the
+            rate limit was exceeded
+        :type throttled: bool
+        """
+        with self._lock:
+            if throttled or (remaining is not None and
+                             remaining < self.low_water):
+                self.interval = min(self.max_interval,
+                                    max(self.interval * 2, self.step))
+            elif remaining is not None and remaining > self.high_water:
+                self.interval = max(0.0, self.interval - self.step)
+
+    def sync(self):
+        """
+        Publish this process's request interval and read the largest
+        interval published by any running process.
+        """
+        CanvasRateLimit.objects.publish_interval(self.process, self.interval)
+        self.shared_interval = CanvasRateLimit.objects.get_shared_interval(
+            self.stale_after)
+
+    def start_sync_thread(self):
+        if self.sync_interval and self._sync_thread is None:
+            self._sync_thread = threading.Thread(target=self._sync_forever,
+                                                 daemon=True)
+            self._sync_thread.start()
+
+    def _sync_forever(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except Exception as e:
+                logging.warning(f"Unable to sync canvas rate limit. {e}")
+            finally:
+                # don't hold an idle connection between syncs
+                connection.close()
+
+
+def get_rate_limit_setting(name, default):
+    return getattr(settings, f"DATA_AGGREGATOR_CANVAS_RATE_LIMIT_{name}",
+                   default)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Return the rate limiter shared by all threads of the current process.
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                rate_limiter = CanvasRateLimiter()
+                rate_limiter.start_sync_thread()
+                _rate_limiter = rate_limiter
+    return _rate_limiter
+
+
+def _reset_rate_limiter():
+    # forked processes don't inherit the parent's sync thread
+    global _rate_limiter, _rate_limiter_lock
+    _rate_limiter = None
+    _rate_limiter_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_rate_limiter)
+
+
+class RateLimitedCanvasLiveDAO(LiveDAO):
+    """
+    Live canvas DAO implementation that paces requests with the process
+    rate limiter. Enable by setting RESTCLIENTS_CANVAS_DAO_CLASS to
+    'data_aggregator.ratelimit.RateLimitedCanvasLiveDAO'.
+    """
+
+    def load(self, method, url, headers, body):
+        rate_limiter = get_rate_limiter()
+        rate_limiter.acquire()
+        response = super().load(method, url, headers, body)
+        remaining = response.headers.get("X-Rate-Limit-Remaining")
+        rate_limiter.record_response(
+            remaining=float(remaining) if remaining is not None else None,
+            throttled=is_throttled(response))
+        return response
+
+
+def is_throttled(response):
+    """
+    Return whether canvas rejected the request because the rate limit was
+    exceeded.
+    """
+    if response.status != 403:
+        return False
+    data = response.data or b""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return b"Rate Limit Exceeded" in data
@@ -30,6 +30,22 @@ class AssignmentSerializer(serializers.ModelSerializer):
         serializers.CharField(source="course.sis_course_id", read_only=True)
     week = serializers.IntegerField(source="week.week", read_only=True)
     sis_term_id = serializers.CharField(read_only=True)
+    # assignment definition fields annotated by
+    # Assignment.objects.with_definitions()
+    title = serializers.CharField(read_only=True)
+    unlock_at = serializers.DateTimeField(read_only=True)
+    points_possible = serializers.DecimalField(
+        max_digits=13, decimal_places=3, read_only=True)
+    non_digital_submission = serializers.BooleanField(read_only=True)
+    due_at = serializers.DateTimeField(read_only=True)
+    muted = serializers.BooleanField(read_only=True)
+    min_score = serializers.DecimalField(
+        max_digits=13, decimal_places=3, read_only=True)
+    max_score = serializers.DecimalField(
+        max_digits=13, decimal_places=3, read_only=True)
+    first_quartile = serializers.IntegerField(read_only=True)
+    median = serializers.IntegerField(read_only=True)
+    third_quartile = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Assignment
@@ -13,6 +13,8 @@ from data_aggregator.dao import TaskDAO
 class TestAssignmentView(TestCase):
 
     fixtures = ['data_aggregator/fixtures/mock_data/da_assignment.json',
+                ('data_aggregator/fixtures/mock_data/'
+                 'da_assignmentdefinition.json'),
                 'data_aggregator/fixtures/mock_data/da_course.json',
                 'data_aggregator/fixtures/mock_data/da_job.json',
                 'data_aggregator/fixtures/mock_data/da_jobtype.json',
@@ -0,0 +1,134 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+import json
+import tempfile
+import unittest
+from django.test import TestCase, override_settings
+from data_aggregator.canvas_replay import RecordingCanvasLiveDAO, \
+    RateLimitedRecordingCanvasLiveDAO, ReplayCanvasDAO, SyntheticCanvasDAO, \
+    get_api_call_count
+from mock import MagicMock, patch
+
+
+class TestSyntheticCanvasDAO(TestCase):
+
+    def setUp(self):
+        SyntheticCanvasDAO.register_course(1001, [11, 12, 13], 2)
+        self.dao = SyntheticCanvasDAO.__new__(SyntheticCanvasDAO)
+
+    def tearDown(self):
+        SyntheticCanvasDAO.clear_courses()
+
+    def test_get_response(self):
+        api_call_count = get_api_call_count()
+        response = self.dao.load(
+            "GET", "/api/v1/courses/1001/analytics/users/12/assignments",
+            {}, None)
+        self.assertEqual(response.status, 200)
+        assignments = json.loads(response.data)
+        self.assertEqual([a["assignment_id"] for a in assignments], [1, 2])
+        # generated analytics are the same for every request
+        self.assertEqual(json.loads(self.dao.load(
+            "GET", "/api/v1/courses/1001/analytics/users/12/assignments",
+            {}, None).data), assignments)
+
+        response = self.dao.load(
+            "GET",
+            "/api/v1/courses/1001/analytics/student_summaries?per_page=100",
+            {}, None)
+        self.assertEqual([s["id"] for s in json.loads(response.data)],
+                         [11, 12, 13])
+
+        response = self.dao.load(
+            "GET", "/api/v1/courses/1001/enrollments?type%5B%5D=Student",
+            {}, None)
+        self.assertEqual([e["user_id"] for e in json.loads(response.data)],
+                         [11, 12, 13])
+        self.assertEqual(get_api_call_count() - api_call_count, 4)
+
+        # unknown courses, students and urls aren't found
+        self.assertEqual(self.dao.load(
+            "GET", "/api/v1/courses/1002/analytics/users/12/assignments",
+            {}, None).status, 404)
+        self.assertEqual(self.dao.load(
+            "GET", "/api/v1/courses/1001/analytics/users/14/assignments",
+            {}, None).status, 404)
+        self.assertEqual(self.dao.load(
+            "GET", "/api/v1/courses/1001", {}, None).status, 404)
+
+    @override_settings(DATA_AGGREGATOR_CANVAS_REPLAY_ERROR_RATE=0.5,
+                       DATA_AGGREGATOR_CANVAS_REPLAY_THROTTLE_RATE=0.25)
+    @patch("data_aggregator.canvas_replay.random.random")
+    def test_error_injection(self, mock_random):
+        url = "/api/v1/courses/1001/analytics/student_summaries"
+        mock_random.return_value = 0.4
+        self.assertEqual(self.dao.load("GET", url, {}, None).status, 500)
+        mock_random.return_value = 0.6
+        response = self.dao.load("GET", url, {}, None)
+        self.assertEqual(response.status, 403)
+        self.assertIn(b"Rate Limit Exceeded", response.data)
+        mock_random.return_value = 0.8
+        self.assertEqual(self.dao.load("GET", url, {}, None).status, 200)
+
+    @override_settings(DATA_AGGREGATOR_CANVAS_REPLAY_LATENCY=0.2)
+    @patch("data_aggregator.canvas_replay.time")
+    def test_latency(self, mock_time):
+        self.dao.load("GET", "/api/v1/courses/1001/enrollments", {}, None)
+        mock_time.sleep.assert_called_once_with(0.2)
+
+
+class TestRecordAndReplay(TestCase):
+
+    @patch("data_aggregator.canvas_replay.LiveDAO.load")
+    def test_record_and_replay(self, mock_load):
+        url = "/api/v1/courses/1001/analytics/student_summaries?per_page=100"
+        response = MagicMock()
+        response.status = 200
+        response.data = b'[{"id": 11}]'
+        response.headers = {"Link": "<https://canvas/next>; rel=\"next\""}
+        mock_load.return_value = response
+        with tempfile.TemporaryDirectory() as replay_dir:
+            with override_settings(
+                    DATA_AGGREGATOR_CANVAS_REPLAY_DIR=replay_dir):
+                recording_dao = RecordingCanvasLiveDAO.__new__(
+                    RecordingCanvasLiveDAO)
+                self.assertEqual(
+                    recording_dao.load("GET", url, {}, None), response)
+
+                replay_dao = ReplayCanvasDAO.__new__(ReplayCanvasDAO)
+                replayed = replay_dao.load("GET", url, {}, None)
+                self.assertEqual(replayed.status, 200)
+                self.assertEqual(replayed.data, b'[{"id": 11}]')
+                self.assertEqual(replayed.headers, response.headers)
+                # requests that weren't recorded aren't found
+                self.assertEqual(replay_dao.load(
+                    "GET", "/api/v1/courses/1002", {}, None).status, 404)
+
+    @patch("data_aggregator.ratelimit.get_rate_limiter")
+    @patch("data_aggregator.canvas_replay.LiveDAO.load")
+    def test_rate_limited_recording(self, mock_load, mock_get_rate_limiter):
+        response = MagicMock()
+        response.status = 200
+        response.data = b'[]'
+        response.headers = {"X-Rate-Limit-Remaining": "600.0"}
+        mock_load.return_value = response
+        with tempfile.TemporaryDirectory() as replay_dir:
+            with override_settings(
+                    DATA_AGGREGATOR_CANVAS_REPLAY_DIR=replay_dir):
+                dao = RateLimitedRecordingCanvasLiveDAO.__new__(
+                    RateLimitedRecordingCanvasLiveDAO)
+                self.assertEqual(dao.load("GET", "/api/v1/courses/1001",
+                                          {}, None), response)
+                rate_limiter = mock_get_rate_limiter.return_value
+                rate_limiter.acquire.assert_called_once()
+                rate_limiter.record_response.assert_called_once_with(
+                    remaining=600.0, throttled=False)
+                replay_dao = ReplayCanvasDAO.__new__(ReplayCanvasDAO)
+                self.assertEqual(replay_dao.load(
+                    "GET", "/api/v1/courses/1001", {}, None).status, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,12 +6,16 @@ import os
 import unittest
 import pandas as pd
 import numpy as np
-from io import StringIO
-from django.test import TestCase
-from data_aggregator.dao import AnalyticTypes, AnalyticsDAO, CanvasDAO, \
-    EdwDAO, JobDAO, LoadRadDAO, BaseDAO, TaskDAO
-from data_aggregator.models import AdviserTypes, JobType, TaskTypes, User
-from mock import call, patch, create_autospec, MagicMock
+from datetime import datetime, timedelta, timezone
+from io import IOBase, StringIO
+from django.test import TestCase, override_settings
+from data_aggregator.dao import AnalyticTypes, AnalyticsDAO, ArchiveDAO, \
+    CanvasDAO, CanvasDAORegistry, EdwDAO, JobDAO, LoadRadDAO, BaseDAO, \
+    TaskDAO, canvas_dao_registry
+from data_aggregator.models import AdviserTypes, Assignment, \
+    AssignmentDefinition, Course, Enrollment, Job, JobType, Participation, \
+    TaskTypes, Term, User, Week, delete_week_analytics
+from mock import ANY, call, patch, create_autospec, MagicMock
 from restclients_core.exceptions import DataFailureException
 
 
@@ -214,6 +218,24 @@ class TestCanvasDAO(TestCase):
         cd = CanvasDAO()
         return cd
 
+    def test_canvas_dao_registry(self):
+        registry = CanvasDAORegistry()
+        with registry.checkout() as cd1:
+            self.assertIsInstance(cd1, CanvasDAO)
+            # concurrent checkouts never share an instance
+            with registry.checkout() as cd2:
+                self.assertIsNot(cd1, cd2)
+        # instances are reused once checked back in
+        with registry.checkout() as cd3:
+            self.assertIn(cd3, [cd1, cd2])
+        # instances of a replaced class aren't handed out
+        with patch('data_aggregator.dao.CanvasDAO') as mock_canvas_dao:
+            with registry.checkout() as cd4:
+                self.assertEqual(cd4, mock_canvas_dao.return_value)
+        registry.clear()
+        with registry.checkout() as cd5:
+            self.assertNotIn(cd5, [cd1, cd2])
+
     @patch('uw_canvas.enrollments.Enrollments')
     def test_download_student_ids_for_course(self, MockEnrollment):
         cd = self.get_test_canvas_dao()
@@ -292,6 +314,63 @@ class TestCanvasDAO(TestCase):
             mock_analytics_inst.get_student_summaries_by_course.called,
             True)
 
+    def mock_get_student_assignments_for_course(self, student_id,
+                                                canvas_course_id):
+        if student_id == 404:
+            raise DataFailureException('url', 404, 'msg')
+        elif student_id == 500:
+            raise DataFailureException('url', 500, 'msg')
+        return [{"assignment_1": student_id}]
+
+    @patch('data_aggregator.dao.Analytics')
+    def test_download_assignment_analytics_for_students(self, MockAnalytics):
+        mock_analytics_inst = MockAnalytics.return_value
+        mock_analytics_inst.get_student_assignments_for_course.side_effect = \
+            self.mock_get_student_assignments_for_course
+        student_ids = [1, 2, 404, 3, 4, 5]
+        expected = [(1, [{'assignment_1': 1,
+                          'canvas_course_id': 34567,
+                          'canvas_user_id': 1}]),
+                    (2, [{'assignment_1': 2,
+                          'canvas_course_id': 34567,
+                          'canvas_user_id': 2}]),
+                    (404, []),
+                    (3, [{'assignment_1': 3,
+                          'canvas_course_id': 34567,
+                          'canvas_user_id': 3}]),
+                    (4, [{'assignment_1': 4,
+                          'canvas_course_id': 34567,
+                          'canvas_user_id': 4}]),
+                    (5, [{'assignment_1': 5,
+                          'canvas_course_id': 34567,
+                          'canvas_user_id': 5}])]
+
+        # sequential and concurrent downloads return the same results in
+        # the same order
+        canvas_dao_registry.clear()
+        for num_parallel_downloads in [1, 3]:
+            cd = self.get_test_canvas_dao()
+            with patch.object(canvas_dao_registry, "checkout",
+                              wraps=canvas_dao_registry.checkout) \
+                    as mock_checkout:
+                test_result = list(
+                    cd.download_assignment_analytics_for_students(
+                        34567, student_ids,
+                        num_parallel_downloads=num_parallel_downloads))
+            self.assertEqual(test_result, expected)
+            # concurrent downloads use the daos of the process registry
+            self.assertEqual(mock_checkout.call_count,
+                             0 if num_parallel_downloads == 1
+                             else len(student_ids))
+
+        # errors other than a 404 are raised
+        for num_parallel_downloads in [1, 3]:
+            cd = self.get_test_canvas_dao()
+            with self.assertRaises(DataFailureException):
+                list(cd.download_assignment_analytics_for_students(
+                    34567, [1, 500, 2],
+                    num_parallel_downloads=num_parallel_downloads))
+
     def test_download_raw_analytics_for_course(self):
         patcher = patch('uw_canvas.analytics.Analytics')
 
@@ -324,6 +403,15 @@ class TestCanvasDAO(TestCase):
         self.assertEqual(
             mock_analytics_inst.get_student_summaries_by_course.called,
             False)
+
+        # supplied student ids aren't downloaded again
+        cd.download_student_ids_for_course.reset_mock()
+        test_result = [a for a in
+                       cd.download_raw_analytics_for_course(
+                           34567, AnalyticTypes.assignment,
+                           student_ids=[12345])]
+        self.assertEqual(len(test_result), 3)
+        cd.download_student_ids_for_course.assert_not_called()
         patcher.stop()
 
         # test participations
@@ -460,6 +548,8 @@ class TestJobDAO(TestCase):
         mock_course_model.objects.filter.return_value.filter.return_value = \
             mock_courses_qs
         mock_courses_qs.count.return_value = 2
+        job_dao.get_course_priorities = MagicMock(
+            return_value={mock_course2.id: 300})
 
         # passed context
         jobs = job_dao.create_analytic_jobs(mock_job_type,
@@ -472,6 +562,7 @@ class TestJobDAO(TestCase):
         self.assertEqual(len(jobs), 1)
 
         # no context
+        job_dao.create_job.reset_mock()
         jobs = job_dao.create_analytic_jobs(mock_job_type,
                                             mock_target_date_start,
                                             mock_target_date_end)
@@ -483,7 +574,8 @@ class TestJobDAO(TestCase):
                         'canvas_course_id': mock_course1.canvas_course_id,
                         'sis_course_id': mock_course1.sis_course_id,
                         'sis_term_id': '2021-summer',
-                        'week': 5}))
+                        'week': 5},
+                     priority=0))
         assert (call_args_list[1] ==
                 call(mock_job_type, mock_target_date_start,
                      mock_target_date_end,
@@ -491,36 +583,44 @@ class TestJobDAO(TestCase):
                         'canvas_course_id': mock_course2.canvas_course_id,
                         'sis_course_id': mock_course2.sis_course_id,
                         'sis_term_id': '2021-summer',
-                        'week': 5}))
+                        'week': 5},
+                     priority=300))
         self.assertEqual(len(jobs), 2)
+        job_dao.get_course_priorities.assert_called_once_with(
+            mock_job_type, mock_week_inst)
 
-    @patch("data_aggregator.dao.Participation")
-    @patch("data_aggregator.dao.Assignment")
-    def test_delete_data_for_job(self, mock_assignment,
-                                 mock_participation):
-
-        mock_analytics = MagicMock()
-        mock_analytics.delete = MagicMock()
-        mock_assignment.objects.filter.return_value = mock_analytics
-        mock_participation.objects.filter.return_value = mock_analytics
+    @patch("data_aggregator.dao.delete_week_analytics")
+    @patch("data_aggregator.dao.Week")
+    def test_delete_data_for_job(self, mock_week, mock_delete):
+        week = MagicMock()
+        mock_week.objects.filter.return_value.first.return_value = week
+        mock_delete.return_value = 3
 
         job = MagicMock()
         job.type = MagicMock()
+        job.context = {"sis_term_id": "2013-spring", "week": 1}
         job_dao = JobDAO()
 
         job.type.type = AnalyticTypes.assignment
-        job_dao.delete_data_for_job(job)
-        mock_assignment.objects.filter.assert_called_once_with(job=job)
-        mock_analytics.delete.assert_called_once()
-
-        mock_analytics.reset_mock()
-        mock_assignment.objects.filter.reset_mock()
-        mock_participation.objects.filter.reset_mock()
+        self.assertEqual(job_dao.delete_data_for_job(job), 3)
+        mock_week.objects.filter.assert_called_once_with(
+            term__sis_term_id="2013-spring", week=1)
+        mock_delete.assert_called_once_with(Assignment, week, job=job)
 
+        mock_delete.reset_mock()
         job.type.type = AnalyticTypes.participation
         job_dao.delete_data_for_job(job)
-        mock_participation.objects.filter.assert_called_once_with(job=job)
-        mock_analytics.delete.assert_called_once()
+        mock_delete.assert_called_once_with(Participation, week, job=job)
+
+        # jobs for weeks that don't exist have never saved rows
+        mock_delete.reset_mock()
+        mock_week.objects.filter.return_value.first.return_value = None
+        self.assertEqual(job_dao.delete_data_for_job(job), 0)
+        mock_delete.assert_not_called()
+
+        job.type.type = "unknown"
+        with self.assertRaises(ValueError):
+            job_dao.delete_data_for_job(job)
 
     def test_create_job(self):
         job_type = JobType()
@@ -535,6 +635,11 @@ class TestJobDAO(TestCase):
             self.assertEqual(job.target_date_start, target_date_start)
             self.assertEqual(job.target_date_end, target_date_end)
             self.assertEqual(job.context, context)
+            self.assertEqual(job.priority, 0)
+            job = JobDAO().create_job(job_type, target_date_start,
+                                      target_date_end, context=context,
+                                      priority=10)
+            self.assertEqual(job.priority, 10)
 
     def test_run_job(self):
         job = MagicMock()
@@ -555,11 +660,12 @@ class TestJobDAO(TestCase):
             JobDAO().run_job(job)
             mock_run_task_job.assert_called_once()
 
+    @patch('data_aggregator.dao.JobStudentProgress')
     @patch('data_aggregator.dao.AnalyticsDAO')
     @patch('data_aggregator.dao.CanvasDAO')
     @patch('data_aggregator.dao.set_gcs_base_path')
     def test_run_analytics_job(self, mock_set_gcs_base_path, mock_canvas_dao,
-                               mock_analytics_dao):
+                               mock_analytics_dao, mock_progress_model):
         job = MagicMock()
         job.type = MagicMock()
         job.context = {
@@ -569,46 +675,125 @@ class TestJobDAO(TestCase):
         }
         job_dao = JobDAO()
         job_dao.delete_data_for_job = MagicMock()
+        mock_progress_model.objects.filter.return_value.exists \
+            .return_value = False
+        mock_progress_model.objects.get_saved_student_ids.return_value = \
+            set()
         mock_analytics = [MagicMock(), MagicMock()]
         mock_canvas_dao_inst = mock_canvas_dao()
         mock_canvas_dao_inst.download_raw_analytics_for_course = MagicMock(
             return_value=mock_analytics
         )
+        mock_canvas_dao_inst.download_assignment_analytics_for_students = \
+            MagicMock(return_value=[(1, [mock_analytics[0]]),
+                                    (3, [mock_analytics[1]])])
         mock_analytics_dao_inst = mock_analytics_dao()
         mock_analytics_dao_inst.save_assignments_to_db = MagicMock()
         mock_analytics_dao_inst.save_participations_to_db = MagicMock()
+        mock_canvas_dao_inst.download_student_ids_for_course = MagicMock(
+            return_value=[1, 2, 3])
+        mock_analytics_dao_inst.load_user_ids = MagicMock(
+            return_value={1: 101, 2: None, 3: 103})
 
         job.type.type = AnalyticTypes.assignment
         job_dao.run_analytics_job(job)
         job_dao.delete_data_for_job.assert_called_once()
         mock_set_gcs_base_path.assert_called_once_with("2021-summer", 1)
-        mock_canvas_dao_inst.download_raw_analytics_for_course \
-            .assert_called_once_with(12345, AnalyticTypes.assignment)
-        mock_analytics_dao_inst.save_assignments_to_db.assert_called_once()
+        mock_canvas_dao_inst.download_assignment_analytics_for_students \
+            .assert_called_once_with(12345, [1, 3], num_parallel_downloads=1)
+        mock_analytics_dao_inst.load_user_ids.assert_called_once_with(
+            [1, 2, 3])
+        # students missing from the User table aren't downloaded
+        self.assertEqual(job.context["skipped_student_count"], 1)
         mock_analytics_dao_inst.save_assignments_to_db.assert_called_once_with(
-            mock_analytics, job
+            mock_analytics, job, student_ids=[1, 3]
         )
+        # progress is cleared once the job completes
+        mock_progress_model.objects.filter.return_value.delete \
+            .assert_called_once()
 
         # reset mock states
         job_dao.delete_data_for_job.reset_mock()
         mock_set_gcs_base_path.reset_mock()
         mock_canvas_dao_inst.reset_mock()
         mock_canvas_dao_inst.download_raw_analytics_for_course.reset_mock()
+        mock_canvas_dao_inst.download_assignment_analytics_for_students \
+            .reset_mock()
         mock_analytics_dao_inst.save_assignments_to_db.reset_mock()
         mock_analytics_dao_inst.save_participations_to_db.reset_mock()
 
+        # analytics are saved in chunks at student boundaries
+        job_dao.get_analytics_chunk_size = MagicMock(return_value=1)
+        job_dao.run_analytics_job(job)
+        self.assertEqual(
+            mock_analytics_dao_inst.save_assignments_to_db.call_args_list,
+            [call([mock_analytics[0]], job, student_ids=[1]),
+             call([mock_analytics[1]], job, student_ids=[3])])
+        job_dao.get_analytics_chunk_size = MagicMock(return_value=1000)
+
+        # restarted job skips students that were already saved and keeps
+        # their analytics
+        job_dao.delete_data_for_job.reset_mock()
+        mock_analytics_dao_inst.save_assignments_to_db.reset_mock()
+        mock_progress_model.objects.filter.return_value.exists \
+            .return_value = True
+        mock_progress_model.objects.get_saved_student_ids.return_value = {1}
+        mock_canvas_dao_inst.download_assignment_analytics_for_students = \
+            MagicMock(return_value=[(3, [mock_analytics[1]])])
+        job_dao.run_analytics_job(job)
+        job_dao.delete_data_for_job.assert_not_called()
+        mock_canvas_dao_inst.download_assignment_analytics_for_students \
+            .assert_called_once_with(12345, [3], num_parallel_downloads=1)
+
+        # students downloaded before a failure are saved
+        mock_analytics_dao_inst.save_assignments_to_db.reset_mock()
+        mock_progress_model.objects.get_saved_student_ids.return_value = \
+            set()
+
+        def failing_download(*args, **kwargs):
+            yield (1, [mock_analytics[0]])
+            raise DataFailureException("/api/v1/", 500, "")
+
+        mock_canvas_dao_inst.download_assignment_analytics_for_students = \
+            MagicMock(side_effect=failing_download)
+        with self.assertRaises(DataFailureException):
+            job_dao.run_analytics_job(job)
+        mock_analytics_dao_inst.save_assignments_to_db.assert_called_once_with(
+            [mock_analytics[0]], job, student_ids=[1])
+        mock_progress_model.objects.filter.return_value.exists \
+            .return_value = False
+
+        # reset mock states
+        job_dao.delete_data_for_job.reset_mock()
+        mock_set_gcs_base_path.reset_mock()
+        mock_canvas_dao_inst.download_student_ids_for_course.reset_mock()
+
         job.type.type = AnalyticTypes.participation
         job_dao.run_analytics_job(job)
         job_dao.delete_data_for_job.assert_called_once()
         mock_set_gcs_base_path.assert_called_once_with("2021-summer", 1)
         mock_canvas_dao_inst.download_raw_analytics_for_course \
             .assert_called_once_with(12345, AnalyticTypes.participation)
+        mock_canvas_dao_inst.download_student_ids_for_course \
+            .assert_not_called()
         mock_analytics_dao_inst.save_participations_to_db.assert_called_once()
         mock_analytics_dao_inst.save_participations_to_db \
             .assert_called_once_with(
                 mock_analytics, job
             )
 
+        # reset mock states
+        job_dao.delete_data_for_job.reset_mock()
+        mock_analytics_dao_inst.save_participations_to_db.reset_mock()
+
+        # analytics are saved in chunks as they are downloaded
+        job_dao.get_analytics_chunk_size = MagicMock(return_value=1)
+        job_dao.run_analytics_job(job)
+        job_dao.delete_data_for_job.assert_called_once()
+        self.assertEqual(
+            mock_analytics_dao_inst.save_participations_to_db.call_args_list,
+            [call([mock_analytics[0]], job), call([mock_analytics[1]], job)])
+
     def test_run_task_job(self):
         job = MagicMock()
         job.type = MagicMock()
@@ -636,11 +821,19 @@ class TestJobDAO(TestCase):
             JobDAO().run_task_job(job)
             mock_create_or_update_users.assert_called_once_with(
                 sis_term_id="2021-summer")
+        job.type.type = TaskTypes.create_or_update_enrollments
+        with patch(
+                "data_aggregator.dao.TaskDAO.create_or_update_enrollments") \
+                as mock_create_or_update_enrollments:
+            JobDAO().run_task_job(job)
+            mock_create_or_update_enrollments.assert_called_once_with(
+                sis_term_id="2021-summer")
         job.type.type = TaskTypes.reload_advisers
         with patch("data_aggregator.dao.TaskDAO.reload_advisers") \
                 as mock_reload_advisers:
             JobDAO().run_task_job(job)
-            mock_reload_advisers.assert_called_once_with()
+            mock_reload_advisers.assert_called_once_with(
+                incremental=False, sis_term_id="2021-summer")
         job.type.type = TaskTypes.create_assignment_db_view
         with patch("data_aggregator.dao.TaskDAO.create_assignment_db_view") \
                 as mock_create_assignment_db_view:
@@ -710,19 +903,153 @@ class TestJobDAO(TestCase):
             JobDAO().run_task_job(job)
 
 
-class TestAnalyticsDAO(TestCase):
+class TestJobDAOCoursePriorities(TestCase):
+
+    fixtures = ['data_aggregator/fixtures/mock_data/da_participation.json',
+                'data_aggregator/fixtures/mock_data/da_course.json',
+                'data_aggregator/fixtures/mock_data/da_job.json',
+                'data_aggregator/fixtures/mock_data/da_jobtype.json',
+                'data_aggregator/fixtures/mock_data/da_term.json',
+                'data_aggregator/fixtures/mock_data/da_user.json',
+                'data_aggregator/fixtures/mock_data/da_week.json']
+
+    def test_get_course_priorities(self):
+        job_dao = JobDAO()
+        job_type = JobType(type=AnalyticTypes.participation)
+        week = Week.objects.get(id=4)
+        self.assertEqual(
+            job_dao.get_course_priorities(job_type, week),
+            {303: Participation.objects.filter(course_id=303,
+                                               week_id=3).count()})
+        # no previous week
+        week = Week.objects.get(id=1)
+        self.assertEqual(job_dao.get_course_priorities(job_type, week), {})
+        with self.assertRaises(ValueError):
+            job_dao.get_course_priorities(JobType(type="unknown"), week)
+
+    def test_get_course_priorities_scd_storage(self):
+        job_dao = JobDAO()
+        job_type = JobType(type=AnalyticTypes.participation)
+        week = Week.objects.get(id=6)
+        # week 3 versions stay valid through week 5
+        extended_count = Participation.objects.filter(
+            week_id=3).update(valid_to_week=5)
+        week_5_count = Participation.objects.filter(week_id=5).count()
+        self.assertEqual(job_dao.get_course_priorities(job_type, week),
+                         {303: week_5_count})
+        with override_settings(DATA_AGGREGATOR_SCD_STORAGE_ENABLED=True):
+            self.assertEqual(
+                job_dao.get_course_priorities(job_type, week),
+                {303: week_5_count + extended_count})
+
+
+class TestJobDAODataDeletion(TestCase):
+
+    fixtures = ['data_aggregator/fixtures/mock_data/da_assignment.json',
+                ('data_aggregator/fixtures/mock_data/'
+                 'da_assignmentdefinition.json'),
+                'data_aggregator/fixtures/mock_data/da_course.json',
+                'data_aggregator/fixtures/mock_data/da_job.json',
+                'data_aggregator/fixtures/mock_data/da_jobtype.json',
+                'data_aggregator/fixtures/mock_data/da_participation.json',
+                'data_aggregator/fixtures/mock_data/da_term.json',
+                'data_aggregator/fixtures/mock_data/da_user.json',
+                'data_aggregator/fixtures/mock_data/da_week.json']
+
+    def test_delete_data_for_job(self):
+        job = Job.objects.get(id=1)
+        job.context["week"] = 3
+        week_count = Assignment.objects.filter(week__week=3).count()
+        job_count = Assignment.objects.filter(week__week=3, job=job).count()
+        self.assertGreater(job_count, 0)
+        self.assertEqual(JobDAO().delete_data_for_job(job), job_count)
+        self.assertEqual(Assignment.objects.filter(job=job,
+                                                   week__week=3).count(), 0)
+        self.assertEqual(Assignment.objects.filter(week__week=3).count(),
+                         week_count - job_count)
+        # rows of other weeks are kept
+        self.assertTrue(Assignment.objects.filter(job=job).exists())
+
+    def test_delete_data_for_job_scd_storage(self):
+        job = Job.objects.get(id=1)
+        job.context["week"] = 3
+        # a version the job saved for week 3 that was extended through
+        # week 4
+        extended = Assignment.objects.filter(week__week=3, job=job).first()
+        Assignment.objects.filter(
+            user=extended.user, course=extended.course,
+            assignment_id=extended.assignment_id, week__week=4).delete()
+        extended.valid_to_week = 4
+        extended.save()
+
+        with override_settings(DATA_AGGREGATOR_SCD_STORAGE_ENABLED=True):
+            JobDAO().delete_data_for_job(job)
+        self.assertFalse(Assignment.objects.filter(job=job,
+                                                   week__week=3).exists())
+        # week 4 of the version is kept
+        copy = Assignment.objects.get(
+            user=extended.user, course=extended.course,
+            assignment_id=extended.assignment_id, week__week=4)
+        self.assertEqual((copy.valid_from_week, copy.valid_to_week), (4, 4))
+        self.assertEqual(copy.score, extended.score)
+
+    def test_delete_data_for_week(self):
+        job_dao = JobDAO()
+        # a version from week 3 that was extended through week 5
+        extended = Assignment.objects.filter(week__week=3).first()
+        Assignment.objects.filter(
+            user=extended.user, course=extended.course,
+            assignment_id=extended.assignment_id,
+            week__week__in=[4, 5]).delete()
+        extended.valid_to_week = 5
+        extended.save()
+        week_count = Assignment.objects.filter(week__week=4).count()
+        self.assertGreater(week_count, 0)
 
-    def mock_create_or_update_analytic(self, job, week, course,
-                                       raw_assign_dict):
-        return raw_assign_dict, True
+        self.assertEqual(
+            job_dao.delete_data_for_week(AnalyticTypes.assignment,
+                                         "2013-spring", 4),
+            week_count)
+        self.assertFalse(Assignment.objects.filter(week__week=4).exists())
+        self.assertFalse(
+            AssignmentDefinition.objects.filter(week__week=4).exists())
+        self.assertTrue(Assignment.objects.filter(week__week=5).exists())
+        extended.refresh_from_db()
+        self.assertEqual(extended.valid_to_week, 3)
+        # week 5 of the version still resolves
+        copy = Assignment.objects.get(
+            user=extended.user, course=extended.course,
+            assignment_id=extended.assignment_id,
+            valid_from_week__lte=5, valid_to_week__gte=5)
+        self.assertEqual((copy.week.week, copy.valid_from_week,
+                          copy.valid_to_week), (5, 5, 5))
+        self.assertEqual(copy.score, extended.score)
+
+        participation_count = Participation.objects.filter(
+            week__week=3).count()
+        self.assertEqual(
+            job_dao.delete_data_for_week(AnalyticTypes.participation,
+                                         "2013-spring", 3),
+            participation_count)
+        self.assertFalse(Participation.objects.filter(week__week=3).exists())
+
+        # weeks that don't exist have no data
+        self.assertEqual(
+            job_dao.delete_data_for_week(AnalyticTypes.participation,
+                                         "2013-spring", 20), 0)
 
+
+class TestAnalyticsDAO(TestCase):
+
+    @patch('data_aggregator.dao.User')
     @patch('data_aggregator.dao.Assignment')
     @patch('data_aggregator.dao.Week')
     @patch('data_aggregator.dao.Course')
     def test_save_assignments_to_db(self,
                                     mock_course_model,
                                     mock_week_model,
-                                    mock_assignment_model):
+                                    mock_assignment_model,
+                                    mock_user_model):
         mock_job = MagicMock()
         mock_job.context = {}
         mock_job.context["canvas_course_id"] = 1234567
@@ -732,11 +1059,11 @@ class TestAnalyticsDAO(TestCase):
         mock_week_model.objects.get = MagicMock(return_value=mock_week)
         mock_course = MagicMock()
         mock_course_model.objects.get = MagicMock(return_value=mock_course)
-        mock_assignment1 = MagicMock()
-        mock_assignment2 = MagicMock()
-        mock_assignments = [mock_assignment1, mock_assignment2]
-        mock_assignment_model.objects.create_or_update_assignment = \
-            MagicMock(side_effect=self.mock_create_or_update_analytic)
+        mock_assignments = [{"canvas_user_id": 1}, {"canvas_user_id": 2}]
+        mock_user_model.objects.get_user_ids = MagicMock(
+            return_value={1: 101})
+        mock_assignment_model.objects.bulk_create_or_update_assignments = \
+            MagicMock(return_value=(2, 0))
 
         analytics_dao = AnalyticsDAO()
         analytics_dao.save_assignments_to_db(mock_assignments, mock_job)
@@ -746,22 +1073,20 @@ class TestAnalyticsDAO(TestCase):
         mock_course_model.objects.get.assert_called_once_with(
                                         canvas_course_id=1234567,
                                         term__sis_term_id="2021-summer")
-        call_args_list = (
-            mock_assignment_model.objects.create_or_update_assignment
-            .call_args_list)
-        assert (call_args_list[0] ==
-                call(mock_job, mock_week, mock_course, mock_assignment1))
-        assert (call_args_list[1] ==
-                call(mock_job, mock_week, mock_course, mock_assignment2))
-        self.assertEqual(len(call_args_list), 2)
+        (mock_assignment_model.objects.bulk_create_or_update_assignments
+            .assert_called_once_with(
+                mock_job, mock_week, mock_course, mock_assignments,
+                user_ids={1: 101, 2: None}, scd_storage=False))
 
+    @patch('data_aggregator.dao.User')
     @patch('data_aggregator.dao.Participation')
     @patch('data_aggregator.dao.Week')
     @patch('data_aggregator.dao.Course')
     def test_save_participations_to_db(self,
                                        mock_course_model,
                                        mock_week_model,
-                                       mock_participation_model):
+                                       mock_participation_model,
+                                       mock_user_model):
         mock_job = MagicMock()
         mock_job.context = {}
         mock_job.context["canvas_course_id"] = 1234567
@@ -771,11 +1096,13 @@ class TestAnalyticsDAO(TestCase):
         mock_week_model.objects.get = MagicMock(return_value=mock_week)
         mock_course = MagicMock()
         mock_course_model.objects.get = MagicMock(return_value=mock_course)
-        mock_participation1 = MagicMock()
-        mock_participation2 = MagicMock()
-        mock_participations = [mock_participation1, mock_participation2]
-        mock_participation_model.objects.create_or_update_participation = \
-            MagicMock(side_effect=self.mock_create_or_update_analytic)
+        mock_participations = [{"canvas_user_id": 1},
+                               {"canvas_user_id": 2}]
+        mock_user_model.objects.get_user_ids = MagicMock(
+            return_value={1: 101})
+        mock_participation_model.objects\
+            .bulk_create_or_update_participations = \
+            MagicMock(return_value=(2, 0))
 
         analytics_dao = AnalyticsDAO()
         analytics_dao.save_participations_to_db(mock_participations, mock_job)
@@ -785,14 +1112,65 @@ class TestAnalyticsDAO(TestCase):
         mock_course_model.objects.get.assert_called_once_with(
                                         canvas_course_id=1234567,
                                         term__sis_term_id="2021-summer")
-        call_args_list = (
-            mock_participation_model.objects.create_or_update_participation
-            .call_args_list)
-        assert (call_args_list[0] ==
-                call(mock_job, mock_week, mock_course, mock_participation1))
-        assert (call_args_list[1] ==
-                call(mock_job, mock_week, mock_course, mock_participation2))
-        self.assertEqual(len(call_args_list), 2)
+        (mock_participation_model.objects.bulk_create_or_update_participations
+            .assert_called_once_with(
+                mock_job, mock_week, mock_course, mock_participations,
+                user_ids={1: 101, 2: None}, scd_storage=False))
+
+    def test_get_scd_storage_enabled(self):
+        analytics_dao = AnalyticsDAO()
+        self.assertFalse(analytics_dao.get_scd_storage_enabled())
+        with override_settings(DATA_AGGREGATOR_SCD_STORAGE_ENABLED=True):
+            self.assertTrue(analytics_dao.get_scd_storage_enabled())
+        # delta ingestion only writes changed analytics
+        with override_settings(DATA_AGGREGATOR_DELTA_INGESTION_ENABLED=True):
+            self.assertTrue(analytics_dao.get_scd_storage_enabled())
+
+    @patch('data_aggregator.dao.User')
+    @patch('data_aggregator.dao.Participation')
+    @patch('data_aggregator.dao.Week')
+    @patch('data_aggregator.dao.Course')
+    def test_save_participations_to_db_scd_storage(self,
+                                                   mock_course_model,
+                                                   mock_week_model,
+                                                   mock_participation_model,
+                                                   mock_user_model):
+        mock_job = MagicMock()
+        mock_job.context = {"canvas_course_id": 1234567,
+                            "sis_term_id": "2021-summer",
+                            "week": 5}
+        mock_user_model.objects.get_user_ids = MagicMock(
+            return_value={1: 101})
+        mock_participation_model.objects\
+            .bulk_create_or_update_participations = \
+            MagicMock(return_value=(1, 0))
+
+        analytics_dao = AnalyticsDAO(scd_storage=True)
+        analytics_dao.save_participations_to_db([{"canvas_user_id": 1}],
+                                                mock_job)
+        _, kwargs = (mock_participation_model.objects
+                     .bulk_create_or_update_participations.call_args)
+        self.assertTrue(kwargs["scd_storage"])
+
+    @patch('data_aggregator.dao.User')
+    def test_load_user_ids(self, mock_user_model):
+        mock_user_model.objects.get_user_ids = MagicMock(
+            return_value={1: 101, 2: 102})
+        analytics_dao = AnalyticsDAO()
+        self.assertEqual(analytics_dao.load_user_ids([1, 2, 3]),
+                         {1: 101, 2: 102, 3: None})
+        mock_user_model.objects.get_user_ids.assert_called_once_with(
+            {1, 2, 3})
+
+        # previously resolved ids, including misses, aren't queried again
+        mock_user_model.objects.get_user_ids.reset_mock()
+        mock_user_model.objects.get_user_ids.return_value = {4: 104}
+        self.assertEqual(analytics_dao.load_user_ids([2, 3, 4]),
+                         {2: 102, 3: None, 4: 104})
+        mock_user_model.objects.get_user_ids.assert_called_once_with({4})
+        mock_user_model.objects.get_user_ids.reset_mock()
+        analytics_dao.load_user_ids([1, 3])
+        mock_user_model.objects.get_user_ids.assert_not_called()
 
 
 class TestTaskDAO(TestCase):
@@ -825,6 +1203,24 @@ class TestTaskDAO(TestCase):
         assert (call_args_list[1] == call(mock_term2))
         self.assertEqual(len(call_args_list), 2)
 
+    @patch('data_aggregator.dao.Week')
+    def test_get_week_snapshot_sql(self, mock_week_model):
+        td = self.get_test_task_dao()
+        mock_week = MagicMock(id=12, term_id=3, week=4)
+        self.assertEqual(
+            td.get_week_snapshot_sql("p", mock_week),
+            ("data_aggregator_week.id AS week_id", "p.week_id = 12"))
+        (mock_week_model.objects.filter.return_value.values_list
+            .return_value) = [12, 9, 10, 11]
+        with override_settings(DATA_AGGREGATOR_SCD_STORAGE_ENABLED=True):
+            self.assertEqual(
+                td.get_week_snapshot_sql("a", mock_week),
+                ("12 AS week_id",
+                 "a.week_id IN (9, 10, 11, 12) "
+                 "AND a.valid_from_week <= 4 AND a.valid_to_week >= 4"))
+        mock_week_model.objects.filter.assert_called_once_with(
+            term_id=3, week__lte=4)
+
     def test_create_or_update_courses(self):
         td = self.get_test_task_dao()
         mock_course_provisioning_file = \
@@ -837,10 +1233,37 @@ class TestTaskDAO(TestCase):
         with patch.object(CanvasDAO,
                           'download_course_provisioning_report',
                           return_value=mock_course_data):
-            self.assertEqual(
-                td.create_or_update_courses(sis_term_id="2021-spring"),
-                1
-            )
+            with self.assertLogs(level="INFO") as cm:
+                self.assertEqual(
+                    td.create_or_update_courses(sis_term_id="2021-spring"),
+                    1
+                )
+            self.assertIn("INFO:root:Created 1 courses.", cm.output)
+            self.assertIn("INFO:root:Updated 0 courses.", cm.output)
+            # the 831726 row is missing a column so it isn't created by sis
+            course = Course.objects.get(canvas_course_id=813366,
+                                        term__sis_term_id="2021-spring")
+            self.assertEqual(course.sis_course_id,
+                             "2013-spring-B CUSP-122-A")
+
+            # unchanged courses aren't written again
+            with patch.object(Course.objects, 'bulk_update') as \
+                    mock_bulk_update:
+                td.create_or_update_courses(sis_term_id="2021-spring")
+                mock_bulk_update.assert_called_once_with(
+                    [], ANY, batch_size=5000)
+
+            # changed courses are updated
+            course.short_name = "B CUSP 122 B"
+            course.save()
+            with self.assertLogs(level="INFO") as cm:
+                td.create_or_update_courses(sis_term_id="2021-spring")
+            self.assertIn("INFO:root:Created 0 courses.", cm.output)
+            self.assertIn("INFO:root:Updated 1 courses.", cm.output)
+            course.refresh_from_db()
+            self.assertEqual(course.short_name, "B CUSP 122 A")
+            self.assertEqual(Course.objects.filter(
+                canvas_course_id=813366).count(), 1)
 
     @patch('data_aggregator.dao.get_advisers_by_regid')
     @patch('data_aggregator.dao.User.objects')
@@ -862,12 +1285,72 @@ class TestTaskDAO(TestCase):
             mock_user_manager.filter.assert_called_once_with(
                 status='active'
             )
-            call_args_list = mock_get_advisers_by_regid.call_args_list
-            assert (call_args_list[0] ==
-                    call(mock_user1.sis_user_id))
-            assert (call_args_list[1] ==
-                    call(mock_user2.sis_user_id))
-            self.assertEqual(mock_adviser_class().save.call_count, 2)
+            mock_get_advisers_by_regid.assert_has_calls(
+                [call(mock_user1.sis_user_id),
+                 call(mock_user2.sis_user_id)], any_order=True)
+            mock_adviser_class.objects.all.return_value.delete \
+                .assert_called_once()
+            mock_adviser_class.objects.bulk_create.assert_called_once_with(
+                [mock_adviser_class.return_value,
+                 mock_adviser_class.return_value], batch_size=5000)
+            mock_adviser_class.return_value.save.assert_not_called()
+
+    @patch('data_aggregator.dao.get_advisers_by_regid')
+    @patch('data_aggregator.dao.Term.objects')
+    @patch('data_aggregator.dao.User.objects')
+    def test_reload_advisers_incremental(self, mock_user_manager,
+                                         mock_term_manager,
+                                         mock_get_advisers_by_regid):
+        td = self.get_test_task_dao()
+        mock_term = MagicMock()
+        mock_term_manager.get_or_create_term_from_sis_term_id.return_value = \
+            (mock_term, False)
+        mock_user = create_autospec(User, _state=MagicMock())
+        mock_user.id = 1
+        mock_user.sis_user_id = "12345"
+        mock_user_manager.get_users_for_adviser_refresh.return_value = [
+            mock_user]
+        mock_get_advisers_by_regid.return_value = [MagicMock()]
+        with patch('data_aggregator.dao.Adviser') as mock_adviser_class:
+            td.reload_advisers(incremental=True, sis_term_id="2021-spring")
+            mock_term_manager.get_or_create_term_from_sis_term_id \
+                .assert_called_once_with(sis_term_id="2021-spring")
+            stale_before, term = mock_user_manager \
+                .get_users_for_adviser_refresh.call_args[0]
+            self.assertEqual(term, mock_term)
+            self.assertAlmostEqual(
+                (datetime.now(timezone.utc) - stale_before).total_seconds(),
+                timedelta(days=7).total_seconds(), delta=60)
+            mock_user_manager.filter.assert_not_called()
+            mock_get_advisers_by_regid.assert_called_once_with("12345")
+            # the refreshed users are marked as checked
+            user_ids, checked = mock_user_manager \
+                .set_advisers_checked.call_args[0]
+            self.assertEqual(user_ids, [1])
+            self.assertGreaterEqual(checked, stale_before)
+            # only the advisers of the refreshed users are replaced
+            mock_adviser_class.objects.all.assert_not_called()
+            mock_adviser_class.objects.filter.assert_called_once_with(
+                user_id__in=[1])
+            mock_adviser_class.objects.filter.return_value.delete \
+                .assert_called_once()
+            mock_adviser_class.objects.exclude.assert_called_once_with(
+                user__status='active')
+            mock_adviser_class.objects.bulk_create.assert_called_once_with(
+                [mock_adviser_class.return_value], batch_size=5000)
+
+    @patch('data_aggregator.dao.get_advisers_by_regid')
+    def test_download_advisers(self, mock_get_advisers_by_regid):
+        td = self.get_test_task_dao()
+        user = User(sis_user_id="12345", login_id="javerage")
+        mock_get_advisers_by_regid.return_value = [MagicMock()]
+        self.assertEqual(td.download_advisers(user),
+                         mock_get_advisers_by_regid.return_value)
+        mock_get_advisers_by_regid.assert_called_once_with("12345")
+        # users without advisers return an empty list
+        mock_get_advisers_by_regid.side_effect = DataFailureException(
+            "/student/v5/person/12345/advisers.json", 404, "")
+        self.assertEqual(td.download_advisers(user), [])
 
     def test_create_or_update_users(self):
         td = self.get_test_task_dao()
@@ -881,15 +1364,93 @@ class TestTaskDAO(TestCase):
         with patch.object(CanvasDAO,
                           'download_user_provisioning_report',
                           return_value=mock_user_data):
+            with self.assertLogs(level="INFO") as cm:
+                self.assertEqual(
+                    td.create_or_update_users(sis_term_id="2021-spring"),
+                    20
+                )
+            self.assertIn("INFO:root:Created 20 user(s).", cm.output)
+            self.assertIn("INFO:root:Updated 0 user(s).", cm.output)
+            self.assertEqual(User.objects.count(), 20)
+
+            # unchanged users aren't written again
+            with patch.object(User.objects, 'bulk_update') as \
+                    mock_bulk_update:
+                td.create_or_update_users(sis_term_id="2021-spring")
+                mock_bulk_update.assert_called_once_with(
+                    [], ANY, batch_size=5000)
+
+            # changed users are updated
+            user = User.objects.first()
+            email = user.email
+            user.email = "changed@uw.edu"
+            user.save()
+            with self.assertLogs(level="INFO") as cm:
+                td.create_or_update_users(sis_term_id="2021-spring")
+            self.assertIn("INFO:root:Created 0 user(s).", cm.output)
+            self.assertIn("INFO:root:Updated 1 user(s).", cm.output)
+            user.refresh_from_db()
+            self.assertEqual(user.email, email)
+            self.assertEqual(User.objects.count(), 20)
+
+    def test_create_or_update_enrollments(self):
+        td = self.get_test_task_dao()
+        mock_enrollment_provisioning_file = \
+            os.path.join(
+                os.path.dirname(__file__),
+                'test_data/enrollment_provisioning_report.csv')
+        mock_enrollment_data = \
+            open(mock_enrollment_provisioning_file).read().split("\n")
+        with patch.object(CanvasDAO,
+                          'download_enrollment_provisioning_report',
+                          return_value=mock_enrollment_data):
+            # only student enrollments in the states returned by the
+            # enrollments api are loaded
             self.assertEqual(
-                td.create_or_update_users(sis_term_id="2021-spring"),
-                20
-            )
+                td.create_or_update_enrollments(sis_term_id="2021-spring"),
+                3)
+            # reloading replaces the snapshot
+            self.assertEqual(
+                td.create_or_update_enrollments(sis_term_id="2021-spring"),
+                3)
+        self.assertEqual(Enrollment.objects.count(), 3)
+        self.assertEqual(
+            sorted(Enrollment.objects.get_student_ids_for_course(
+                "2021-spring", 1452786)),
+            [3179956, 3199810])
+        self.assertEqual(
+            Enrollment.objects.get_student_ids_for_course(
+                "2021-spring", 1392640),
+            [3179956])
+        self.assertEqual(
+            Enrollment.objects.get_student_ids_for_course(
+                "2021-spring", 1), [])
+        # no snapshot for the term
+        self.assertIsNone(
+            Enrollment.objects.get_student_ids_for_course(
+                "2021-summer", 1452786))
+
+        # assignment jobs use the snapshot when the term has one
+        mock_cd = MagicMock()
+        job_dao = JobDAO()
+        self.assertEqual(
+            job_dao.get_student_ids_for_course(mock_cd, "2021-spring",
+                                               1392640),
+            [3179956])
+        mock_cd.download_student_ids_for_course.assert_not_called()
+        self.assertEqual(
+            job_dao.get_student_ids_for_course(mock_cd, "2021-summer",
+                                               1392640),
+            mock_cd.download_student_ids_for_course.return_value)
+        mock_cd.download_student_ids_for_course.assert_called_once_with(
+            1392640)
 
 
 class TestLoadRadDAO(TestCase):
 
     fixtures = ['data_aggregator/fixtures/mock_data/da_assignment.json',
+                ('data_aggregator/fixtures/mock_data/'
+                 'da_assignmentdefinition.json'),
                 'data_aggregator/fixtures/mock_data/da_course.json',
                 'data_aggregator/fixtures/mock_data/da_job.json',
                 'data_aggregator/fixtures/mock_data/da_jobtype.json',
@@ -1113,6 +1674,139 @@ class TestLoadRadDAO(TestCase):
             mock_file_obj)
 
 
+class TestArchiveDAO(TestCase):
+
+    fixtures = ['data_aggregator/fixtures/mock_data/da_assignment.json',
+                ('data_aggregator/fixtures/mock_data/'
+                 'da_assignmentdefinition.json'),
+                'data_aggregator/fixtures/mock_data/da_course.json',
+                'data_aggregator/fixtures/mock_data/da_job.json',
+                'data_aggregator/fixtures/mock_data/da_jobtype.json',
+                'data_aggregator/fixtures/mock_data/da_participation.json',
+                'data_aggregator/fixtures/mock_data/da_term.json',
+                'data_aggregator/fixtures/mock_data/da_user.json',
+                'data_aggregator/fixtures/mock_data/da_week.json']
+
+    def get_test_archive_dao(self):
+        ad = ArchiveDAO()
+        # in memory bucket
+        self.gcs_files = {}
+
+        def upload_to_gcs_bucket(url_key, content):
+            self.gcs_files[url_key] = (content.read()
+                                       if isinstance(content, IOBase)
+                                       else content)
+
+        def download_from_gcs_bucket(url_key, decode=True):
+            return self.gcs_files[url_key]
+
+        ad.upload_to_gcs_bucket = MagicMock(side_effect=upload_to_gcs_bucket)
+        ad.download_from_gcs_bucket = MagicMock(
+            side_effect=download_from_gcs_bucket)
+        return ad
+
+    def test_archive_term(self):
+        ad = self.get_test_archive_dao()
+        term = Term.objects.get(sis_term_id="2013-spring")
+        assign_count = Assignment.objects.filter(week__term=term).count()
+        partic_count = Participation.objects.filter(week__term=term).count()
+        week_3_partic_count = Participation.objects.filter(
+            week__term=term, week__week=3).count()
+
+        manifest = ad.archive_term("2013-spring")
+        self.assertIn("archive/2013-spring/manifest.json", self.gcs_files)
+        self.assertIn("archive/2013-spring/assignment/week-3.parquet",
+                      self.gcs_files)
+        row_counts = {AnalyticTypes.assignment: 0,
+                      AnalyticTypes.participation: 0}
+        for archive_file in manifest["files"].values():
+            row_counts[archive_file["analytic_type"]] += \
+                archive_file["row_count"]
+        self.assertEqual(row_counts, {
+            AnalyticTypes.assignment: assign_count,
+            AnalyticTypes.participation: partic_count})
+
+        # the term's analytics and jobs are pruned
+        self.assertFalse(
+            Assignment.objects.filter(week__term=term).exists())
+        self.assertFalse(
+            Participation.objects.filter(week__term=term).exists())
+        self.assertFalse(
+            AssignmentDefinition.objects.filter(week__term=term).exists())
+        self.assertFalse(
+            Job.objects.filter(context__sis_term_id="2013-spring").exists())
+
+        # and can be read from the archive
+        assign_df = ad.read_archived_analytics("2013-spring",
+                                               AnalyticTypes.assignment)
+        self.assertEqual(len(assign_df), assign_count)
+        self.assertEqual(set(assign_df["sis_term_id"]), {"2013-spring"})
+        self.assertIn("title", assign_df.columns)
+        partic_df = ad.read_archived_analytics(
+            "2013-spring", AnalyticTypes.participation, week_num=3)
+        self.assertEqual(len(partic_df), week_3_partic_count)
+        self.assertEqual(set(partic_df["week"]), {3})
+
+    @patch('data_aggregator.dao.partitions.drop_week_partitions')
+    def test_prune_term(self, mock_drop_week_partitions):
+        ad = self.get_test_archive_dao()
+        term = Term.objects.get(sis_term_id="2013-spring")
+        weeks = list(Week.objects.filter(term=term))
+
+        def get_deleted_models(partitioned):
+            mock_drop_week_partitions.return_value = partitioned
+            with patch('data_aggregator.dao.delete_week_analytics',
+                       wraps=delete_week_analytics) as mock_delete:
+                ad.prune_term(term, weeks)
+            mock_drop_week_partitions.assert_called_with(
+                [week.id for week in weeks])
+            return {delete_call.args[0]
+                    for delete_call in mock_delete.call_args_list}
+
+        # dropping the partitions removes the analytics, so only the
+        # assignment definitions are deleted
+        self.assertEqual(get_deleted_models(True), {AssignmentDefinition})
+        self.assertFalse(
+            Job.objects.filter(context__sis_term_id="2013-spring").exists())
+        # rows are deleted when the tables aren't partitioned
+        self.assertEqual(get_deleted_models(False),
+                         {Assignment, Participation, AssignmentDefinition})
+        self.assertFalse(
+            Assignment.objects.filter(week__term=term).exists())
+        self.assertFalse(
+            Participation.objects.filter(week__term=term).exists())
+        self.assertFalse(
+            AssignmentDefinition.objects.filter(week__term=term).exists())
+
+    def test_archive_term_errors(self):
+        ad = self.get_test_archive_dao()
+        assign_count = Assignment.objects.count()
+        with self.assertRaises(ValueError):
+            ad.archive_term("2099-autumn")
+
+        # unfinished term
+        term = Term.objects.get(sis_term_id="2013-spring")
+        term.grade_submission_deadline = \
+            datetime.now(timezone.utc) + timedelta(days=1)
+        term.save()
+        with self.assertRaises(RuntimeError):
+            ad.archive_term("2013-spring")
+
+        # running jobs
+        Job.objects.filter(id=1).update(pid=1234)
+        with self.assertRaises(RuntimeError):
+            ad.archive_term("2013-spring", force=True)
+        Job.objects.filter(id=1).update(pid=None)
+
+        # archived row counts don't match the database
+        get_archive_df = ad.get_archive_df
+        ad.get_archive_df = MagicMock(
+            side_effect=lambda *args: get_archive_df(*args).head(1))
+        with self.assertRaises(RuntimeError):
+            ad.archive_term("2013-spring", force=True)
+        self.assertEqual(Assignment.objects.count(), assign_count)
+
+
 class TestEdwDAO(TestCase):
 
     def _get_test_edw_dao(self):
@@ -2,9 +2,11 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
+import json
 import unittest
 from data_aggregator.models import Job
-from data_aggregator.views.api.jobs import JobRestartView
+from data_aggregator.views.api.jobs import JobChartDataView, \
+    JobRestartView, JobView
 from django.utils import timezone
 from data_aggregator.tests.view_utils import BaseViewTestCase
 from data_aggregator.utilities import datestring_to_datetime
@@ -68,5 +70,77 @@ class TestJobRestartView(BaseViewTestCase):
             self.assertTrue(mock_restart_jobs.called)
 
 
+class TestJobChartDataView(BaseViewTestCase):
+
+    fixtures = ['data_aggregator/fixtures/mock_data/da_job.json',
+                'data_aggregator/fixtures/mock_data/da_jobtype.json']
+
+    def test_post(self):
+        with patch.object(
+                timezone, "now",
+                return_value=datestring_to_datetime("2021-04-2T12:00:00.0Z")):
+            request = self.get_post_request('/api/internal/jobs-chart-data/',
+                                            {})
+            response = JobChartDataView().post(request)
+            self.assertEqual(json.loads(response.content),
+                             {"pending": 3, "claimed": 0, "running": 0,
+                              "completed": 0, "failed": 0, "expired": 4})
+            # jobs that ended before now are read as expired, not written
+            self.assertEqual(
+                Job.objects.filter(status="expired").count(), 0)
+
+            request = self.get_post_request('/api/internal/jobs-chart-data/',
+                                            {"jobType": ["assignment"]})
+            response = JobChartDataView().post(request)
+            self.assertEqual(json.loads(response.content),
+                             {"pending": 2, "claimed": 0, "running": 0,
+                              "completed": 0, "failed": 0, "expired": 1})
+
+
+class TestJobView(BaseViewTestCase):
+
+    fixtures = ['data_aggregator/fixtures/mock_data/da_job.json',
+                'data_aggregator/fixtures/mock_data/da_jobtype.json']
+
+    def get_jobs(self, **filters):
+        request = self.get_post_request('/api/internal/jobs/', filters)
+        response = JobView().post(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_post(self):
+        with patch.object(
+                timezone, "now",
+                return_value=datestring_to_datetime("2021-04-2T12:00:00.0Z")):
+            # jobs are sorted by status in the database, then by id
+            status, content = self.get_jobs(sortBy="status", currPage=1,
+                                            perPage=3)
+            self.assertEqual(status, 200)
+            self.assertEqual(content["total_jobs"], 7)
+            self.assertEqual([job["id"] for job in content["jobs"]],
+                             [4, 5, 6])
+            self.assertEqual(content["jobs"][0]["status"], "expired")
+            self.assertEqual(content["jobs"][0]["job_type"], "assignment")
+            status, content = self.get_jobs(sortBy="status", currPage=3,
+                                            perPage=3)
+            self.assertEqual([job["id"] for job in content["jobs"]], [3])
+
+            # context fields can be sorted on
+            status, content = self.get_jobs(
+                sortBy="context.canvas_course_id", sortDesc=True,
+                currPage=1, perPage=3)
+            self.assertEqual([job["id"] for job in content["jobs"]],
+                             [3, 1, 7])
+
+            # filters are applied before paging
+            status, content = self.get_jobs(jobStatus=["pending"],
+                                            currPage=1, perPage=2)
+            self.assertEqual(content["total_jobs"], 3)
+            self.assertEqual([job["id"] for job in content["jobs"]], [1, 2])
+
+            status, content = self.get_jobs(sortBy="target_date_end",
+                                            currPage=1, perPage=3)
+            self.assertEqual(status, 400)
+
+
 if __name__ == "__main__":
     unittest.main()
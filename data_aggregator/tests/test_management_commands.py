@@ -3,7 +3,12 @@
 
 
 import unittest
-from data_aggregator.models import Job
+from django.core.management.base import CommandError
+from data_aggregator.canvas_replay import SyntheticCanvasDAO
+from data_aggregator.models import Course, Enrollment, Job, User
+from data_aggregator.management.commands._base import RunJobCommand
+from data_aggregator.management.commands.benchmark_jobs import \
+    BENCHMARK_SIS_TERM_ID, Command as BenchmarkJobsCommand
 from data_aggregator.management.commands._mixins import RunJobMixin
 from django.test import TestCase
 from mock import MagicMock, patch
@@ -47,5 +52,103 @@ class TestRunJobMixin(TestCase):
         self.assertEqual(completed_job, mock_job)
 
 
+class TestRunJobCommand(TestCase):
+
+    def get_options(self, **kwargs):
+        options = {"job_name": "assignment",
+                   "job_batch_size": None,
+                   "num_parallel_jobs": 2,
+                   "executor": "thread",
+                   "threads_per_process": 1,
+                   "reclaim": False}
+        options.update(kwargs)
+        return options
+
+    @patch("data_aggregator.management.commands._base.ProcessPool")
+    @patch("data_aggregator.management.commands._base.Job")
+    def test_handle_process_executor(self, mock_job_model, mock_pool):
+        mock_jobs = [MagicMock(id=1), MagicMock(id=2)]
+        mock_job_model.objects.claim_batch_of_jobs.return_value = mock_jobs
+        command = RunJobCommand()
+        command.handle(**self.get_options(executor="process",
+                                          threads_per_process=4))
+        mock_job_model.objects.claim_batch_of_jobs.assert_called_once_with(
+            "assignment", batchsize=None, reclaim=False, lease_seconds=600)
+        mock_pool.assert_called_once_with(processes=2,
+                                          threads_per_process=4)
+        mock_pool.return_value.__enter__.return_value.map \
+            .assert_called_once_with(command.run_job_by_id, [1, 2])
+
+    @patch("data_aggregator.management.commands._base.Job")
+    def test_run_job_by_id(self, mock_job_model):
+        command = RunJobCommand()
+        command.run_job = MagicMock()
+        command.run_job_by_id(5)
+        mock_job_model.objects.get.assert_called_once_with(id=5)
+        command.run_job.assert_called_once_with(
+            mock_job_model.objects.get.return_value)
+
+
+class TestBenchmarkJobsCommand(TestCase):
+
+    def get_options(self, **kwargs):
+        options = {"job_name": "assignment",
+                   "canvas_dao": "synthetic",
+                   "course_sizes": [3, 5],
+                   "courses_per_size": 2,
+                   "num_assignments": 4,
+                   "sis_term_id": None,
+                   "week": None,
+                   "replay_dir": None,
+                   "latency": 0.0,
+                   "error_rate": 0.0,
+                   "throttle_rate": 0.0,
+                   "num_parallel_downloads": None,
+                   "num_parallel_jobs": 2,
+                   "executor": "thread",
+                   "threads_per_process": 1,
+                   "keep_data": False}
+        options.update(kwargs)
+        return options
+
+    @patch("data_aggregator.management.commands.benchmark_jobs.call_command")
+    def test_handle_synthetic(self, mock_call_command):
+        def run_jobs(*args, **kwargs):
+            courses = Course.objects.filter(
+                term__sis_term_id=BENCHMARK_SIS_TERM_ID)
+            self.assertEqual(courses.count(), 4)
+            self.assertEqual(User.objects.count(), 5)
+            self.assertEqual(Enrollment.objects.count(), 16)
+            self.assertEqual(len(SyntheticCanvasDAO.courses), 4)
+            self.assertEqual(Job.objects.count(), 4)
+
+        mock_call_command.side_effect = run_jobs
+        command = BenchmarkJobsCommand()
+        command.stdout = MagicMock()
+        command.handle(**self.get_options())
+        mock_call_command.assert_called_once_with(
+            "run_jobs", "assignment", num_parallel_jobs=2,
+            executor="thread", threads_per_process=1)
+        self.assertIn("jobs/sec", command.stdout.write.call_args[0][0])
+        # benchmark data is removed afterwards
+        self.assertEqual(Job.objects.count(), 0)
+        self.assertEqual(Course.objects.count(), 0)
+        self.assertEqual(User.objects.count(), 0)
+        self.assertEqual(SyntheticCanvasDAO.courses, {})
+
+    @patch("data_aggregator.management.commands.benchmark_jobs.call_command")
+    def test_handle_errors(self, mock_call_command):
+        command = BenchmarkJobsCommand()
+        with self.assertRaises(CommandError):
+            command.handle(**self.get_options(canvas_dao="replay"))
+        with patch("data_aggregator.management.commands.benchmark_jobs.Job")\
+                as mock_job_model:
+            mock_job_model.objects.get_pending_or_running_jobs.return_value\
+                .exists.return_value = True
+            with self.assertRaises(CommandError):
+                command.handle(**self.get_options())
+        mock_call_command.assert_not_called()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
+import os
 import random
 import unittest
 from django.db.utils import IntegrityError
@@ -9,8 +10,9 @@ from django.test import TestCase
 from django.utils import timezone
 from datetime import timedelta, date
 from data_aggregator.models import (
-    Assignment, Job, Participation, Term, Week, Course, JobType, AnalyticTypes,
-    User, TaskTypes, Report, SubaccountActivity)
+    Adviser, Assignment, AssignmentDefinition, Enrollment, Job,
+    Participation, Term, Week, Course, JobType, AnalyticTypes, User,
+    TaskTypes, Report, SubaccountActivity, JobStudentProgress)
 from data_aggregator.utilities import datestring_to_datetime
 from mock import MagicMock, patch
 
@@ -284,17 +286,77 @@ class TestJob(TestCase):
         job.start = None
         job.end = None
         job.message = None
-        self.assertEqual(job.status, "pending")
+        self.assertEqual(job.get_status(), "pending")
         job.pid = 12345
-        self.assertEqual(job.status, "claimed")
+        self.assertEqual(job.get_status(), "claimed")
         job.target_date_end = timezone.now() - timedelta(minutes=1)
-        self.assertEqual(job.status, "expired")
+        self.assertEqual(job.get_status(), "expired")
         job.start = timezone.now()
-        self.assertEqual(job.status, "running")
+        self.assertEqual(job.get_status(), "running")
         job.end = timezone.now()
-        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.get_status(), "completed")
         job.message = "error"
-        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.get_status(), "failed")
+
+    def test_stored_status(self):
+        job = Job()
+        job.type = JobType.objects.create(type=AnalyticTypes.assignment)
+        job.target_date_start = timezone.now()
+        job.target_date_end = timezone.now() + timedelta(days=1)
+        job.context = {}
+        job.save()
+        self.assertEqual(Job.objects.get(id=job.id).status, "pending")
+        job.claim_job()
+        self.assertEqual(Job.objects.get(id=job.id).status, "claimed")
+        job.start_job()
+        self.assertEqual(Job.objects.get(id=job.id).status, "running")
+        job.message = "error"
+        job.save()
+        self.assertEqual(Job.objects.get(id=job.id).status, "failed")
+        job.restart_job()
+        self.assertEqual(Job.objects.get(id=job.id).status, "pending")
+        job.claim_job()
+        job.start_job()
+        job.end_job()
+        self.assertEqual(Job.objects.get(id=job.id).status, "completed")
+
+    def test_expire_jobs(self):
+        job_type = JobType.objects.create(type=AnalyticTypes.assignment)
+        expired_job = Job.objects.create(
+            type=job_type, context={},
+            target_date_start=timezone.now() - timedelta(days=2),
+            target_date_end=timezone.now() - timedelta(days=1))
+        active_job = Job.objects.create(
+            type=job_type, context={},
+            target_date_start=timezone.now(),
+            target_date_end=timezone.now() + timedelta(days=1))
+        # the stored status of a job is only updated when it is saved
+        Job.objects.filter(id=expired_job.id).update(status="pending")
+        self.assertEqual(Job.objects.expire_jobs(), 1)
+        self.assertEqual(Job.objects.get(id=expired_job.id).status,
+                         "expired")
+        self.assertEqual(Job.objects.get(id=active_job.id).status,
+                         "pending")
+
+    def test_with_current_status(self):
+        job_type = JobType.objects.create(type=AnalyticTypes.assignment)
+        expired_job = Job.objects.create(
+            type=job_type, context={},
+            target_date_start=timezone.now() - timedelta(days=2),
+            target_date_end=timezone.now() - timedelta(days=1))
+        active_job = Job.objects.create(
+            type=job_type, context={},
+            target_date_start=timezone.now(),
+            target_date_end=timezone.now() + timedelta(days=1))
+        Job.objects.filter(id=expired_job.id).update(status="pending")
+        jobs = Job.objects.with_current_status()
+        self.assertEqual(jobs.get(id=expired_job.id).current_status,
+                         "expired")
+        self.assertEqual(jobs.get(id=active_job.id).current_status,
+                         "pending")
+        # nothing is written
+        self.assertEqual(Job.objects.get(id=expired_job.id).status,
+                         "pending")
 
     def test_restart_job(self):
         job = self.get_test_job_full()
@@ -337,6 +399,7 @@ class TestJob(TestCase):
         self.assertNotEqual(job.target_date_end, None)
         self.assertNotEqual(job.pid, None)
         self.assertNotEqual(job.start, None)  # start is set in job start
+        self.assertEqual(job.heartbeat, job.start)  # lease starts with job
         self.assertEqual(job.end, None)  # end is set to None job start
         self.assertEqual(job.message, '')  # message is set to '' job start
         self.assertEqual(job.created, TestJob.created)
@@ -348,6 +411,18 @@ class TestJob(TestCase):
             job.pid = None
             job.start_job(save=False)
 
+    def test_refresh_heartbeat(self):
+        job = self.get_test_job_full()
+        job.type = JobType.objects.create(type=AnalyticTypes.assignment)
+        job.context = {}
+        job.save()
+        with patch.object(
+                timezone, "now",
+                return_value=datestring_to_datetime("2021-04-02T12:00:00.0Z")):
+            job.refresh_heartbeat()
+        self.assertEqual(Job.objects.get(id=job.id).heartbeat,
+                         datestring_to_datetime("2021-04-02T12:00:00.0Z"))
+
     def test_end_job(self):
         job = self.get_test_job_full()
         # claim job
@@ -398,10 +473,28 @@ class TestJobManager(TestCase):
     def get_mock_job_manager(self):
         Job.objects.get_pending_jobs = \
             MagicMock(side_effect=Job.objects.get_pending_jobs)
-        Job.objects.get_pending_or_running_jobs = \
-            MagicMock(side_effect=Job.objects.get_pending_or_running_jobs)
+        Job.objects.get_expired_lease_jobs = \
+            MagicMock(side_effect=Job.objects.get_expired_lease_jobs)
         return Job.objects
 
+    def test_claim_batch_of_jobs_by_priority(self):
+        Job.objects.filter(id=2).update(priority=10)
+        with patch.object(
+                timezone, "now",
+                return_value=datestring_to_datetime("2021-04-2T12:00:00.0Z")):
+            # highest priority job is claimed first
+            jobs = Job.objects.claim_batch_of_jobs(AnalyticTypes.assignment,
+                                                   batchsize=1)
+            self.assertEqual([job.id for job in jobs], [2])
+            # remaining jobs are claimed in id order
+            jobs = Job.objects.claim_batch_of_jobs(AnalyticTypes.assignment,
+                                                   batchsize=1)
+            self.assertEqual([job.id for job in jobs], [1])
+            # claims are saved to the database
+            self.assertEqual(
+                set(Job.objects.filter(pid=os.getpid())
+                    .values_list("id", flat=True)), {1, 2})
+
     def test_restart_jobs(self):
         with patch.object(
                 timezone, "now",
@@ -524,22 +617,35 @@ class TestJobManager(TestCase):
                 self.assertEqual(job.status, "claimed")
                 self.assertEqual(job.type.type, AnalyticTypes.assignment)
             self.assertEqual(mock_jm.get_pending_jobs.called, True)
-            self.assertEqual(mock_jm.get_pending_or_running_jobs.called,
+            self.assertEqual(mock_jm.get_expired_lease_jobs.called,
                              False)
 
             # assert that all assignment jobs are now claimed
             for job in mock_jm.get_active_jobs(AnalyticTypes.assignment):
                 self.assertEqual(job.status, "claimed")
+            # running jobs are only reclaimed when asked to
+            self.assertEqual(
+                mock_jm.claim_batch_of_jobs(AnalyticTypes.assignment), [])
+            self.assertEqual(mock_jm.get_expired_lease_jobs.called,
+                             False)
+            # and once their lease expired
+            self.assertEqual(
+                mock_jm.claim_batch_of_jobs(AnalyticTypes.assignment,
+                                            reclaim=True), [])
+        with patch.object(
+                timezone, "now",
+                return_value=datestring_to_datetime("2021-04-02T12:11:00.0Z")):
             # assert reclaiming assignment jobs
             claimed_assignment_jobs = \
-                mock_jm.claim_batch_of_jobs(AnalyticTypes.assignment)
+                mock_jm.claim_batch_of_jobs(AnalyticTypes.assignment,
+                                            reclaim=True)
             self.assertEqual(len(claimed_assignment_jobs), 2)
             for job in claimed_assignment_jobs:
                 self.assertEqual(job.status, "claimed")
                 self.assertEqual(job.type.type, AnalyticTypes.assignment)
             self.assertEqual(mock_jm.get_pending_jobs.called, True)
-            self.assertEqual(mock_jm.get_pending_or_running_jobs.called,
-                             True)
+            mock_jm.get_expired_lease_jobs.assert_called_with(
+                AnalyticTypes.assignment, 600)
 
     def test_claim_batch_of_participation_jobs(self):
         with patch.object(
@@ -558,27 +664,117 @@ class TestJobManager(TestCase):
                 self.assertEqual(job.status, "claimed")
                 self.assertEqual(job.type.type, AnalyticTypes.participation)
             self.assertEqual(mock_jm.get_pending_jobs.called, True)
-            self.assertEqual(mock_jm.get_pending_or_running_jobs.called,
+            self.assertEqual(mock_jm.get_expired_lease_jobs.called,
                              False)
 
             # assert that all participation jobs are initially claimed
             for job in mock_jm.get_active_jobs(AnalyticTypes.participation):
                 self.assertEqual(job.status, "claimed")
+            # running jobs are only reclaimed when asked to
+            self.assertEqual(
+                mock_jm.claim_batch_of_jobs(AnalyticTypes.participation), [])
+            self.assertEqual(mock_jm.get_expired_lease_jobs.called,
+                             False)
+            # and once their lease expired
+            self.assertEqual(
+                mock_jm.claim_batch_of_jobs(AnalyticTypes.participation,
+                                            reclaim=True), [])
+        with patch.object(
+                timezone, "now",
+                return_value=datestring_to_datetime("2021-04-02T12:11:00.0Z")):
             # assert reclaiming participation jobs
             claimed_participation_jobs = \
-                mock_jm.claim_batch_of_jobs(AnalyticTypes.participation)
+                mock_jm.claim_batch_of_jobs(AnalyticTypes.participation,
+                                            reclaim=True)
             self.assertEqual(len(claimed_participation_jobs), 1)
             for job in claimed_participation_jobs:
                 self.assertEqual(job.status, "claimed")
                 self.assertEqual(job.type.type, AnalyticTypes.participation)
             self.assertEqual(mock_jm.get_pending_jobs.called, True)
-            self.assertEqual(mock_jm.get_pending_or_running_jobs.called,
-                             True)
+            mock_jm.get_expired_lease_jobs.assert_called_with(
+                AnalyticTypes.participation, 600)
+
+
+class TestUserManager(TestCase):
+
+    fixtures = ['data_aggregator/fixtures/mock_data/da_user.json']
+
+    def test_get_user_ids(self):
+        user_ids = User.objects.get_user_ids([3179956, 3179219, 999999999])
+        self.assertEqual(
+            user_ids,
+            {3179956: User.objects.get(canvas_user_id=3179956).id,
+             3179219: User.objects.get(canvas_user_id=3179219).id})
+        self.assertEqual(User.objects.get_user_ids([]), {})
+
+    def test_get_users_for_adviser_refresh(self):
+        now = timezone.now()
+        term = Term.objects.create(sis_term_id="2013-spring")
+        User.objects.set_advisers_checked(
+            list(User.objects.values_list("id", flat=True)), now)
+        # stale advisers
+        User.objects.filter(canvas_user_id=3199810).update(
+            advisers_checked=now - timedelta(days=10))
+        # new user whose advisers were never checked
+        User.objects.filter(canvas_user_id=3173257).update(
+            advisers_checked=None)
+        # enrolled user with fresh advisers
+        Enrollment.objects.create(term=term, canvas_course_id=1,
+                                  canvas_user_id=3193350)
+        # inactive user that was never checked isn't refreshed
+        User.objects.filter(canvas_user_id=3134869).update(
+            status="inactive", advisers_checked=None)
+
+        users = User.objects.get_users_for_adviser_refresh(
+            now - timedelta(days=7), term)
+        self.assertEqual(
+            sorted(user.canvas_user_id for user in users),
+            [3173257, 3193350, 3199810])
+
+
+class TestJobStudentProgressManager(TestCase):
+
+    fixtures = ['data_aggregator/fixtures/mock_data/da_job.json',
+                'data_aggregator/fixtures/mock_data/da_jobtype.json']
+
+    def test_record_saved_students(self):
+        job = Job.objects.get(id=1)
+        other_job = Job.objects.get(id=2)
+        self.assertEqual(
+            JobStudentProgress.objects.get_saved_student_ids(job), set())
+        JobStudentProgress.objects.record_saved_students(job, [1, 2])
+        # recording a student twice is ignored
+        JobStudentProgress.objects.record_saved_students(job, [2, 3])
+        JobStudentProgress.objects.record_saved_students(other_job, [4])
+        self.assertEqual(
+            JobStudentProgress.objects.get_saved_student_ids(job), {1, 2, 3})
+        self.assertEqual(
+            JobStudentProgress.objects.get_saved_student_ids(other_job), {4})
+        JobStudentProgress.objects.record_saved_students(job, [])
+        self.assertEqual(JobStudentProgress.objects.count(), 4)
+
+    def test_restart_job_clears_progress(self):
+        job = Job.objects.get(id=1)
+        other_job = Job.objects.get(id=2)
+        JobStudentProgress.objects.record_saved_students(job, [1, 2])
+        JobStudentProgress.objects.record_saved_students(other_job, [3])
+        # resuming keeps the saved students
+        job.restart_job(resume=True)
+        self.assertEqual(
+            JobStudentProgress.objects.get_saved_student_ids(job), {1, 2})
+        # a restart reloads the job from scratch
+        Job.objects.restart_jobs([job.id])
+        self.assertEqual(
+            JobStudentProgress.objects.get_saved_student_ids(job), set())
+        self.assertEqual(
+            JobStudentProgress.objects.get_saved_student_ids(other_job), {3})
 
 
 class TestAssignmentManager(TestCase):
 
     fixtures = ['data_aggregator/fixtures/mock_data/da_assignment.json',
+                ('data_aggregator/fixtures/mock_data/'
+                 'da_assignmentdefinition.json'),
                 'data_aggregator/fixtures/mock_data/da_course.json',
                 'data_aggregator/fixtures/mock_data/da_job.json',
                 'data_aggregator/fixtures/mock_data/da_jobtype.json',
@@ -586,23 +782,11 @@ class TestAssignmentManager(TestCase):
                 'data_aggregator/fixtures/mock_data/da_user.json',
                 'data_aggregator/fixtures/mock_data/da_week.json']
 
-    @patch("data_aggregator.models.Assignment")
-    @patch("data_aggregator.models.User.objects.get")
-    def test_create_or_update_assignment(self, mock_user_get,
-                                         mock_assignment):
-        job = Job()
-        user = User()
-        term = Term()
-        week = Week()
-        week.week = 1
-        week.term = term
-
-        course = Course()
-        course.term = term
-
-        raw_assign_dict = {
-            'assignment_id': 6418106,
-            'title': 'Basic python, submission',
+    def _get_raw_assign_dict(self, canvas_user_id, assignment_id,
+                             title='Basic python, submission'):
+        return {
+            'assignment_id': assignment_id,
+            'title': title,
             'unlock_at': None,
             'points_possible': 2.0,
             'non_digital_submission': False,
@@ -621,55 +805,109 @@ class TestAssignmentManager(TestCase):
                 'posted_at': '2021-07-01T16:27:44Z',
                 'score': 2.0,
                 'submitted_at': '2021-06-25T05:47:51Z'},
-            'canvas_user_id': 3933194,
-            'canvas_course_id': 1458152}
-
-        mock_user_get.return_value = user
-
-        # check for create
-        assign, created = Assignment.objects.create_or_update_assignment(
-                                            job, week, course, raw_assign_dict)
-
-        mock_user_get.assert_called_once()
-        mock_assignment_inst = mock_assignment()
-        mock_assignment_inst.save.assert_called_once()
-
-        self.assertEqual(created, True)
-
-        self.assertEqual(assign.job, job)
-        self.assertEqual(assign.week, week)
-        self.assertEqual(assign.course, course)
-        self.assertEqual(assign.user, user)
-        self.assertEqual(assign.assignment_id,
-                         raw_assign_dict["assignment_id"])
-        self.assertEqual(assign.title, raw_assign_dict["title"])
-        self.assertEqual(assign.unlock_at, raw_assign_dict["unlock_at"])
-        self.assertEqual(assign.points_possible,
+            'canvas_user_id': canvas_user_id,
+            'canvas_course_id': 831726}
+
+    def test_bulk_create_or_update_assignments(self):
+        job = Job.objects.get(id=1)
+        course = Course.objects.get(id=303)
+        week = Week.objects.get(id=3)
+        user = User.objects.get(canvas_user_id=3179219)
+        existing = Assignment.objects.get(id=1)
+        initial_count = Assignment.objects.count()
+
+        raw_assign_dicts = [
+            # update of an existing assignment
+            self._get_raw_assign_dict(3179219, existing.assignment_id,
+                                      title="Updated Title"),
+            # new assignment, duplicated within the batch
+            self._get_raw_assign_dict(3179219, 6418106, title="First"),
+            self._get_raw_assign_dict(3179219, 6418106, title="Last"),
+            # unknown user
+            self._get_raw_assign_dict(999999999, 6418106)]
+
+        saved, skipped = \
+            Assignment.objects.bulk_create_or_update_assignments(
+                job, week, course, raw_assign_dicts)
+        self.assertEqual(saved, 2)
+        self.assertEqual(skipped, 1)
+        self.assertEqual(Assignment.objects.count(), initial_count + 1)
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.definition.title, "Updated Title")
+        self.assertEqual(existing.job, job)
+
+        assign = Assignment.objects.get(user=user, course=course, week=week,
+                                        assignment_id=6418106)
+        raw_assign_dict = raw_assign_dicts[2]
+        definition = assign.definition
+        self.assertEqual((definition.course, definition.week,
+                          definition.assignment_id),
+                         (course, week, 6418106))
+        self.assertEqual(definition.title, "Last")
+        self.assertEqual(definition.unlock_at, raw_assign_dict["unlock_at"])
+        self.assertEqual(definition.points_possible,
                          raw_assign_dict["points_possible"])
-        self.assertEqual(assign.non_digital_submission,
-                         raw_assign_dict["non_digital_submission"])
-        self.assertEqual(assign.due_at, raw_assign_dict["due_at"])
+        self.assertEqual(definition.max_score, raw_assign_dict["max_score"])
+        self.assertEqual(definition.median, raw_assign_dict["median"])
         self.assertEqual(assign.status, raw_assign_dict["status"])
-        self.assertEqual(assign.muted, raw_assign_dict["muted"])
-        self.assertEqual(assign.max_score, raw_assign_dict["max_score"])
-        self.assertEqual(assign.first_quartile,
-                         raw_assign_dict["first_quartile"])
-        self.assertEqual(assign.median, raw_assign_dict["median"])
-        self.assertEqual(assign.third_quartile,
-                         raw_assign_dict["third_quartile"])
         self.assertEqual(assign.excused, raw_assign_dict["excused"])
+        # an assignment has one definition per course and week
+        self.assertEqual(
+            AssignmentDefinition.objects.filter(
+                course=course, week=week, assignment_id=6418106).count(), 1)
         submission = raw_assign_dict["submission"]
         self.assertEqual(assign.score, submission["score"])
-        self.assertEqual(assign.posted_at, submission["posted_at"])
-        self.assertEqual(assign.submitted_at, submission["submitted_at"])
 
-        # check update
-        mock_assignment_inst.save.side_effect = IntegrityError
-        mock_existing_assignment = mock_assignment.objects.get.return_value
-        _, created = Assignment.objects.create_or_update_assignment(
-                                        job, week, course, raw_assign_dict)
-        self.assertEqual(created, False)
-        mock_existing_assignment.save.assert_called_once()
+        # empty batch is a no-op
+        self.assertEqual(
+            Assignment.objects.bulk_create_or_update_assignments(
+                job, week, course, []),
+            (0, 0))
+
+    def test_bulk_create_or_update_assignments_delta(self):
+        job = Job.objects.get(id=1)
+        course = Course.objects.get(id=303)
+        previous_week = Week.objects.get(id=3)
+        week = Week.objects.get(id=4)
+        Assignment.objects.filter(course=course).delete()
+        unchanged = self._get_raw_assign_dict(3179219, 6418105)
+        changed = self._get_raw_assign_dict(3179219, 6418106)
+        Assignment.objects.bulk_create_or_update_assignments(
+            job, previous_week, course, [unchanged, changed],
+            scd_storage=True)
+        self.assertEqual(Assignment.objects.filter(course=course).count(), 2)
+        changed["title"] = "Changed Title"
+
+        with patch.object(Assignment.objects, "bulk_create",
+                          wraps=Assignment.objects.bulk_create) as mock_bulk:
+            saved, skipped = \
+                Assignment.objects.bulk_create_or_update_assignments(
+                    job, week, course, [unchanged, changed],
+                    scd_storage=True)
+            # only the changed assignment is written
+            self.assertEqual(len(list(mock_bulk.call_args.args[0])), 1)
+        self.assertEqual((saved, skipped), (2, 0))
+        self.assertEqual(Assignment.objects.filter(course=course).count(), 3)
+
+        # the unchanged assignment's version is extended through the week
+        carried = Assignment.objects.get(course=course,
+                                         assignment_id=6418105)
+        self.assertEqual((carried.week, carried.valid_from_week,
+                          carried.valid_to_week),
+                         (previous_week, 3, 4))
+        self.assertEqual(
+            Assignment.objects.get(course=course, week=week,
+                                   assignment_id=6418106).definition.title,
+            "Changed Title")
+
+        # running the delta again for the same week writes nothing
+        with patch.object(Assignment.objects, "bulk_create") as mock_bulk:
+            saved, _ = Assignment.objects.bulk_create_or_update_assignments(
+                job, week, course, [unchanged, changed], scd_storage=True)
+            mock_bulk.assert_not_called()
+        self.assertEqual(saved, 2)
+        self.assertEqual(Assignment.objects.filter(course=course).count(), 3)
 
     def test_integrity_error(self):
         # assert that saving a non unique participation raises an integrity
@@ -681,18 +919,8 @@ class TestAssignmentManager(TestCase):
         duplicate_assign.week = assign.week
         duplicate_assign.user = assign.user
         duplicate_assign.assignment_id = assign.assignment_id
-        duplicate_assign.title = assign.title
-        duplicate_assign.unlock_at = assign.unlock_at
-        duplicate_assign.points_possible = assign.points_possible
-        duplicate_assign.non_digital_submission = assign.non_digital_submission
-        duplicate_assign.due_at = assign.due_at
+        duplicate_assign.definition = assign.definition
         duplicate_assign.status = assign.status
-        duplicate_assign.muted = assign.muted
-        duplicate_assign.min_score = assign.min_score
-        duplicate_assign.max_score = assign.max_score
-        duplicate_assign.first_quartile = assign.first_quartile
-        duplicate_assign.median = assign.median
-        duplicate_assign.third_quartile = assign.third_quartile
         duplicate_assign.excused = assign.excused
         duplicate_assign.score = assign.score
         duplicate_assign.posted_at = assign.posted_at
@@ -700,6 +928,12 @@ class TestAssignmentManager(TestCase):
         with self.assertRaises(IntegrityError):
             duplicate_assign.save()
 
+    def test_with_definitions(self):
+        assign = Assignment.objects.with_definitions().get(id=1)
+        self.assertEqual(assign.title, "Lesson 2 Quiz")
+        self.assertEqual(assign.points_possible, 20)
+        self.assertEqual(assign.median, 13)
+
 
 class TestParticipationManager(TestCase):
 
@@ -711,22 +945,9 @@ class TestParticipationManager(TestCase):
                 'data_aggregator/fixtures/mock_data/da_user.json',
                 'data_aggregator/fixtures/mock_data/da_week.json']
 
-    @patch("data_aggregator.models.Participation")
-    @patch("data_aggregator.models.User.objects.get")
-    def test_create_or_update_participation(self, mock_user_get,
-                                            mock_participation):
-        job = Job()
-        user = User()
-        term = Term()
-        week = Week()
-        week.week = 1
-        week.term = term
-
-        course = Course()
-        course.term = term
-
-        raw_partic_dict = {
-            'page_views': 9,
+    def _get_raw_partic_dict(self, canvas_user_id, page_views=9):
+        return {
+            'page_views': page_views,
             'max_page_views': 9,
             'page_views_level': 3,
             'participations': 0,
@@ -738,51 +959,160 @@ class TestParticipationManager(TestCase):
                 'on_time': 0,
                 'floating': 0,
                 'total': 0},
-            'canvas_user_id': 3193994,
-            'canvas_course_id': 835454}
-
-        mock_user_get.return_value = user
-
-        # check for create
-        partic, created = Participation.objects.create_or_update_participation(
-                                            job, week, course, raw_partic_dict)
-
-        mock_user_get.assert_called_once()
-        mock_participation_inst = mock_participation()
-        mock_participation_inst.save.assert_called_once()
-
-        self.assertEqual(created, True)
-
+            'canvas_user_id': canvas_user_id,
+            'canvas_course_id': 831726}
+
+    def test_bulk_create_or_update_participations(self):
+        job = Job.objects.get(id=2)
+        course = Course.objects.get(id=303)
+        week = Week.objects.get(id=3)
+        existing = Participation.objects.get(id=1)
+        new_user = User.objects.exclude(
+            id__in=Participation.objects.filter(
+                course=course, week=week).values("user")).first()
+        initial_count = Participation.objects.count()
+
+        raw_partic_dicts = [
+            # update of an existing participation
+            self._get_raw_partic_dict(existing.user.canvas_user_id,
+                                      page_views=1),
+            # new participation, duplicated within the batch
+            self._get_raw_partic_dict(new_user.canvas_user_id, page_views=2),
+            self._get_raw_partic_dict(new_user.canvas_user_id, page_views=3),
+            # unknown user
+            self._get_raw_partic_dict(999999999)]
+
+        saved, skipped = \
+            Participation.objects.bulk_create_or_update_participations(
+                job, week, course, raw_partic_dicts)
+        self.assertEqual(saved, 2)
+        self.assertEqual(skipped, 1)
+        self.assertEqual(Participation.objects.count(), initial_count + 1)
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.page_views, 1)
+        self.assertEqual(existing.time_total, 0)
+
+        partic = Participation.objects.get(user=new_user, course=course,
+                                           week=week)
+        raw_partic_dict = raw_partic_dicts[2]
+        self.assertEqual(partic.page_views, 3)
         self.assertEqual(partic.job, job)
-        self.assertEqual(partic.week, week)
-        self.assertEqual(partic.course, course)
-        self.assertEqual(partic.user, user)
-        self.assertEqual(partic.page_views, raw_partic_dict["page_views"])
         self.assertEqual(partic.max_page_views,
                          raw_partic_dict["max_page_views"])
         self.assertEqual(partic.page_views_level,
                          raw_partic_dict["page_views_level"])
         self.assertEqual(partic.participations,
                          raw_partic_dict["participations"])
-        self.assertEqual(partic.max_participations,
-                         raw_partic_dict["max_participations"])
-        self.assertEqual(partic.participations_level,
-                         raw_partic_dict["participations_level"])
         tardiness_breakdown = raw_partic_dict["tardiness_breakdown"]
         self.assertEqual(partic.time_missing, tardiness_breakdown["missing"])
-        self.assertEqual(partic.time_late, tardiness_breakdown["late"])
-        self.assertEqual(partic.time_on_time, tardiness_breakdown["on_time"])
-        self.assertEqual(partic.time_floating, tardiness_breakdown["floating"])
         self.assertEqual(partic.time_total, tardiness_breakdown["total"])
 
-        # check update
-        mock_participation_inst.save.side_effect = IntegrityError
-        mock_existing_participation = \
-            mock_participation.objects.get.return_value
-        _, created = Participation.objects.create_or_update_participation(
-                                        job, week, course, raw_partic_dict)
-        self.assertEqual(created, False)
-        mock_existing_participation.save.assert_called_once()
+    def test_bulk_create_or_update_participations_delta(self):
+        job = Job.objects.get(id=2)
+        course = Course.objects.get(id=303)
+        previous_week = Week.objects.get(id=3)
+        week = Week.objects.get(id=4)
+        existing = Participation.objects.get(id=1)
+        unchanged = self._get_raw_partic_dict(existing.user.canvas_user_id)
+        Participation.objects.bulk_create_or_update_participations(
+            job, previous_week, course, [unchanged], scd_storage=True)
+        Participation.objects.filter(course=course, week=week).delete()
+        initial_count = Participation.objects.count()
+
+        with patch.object(Participation.objects, "bulk_create") as mock_bulk:
+            saved, skipped = \
+                Participation.objects.bulk_create_or_update_participations(
+                    job, week, course, [unchanged], scd_storage=True)
+            # unchanged participations aren't written again
+            mock_bulk.assert_not_called()
+        self.assertEqual((saved, skipped), (1, 0))
+        self.assertEqual(Participation.objects.count(), initial_count)
+        existing.refresh_from_db()
+        self.assertEqual((existing.valid_from_week, existing.valid_to_week),
+                         (previous_week.week, week.week))
+
+    def test_bulk_create_or_update_participations_scd(self):
+        job = Job.objects.get(id=2)
+        course = Course.objects.get(id=303)
+        week_3, week_4, week_5 = [Week.objects.get(id=week_id)
+                                  for week_id in (3, 4, 5)]
+        Participation.objects.filter(course=course).delete()
+        user_1, user_2 = User.objects.order_by("id")[:2]
+        unchanged = self._get_raw_partic_dict(user_1.canvas_user_id)
+        changed = self._get_raw_partic_dict(user_2.canvas_user_id)
+
+        def get_versions():
+            return list(Participation.objects
+                        .filter(course=course)
+                        .order_by("user_id", "valid_from_week")
+                        .values_list("user_id", "valid_from_week",
+                                     "valid_to_week", "page_views"))
+
+        Participation.objects.bulk_create_or_update_participations(
+            job, week_3, course, [unchanged, changed], scd_storage=True)
+        self.assertEqual(get_versions(), [(user_1.id, 3, 3, 9),
+                                          (user_2.id, 3, 3, 9)])
+
+        # the unchanged participation extends its version through week 4
+        # and the changed participation starts a new version. saving the
+        # week again doesn't change anything.
+        changed["page_views"] = 1
+        for _ in range(2):
+            saved, skipped = \
+                Participation.objects.bulk_create_or_update_participations(
+                    job, week_4, course, [unchanged, changed],
+                    scd_storage=True)
+            self.assertEqual((saved, skipped), (2, 0))
+            self.assertEqual(get_versions(), [(user_1.id, 3, 4, 9),
+                                              (user_2.id, 3, 3, 9),
+                                              (user_2.id, 4, 4, 1)])
+
+        Participation.objects.bulk_create_or_update_participations(
+            job, week_5, course, [unchanged, changed], scd_storage=True)
+        self.assertEqual(get_versions(), [(user_1.id, 3, 5, 9),
+                                          (user_2.id, 3, 3, 9),
+                                          (user_2.id, 4, 5, 1)])
+
+    def test_bulk_create_or_update_participations_scd_rerun(self):
+        job = Job.objects.get(id=2)
+        course = Course.objects.get(id=303)
+        week_1, week_2, week_3 = [Week.objects.get(id=week_id)
+                                  for week_id in (1, 2, 3)]
+        Participation.objects.filter(course=course).delete()
+        user_1, user_2, user_3 = User.objects.order_by("id")[:3]
+
+        def save_week(week, page_views):
+            Participation.objects.bulk_create_or_update_participations(
+                job, week, course,
+                [self._get_raw_partic_dict(user.canvas_user_id,
+                                           page_views=views)
+                 for user, views in zip([user_1, user_2, user_3],
+                                        page_views)],
+                scd_storage=True)
+
+        def get_versions(user):
+            return list(Participation.objects
+                        .filter(course=course, user=user)
+                        .order_by("valid_from_week")
+                        .values_list("week_id", "valid_from_week",
+                                     "valid_to_week", "page_views"))
+
+        save_week(week_1, [9, 9, 9])
+        save_week(week_2, [9, 1, 9])
+        # rerunning week 1 keeps the analytics of week 2
+        save_week(week_1, [5, 9, 9])
+        self.assertEqual(get_versions(user_1), [(1, 1, 1, 5), (2, 2, 2, 9)])
+        self.assertEqual(get_versions(user_2), [(1, 1, 1, 9), (2, 2, 2, 1)])
+        self.assertEqual(get_versions(user_3), [(1, 1, 2, 9)])
+
+        save_week(week_3, [9, 1, 9])
+        # rerunning week 2 splits the version of user 3 around week 2
+        save_week(week_2, [9, 1, 7])
+        self.assertEqual(get_versions(user_1), [(1, 1, 1, 5), (2, 2, 3, 9)])
+        self.assertEqual(get_versions(user_2), [(1, 1, 1, 9), (2, 2, 3, 1)])
+        self.assertEqual(get_versions(user_3), [(1, 1, 1, 9), (2, 2, 2, 7),
+                                                (3, 3, 3, 9)])
 
     def test_integrity_error(self):
         # assert that saving a non unique participation raises an integrity
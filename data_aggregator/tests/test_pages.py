@@ -74,9 +74,10 @@ class TestJobAdminDetailView(BaseViewTestCase):
 
         mock_job["type"] = AnalyticTypes.assignment
         related_objects = job_detail_view.get_related_objects()
-        mock_assignment.objects.filter.assert_called_with(
+        mock_assignments = mock_assignment.objects.with_definitions()
+        mock_assignments.filter.assert_called_with(
             job__id=mock_job["id"])
-        mock_assignment.objects.filter().values.assert_called()
+        mock_assignments.filter().values.assert_called()
         mock_related_objects = \
             mock_participation.objects.filter().values.return_value
         self.assertEqual(related_objects, list(mock_related_objects))
@@ -0,0 +1,91 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+import unittest
+from django.test import TestCase
+from data_aggregator.models import Term, Week
+from data_aggregator.partitions import create_week_partitions, \
+    drop_week_partitions, get_partition_name
+from mock import MagicMock, call, patch
+
+
+class TestPartitions(TestCase):
+
+    def get_connection(self, partitioned=True, existing=True):
+        connection = MagicMock()
+        connection.vendor = "postgresql"
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.side_effect = lambda: (
+            (1 if partitioned else None) if "pg_partitioned_table" in
+            cursor.execute.call_args[0][0] else
+            ("partition" if existing else None,))
+        return connection, cursor
+
+    def get_statements(self, cursor):
+        return [c[0][0] for c in cursor.execute.call_args_list
+                if not c[0][0].startswith("SELECT")]
+
+    def test_get_partition_name(self):
+        self.assertEqual(
+            get_partition_name("data_aggregator_assignment", 12),
+            "data_aggregator_assignment_week_12")
+
+    def test_create_week_partitions(self):
+        connection, cursor = self.get_connection()
+        create_week_partitions(12, using=connection)
+        self.assertEqual(self.get_statements(cursor), [
+            'CREATE TABLE IF NOT EXISTS '
+            '"data_aggregator_assignment_week_12" PARTITION OF '
+            '"data_aggregator_assignment" FOR VALUES IN (12)',
+            'CREATE TABLE IF NOT EXISTS '
+            '"data_aggregator_participation_week_12" PARTITION OF '
+            '"data_aggregator_participation" FOR VALUES IN (12)'])
+
+        # tables that aren't partitioned are left alone
+        connection, cursor = self.get_connection(partitioned=False)
+        create_week_partitions(12, using=connection)
+        self.assertEqual(self.get_statements(cursor), [])
+
+    def test_drop_week_partitions(self):
+        connection, cursor = self.get_connection()
+        self.assertTrue(drop_week_partitions([12], using=connection))
+        self.assertEqual(self.get_statements(cursor), [
+            'ALTER TABLE "data_aggregator_assignment" DETACH PARTITION '
+            '"data_aggregator_assignment_week_12"',
+            'DROP TABLE "data_aggregator_assignment_week_12"',
+            'ALTER TABLE "data_aggregator_participation" DETACH PARTITION '
+            '"data_aggregator_participation_week_12"',
+            'DROP TABLE "data_aggregator_participation_week_12"'])
+
+        # weeks without partitions are skipped
+        connection, cursor = self.get_connection(existing=False)
+        self.assertTrue(drop_week_partitions([12], using=connection))
+        self.assertEqual(self.get_statements(cursor), [])
+
+        # nothing is dropped when the tables aren't partitioned
+        connection, cursor = self.get_connection(partitioned=False)
+        self.assertFalse(drop_week_partitions([12], using=connection))
+        self.assertEqual(self.get_statements(cursor), [])
+
+    def test_other_databases(self):
+        # partitioning is a no-op on databases other than postgresql
+        connection = MagicMock()
+        connection.vendor = "sqlite"
+        self.assertFalse(drop_week_partitions([12], using=connection))
+        create_week_partitions(12, using=connection)
+        connection.cursor.assert_not_called()
+
+    @patch("data_aggregator.models.partitions")
+    def test_week_created(self, mock_partitions):
+        term = Term.objects.create(sis_term_id="2013-spring")
+        week = Week.objects.create(term=term, week=1)
+        mock_partitions.create_week_partitions.assert_called_once_with(
+            week.id)
+        week.save()
+        self.assertEqual(mock_partitions.create_week_partitions.call_args_list,
+                         [call(week.id)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+# Copyright 2026 UW-IT, University of Washington
+# SPDX-License-Identifier: Apache-2.0
+
+
+import unittest
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from data_aggregator.models import CanvasRateLimit
+from data_aggregator.ratelimit import CanvasRateLimiter, \
+    RateLimitedCanvasLiveDAO, is_throttled
+from mock import MagicMock, patch
+
+
+class TestCanvasRateLimiter(TestCase):
+
+    def get_rate_limiter(self):
+        return CanvasRateLimiter(low_water=200, high_water=500, step=0.01,
+                                 max_interval=1, sync_interval=0,
+                                 stale_after=60)
+
+    def test_record_response(self):
+        rate_limiter = self.get_rate_limiter()
+        # plenty of quota remaining with no backoff
+        rate_limiter.record_response(remaining=700)
+        self.assertEqual(rate_limiter.interval, 0.0)
+        # throttled request backs off multiplicatively
+        rate_limiter.record_response(throttled=True)
+        self.assertEqual(rate_limiter.interval, 0.01)
+        rate_limiter.record_response(remaining=100)
+        self.assertEqual(rate_limiter.interval, 0.02)
+        rate_limiter.record_response(remaining=100)
+        self.assertEqual(rate_limiter.interval, 0.04)
+        # backoff is capped
+        for _ in range(10):
+            rate_limiter.record_response(throttled=True)
+        self.assertEqual(rate_limiter.interval, 1)
+        # quota between the water marks holds the interval
+        rate_limiter.record_response(remaining=300)
+        self.assertEqual(rate_limiter.interval, 1)
+        # missing header holds the interval
+        rate_limiter.record_response()
+        self.assertEqual(rate_limiter.interval, 1)
+        # plenty of quota remaining speeds up additively
+        rate_limiter.record_response(remaining=600)
+        self.assertAlmostEqual(rate_limiter.interval, 0.99)
+
+    @patch("data_aggregator.ratelimit.time")
+    def test_acquire(self, mock_time):
+        mock_time.monotonic.return_value = 100.0
+        rate_limiter = self.get_rate_limiter()
+        rate_limiter.interval = 0.5
+        rate_limiter.acquire()
+        mock_time.sleep.assert_not_called()
+        # next request waits for the interval
+        rate_limiter.acquire()
+        mock_time.sleep.assert_called_once_with(0.5)
+        mock_time.sleep.reset_mock()
+        rate_limiter.acquire()
+        mock_time.sleep.assert_called_once_with(1.0)
+        # shared interval from other processes takes precedence
+        mock_time.sleep.reset_mock()
+        mock_time.monotonic.return_value = 200.0
+        rate_limiter.shared_interval = 2.0
+        rate_limiter.acquire()
+        rate_limiter.acquire()
+        mock_time.sleep.assert_called_once_with(2.0)
+
+    def test_sync(self):
+        rate_limiter = self.get_rate_limiter()
+        rate_limiter.interval = 0.2
+        rate_limiter.sync()
+        self.assertEqual(rate_limiter.shared_interval, 0.2)
+        self.assertEqual(
+            CanvasRateLimit.objects.get(process=rate_limiter.process).interval,
+            0.2)
+
+        # other processes that backed off slow this process down
+        CanvasRateLimit.objects.create(process="other-1", interval=0.8)
+        rate_limiter.sync()
+        self.assertEqual(rate_limiter.shared_interval, 0.8)
+        self.assertEqual(rate_limiter.get_interval(), 0.8)
+
+        # stale processes are ignored and removed
+        CanvasRateLimit.objects.filter(process="other-1").update(
+            updated=timezone.now() - timedelta(seconds=120))
+        rate_limiter.sync()
+        self.assertEqual(rate_limiter.shared_interval, 0.2)
+        self.assertFalse(
+            CanvasRateLimit.objects.filter(process="other-1").exists())
+
+
+class TestRateLimitedCanvasLiveDAO(TestCase):
+
+    def get_response(self, status=200, remaining=None, data=b""):
+        response = MagicMock()
+        response.status = status
+        response.data = data
+        response.headers = ({"X-Rate-Limit-Remaining": remaining}
+                            if remaining is not None else {})
+        return response
+
+    def test_is_throttled(self):
+        self.assertFalse(is_throttled(self.get_response()))
+        self.assertFalse(is_throttled(self.get_response(status=403)))
+        self.assertTrue(is_throttled(self.get_response(
+            status=403, data=b"403 Forbidden (Rate Limit Exceeded)")))
+        self.assertTrue(is_throttled(self.get_response(
+            status=403, data="403 Forbidden (Rate Limit Exceeded)")))
+
+    @patch("data_aggregator.ratelimit.get_rate_limiter")
+    @patch("data_aggregator.ratelimit.LiveDAO.load")
+    def test_load(self, mock_load, mock_get_rate_limiter):
+        mock_rate_limiter = mock_get_rate_limiter.return_value
+        response = self.get_response(remaining="512.5")
+        mock_load.return_value = response
+        dao = RateLimitedCanvasLiveDAO.__new__(RateLimitedCanvasLiveDAO)
+        self.assertEqual(dao.load("GET", "/api/v1/courses/1", {}, None),
+                         response)
+        mock_rate_limiter.acquire.assert_called_once()
+        mock_rate_limiter.record_response.assert_called_once_with(
+            remaining=512.5, throttled=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
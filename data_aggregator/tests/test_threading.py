@@ -6,8 +6,9 @@ import queue
 import unittest
 from django.test import TestCase
 from multiprocessing import Queue
-from data_aggregator.threads import ThreadPool, PersistentThread
-from mock import MagicMock
+from data_aggregator.threads import ProcessPool, ThreadPool, \
+    PersistentThread, Heartbeat
+from mock import MagicMock, patch
 
 
 class TestThreadPool(TestCase):
@@ -74,5 +75,53 @@ class TestThreadPool(TestCase):
         pool.map(bad_job, [9, 4, 3, 1, 1])
 
 
+class TestProcessPool(TestCase):
+
+    @patch("data_aggregator.threads.connections")
+    def test_map(self, mock_connections):
+        with ProcessPool(processes=2, threads_per_process=2) as pool:
+            result_queue = pool.context.Queue()
+
+            def run_job(value):
+                if value == 3:
+                    raise ValueError("bad value")
+                result_queue.put(value + 1)
+
+            exitcodes = pool.map(run_job, [1, 2, 3, 4, 5])
+        # a failing value doesn't stop the worker processes
+        self.assertEqual(exitcodes, [0, 0])
+        mock_connections.close_all.assert_called_once()
+        processed_values = [result_queue.get(timeout=10) for _ in range(4)]
+        self.assertEqual(sorted(processed_values), [2, 3, 5, 6])
+        self.assertTrue(result_queue.empty())
+
+
+class TestHeartbeat(TestCase):
+
+    @patch("data_aggregator.threads.connection")
+    def test_heartbeat(self, mock_connection):
+        beats = Queue()
+        with Heartbeat(lambda: beats.put(True), 0.01) as heartbeat:
+            # wait for at least two beats
+            beats.get(timeout=5)
+            beats.get(timeout=5)
+        self.assertFalse(heartbeat.thread.is_alive())
+        mock_connection.close.assert_called_once_with()
+
+    @patch("data_aggregator.threads.connection")
+    def test_heartbeat_error(self, mock_connection):
+        beats = Queue()
+
+        def func():
+            beats.put(True)
+            raise Exception("lost connection")
+
+        with Heartbeat(func, 0.01) as heartbeat:
+            # the heartbeat keeps going after an error
+            beats.get(timeout=5)
+            beats.get(timeout=5)
+        self.assertFalse(heartbeat.thread.is_alive())
+
+
 if __name__ == "__main__":
     unittest.main()
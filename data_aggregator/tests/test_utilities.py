@@ -191,6 +191,21 @@ class TestUtilities(TestCase):
         self.assertEqual(utilities.get_sortable_term_id("2021-autumn"),
                          "2021-4")
 
+    def test_get_analytic_fingerprint(self):
+        fingerprint = utilities.get_analytic_fingerprint(
+            {"canvas_user_id": 1, "submission": {"score": 2.0}})
+        self.assertEqual(len(fingerprint), 32)
+        # key order doesn't change the fingerprint
+        self.assertEqual(
+            utilities.get_analytic_fingerprint(
+                {"submission": {"score": 2.0}, "canvas_user_id": 1}),
+            fingerprint)
+        # content does
+        self.assertNotEqual(
+            utilities.get_analytic_fingerprint(
+                {"canvas_user_id": 1, "submission": {"score": 1.0}}),
+            fingerprint)
+
 
 if __name__ == "__main__":
     unittest.main()
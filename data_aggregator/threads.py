@@ -2,8 +2,10 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
+import logging
+import multiprocessing
 import threading
-from django.db import connection
+from django.db import connection, connections
 
 
 class ThreadPool():
@@ -44,6 +46,101 @@ class ThreadPool():
         pass
 
 
+class ProcessPool():
+    """
+    Runs a function for each value in worker processes that each run a
+    number of threads. Values are distributed through a queue so they must
+    be picklable (e.g. job ids rather than jobs).
+    """
+
+    def __init__(self, processes=4, threads_per_process=1):
+        self.processes = processes
+        self.threads_per_process = threads_per_process
+        self.context = multiprocessing.get_context("fork")
+
+    def map(self, func, values):
+        value_queue = self.context.Queue()
+        for value in values:
+            value_queue.put(value)
+        # one stop sentinel per worker thread
+        for _ in range(self.processes * self.threads_per_process):
+            value_queue.put(None)
+
+        # forked processes must open their own db connections instead of
+        # sharing the parent's
+        connections.close_all()
+
+        workers = [self.context.Process(target=self._run_worker,
+                                        args=(func, value_queue))
+                   for _ in range(self.processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            if worker.exitcode != 0:
+                logging.error(f"Worker process {worker.pid} exited with "
+                              f"code {worker.exitcode}.")
+        return [worker.exitcode for worker in workers]
+
+    def _run_worker(self, func, value_queue):
+        threads = [JobThread(target=self._consume,
+                             args=(func, value_queue))
+                   for _ in range(self.threads_per_process)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _consume(self, func, value_queue):
+        while True:
+            value = value_queue.get()
+            if value is None:
+                break
+            try:
+                func(value)
+            except Exception as e:
+                logging.error(f"Unable to process {value}. {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        pass
+
+
+class Heartbeat():
+    """
+    Calls a function every interval seconds in a background thread while
+    the context is entered, e.g. to refresh the lease of a running job.
+    """
+
+    def __init__(self, func, interval):
+        self.func = func
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    self.func()
+                except Exception as e:
+                    logging.error(f"Heartbeat failed. {e}")
+        finally:
+            # close the thread's db connection, if it opened one
+            connection.close()
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stopped.set()
+        self.thread.join()
+
+
 class PersistentThread():
 
     def __init__(self):
@@ -5,6 +5,8 @@
 from datetime import date, datetime
 from zoneinfo import ZoneInfo
 from uw_sws import SWS_TIMEZONE
+import hashlib
+import json
 import os
 
 
@@ -12,6 +14,21 @@ def set_gcs_base_path(sis_term_id, week_num):
     os.environ["GCS_BASE_PATH"] = f"{sis_term_id}/{week_num}/"
 
 
+def get_analytic_fingerprint(raw_analytic_dict):
+    """
+    Returns a fingerprint of a raw analytic payload that only changes when
+    the payload content changes.
+
+    :param raw_analytic_dict: raw analytic dictionary downloaded from canvas
+    :type raw_analytic_dict: dict
+    :returns: md5 hex digest of the canonical json encoding of the payload
+    :type: str
+    """
+    canonical = json.dumps(raw_analytic_dict, sort_keys=True,
+                           separators=(",", ":"), default=str)
+    return hashlib.md5(canonical.encode("utf-8")).hexdigest()
+
+
 def datestring_to_datetime(date_str, tz_name="UTC"):
     """
     Converts an iso8601 date string to a datetime.datetime object
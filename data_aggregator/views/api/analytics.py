@@ -9,6 +9,7 @@ from rest_framework.generics import GenericAPIView
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.renderers import JSONRenderer
 from uw_saml.decorators import group_required
+from data_aggregator.dao import BaseDAO
 from data_aggregator.models import Assignment, Participation, User
 from data_aggregator.serializers import ParticipationSerializer, \
     AssignmentSerializer, UserSerializer
@@ -33,12 +34,21 @@ class BaseAnalyticsAPIView(GenericAPIView):
 
     def get_assignment_queryset(self):
         queryset = (
-            Assignment.objects.select_related()
+            Assignment.objects.with_definitions()
+            .select_related()
             .annotate(sis_account_id=F('course__sis_account_id'))
             .annotate(sis_term_id=F('week__term__sis_term_id'))
         )
         return queryset
 
+    def filter_week(self, queryset, week):
+        if BaseDAO().get_scd_storage_enabled():
+            # analytics are stored once for the range of weeks they are
+            # valid for
+            return queryset.filter(valid_from_week__lte=week,
+                                   valid_to_week__gte=week)
+        return queryset.filter(week__week=week)
+
     def get_participation_queryset(self):
         queryset = (
             Participation.objects.select_related()
@@ -67,7 +77,7 @@ class AccountParticipationView(BaseAnalyticsAPIView):
             queryset = queryset.filter(sis_term_id=sis_term_id)
         week = request.GET.get("week")
         if week:
-            queryset = queryset.filter(week__week=week)
+            queryset = self.filter_week(queryset, week)
         paginated_queryset = self.paginate_queryset(queryset)
         serializer = ParticipationSerializer(paginated_queryset, many=True)
         return self.get_paginated_response(serializer.data)
@@ -92,7 +102,7 @@ class AccountAssignmentView(BaseAnalyticsAPIView):
             queryset = queryset.filter(sis_term_id=sis_term_id)
         week = request.GET.get("week")
         if week:
-            queryset = queryset.filter(week__week=week)
+            queryset = self.filter_week(queryset, week)
 
         paginated_queryset = self.paginate_queryset(queryset)
         serializer = AssignmentSerializer(paginated_queryset, many=True)
@@ -114,7 +124,7 @@ class TermParticipationView(BaseAnalyticsAPIView):
             .filter(sis_term_id=sis_term_id))
         week = request.GET.get("week")
         if week:
-            queryset = queryset.filter(week__week=week)
+            queryset = self.filter_week(queryset, week)
 
         paginated_queryset = self.paginate_queryset(queryset)
         serializer = ParticipationSerializer(paginated_queryset, many=True)
@@ -136,7 +146,7 @@ class TermAssignmentView(BaseAnalyticsAPIView):
             .filter(sis_term_id=sis_term_id))
         week = request.GET.get("week")
         if week:
-            queryset = queryset.filter(week__week=week)
+            queryset = self.filter_week(queryset, week)
 
         paginated_queryset = self.paginate_queryset(queryset)
         serializer = AssignmentSerializer(paginated_queryset, many=True)
@@ -191,7 +201,7 @@ class UserParticipationView(BaseAnalyticsAPIView):
             queryset = queryset.filter(sis_term_id=sis_term_id)
         week = request.GET.get("week")
         if week:
-            queryset = queryset.filter(week__week=week)
+            queryset = self.filter_week(queryset, week)
 
         paginated_queryset = self.paginate_queryset(queryset)
         serializer = ParticipationSerializer(paginated_queryset, many=True)
@@ -217,7 +227,7 @@ class UserAssignmentView(BaseAnalyticsAPIView):
             queryset = queryset.filter(sis_term_id=sis_term_id)
         week = request.GET.get("week")
         if week:
-            queryset = queryset.filter(week__week=week)
+            queryset = self.filter_week(queryset, week)
 
         paginated_queryset = self.paginate_queryset(queryset)
         serializer = AssignmentSerializer(paginated_queryset, many=True)
@@ -5,11 +5,13 @@
 import json
 from data_aggregator.models import Job, JobStatusTypes
 from data_aggregator.views.api import RESTDispatch
-from django.db.models import F, Q, BooleanField, Value
+from django.db.models import F, Q, BooleanField, Count, Value
 
 
-def get_filtered_jobs_list(filters):
-    jobs = (Job.objects
+def get_filtered_jobs(filters):
+    # jobs that expired since the daemons last marked them are read as
+    # expired through current_status
+    jobs = (Job.objects.with_current_status()
             .annotate(
                 job_type=F('type__type'),
                 selected=Value(False, BooleanField())
@@ -33,28 +35,62 @@ def get_filtered_jobs_list(filters):
         jobs = jobs.filter(
             type__type__in=filters["jobType"])
 
-    total_jobs = 0
-    job_dicts = []
-    for job in jobs:
-        jd = {}
-        jd["id"] = job.id
-        jd["context"] = job.context
-        jd["job_type"] = job.job_type
-        jd["pid"] = job.pid
-        jd["start"] = job.start.isoformat() if job.start else None
-        jd["end"] = job.end.isoformat() if job.end else None
-        jd["message"] = job.message
-        jd["created"] = job.created.isoformat() if job.created else None
-        jd["status"] = job.status
-        jd["selected"] = job.selected
-        if filters.get('jobStatus'):
-            if job.status in filters["jobStatus"]:
-                job_dicts.append(jd)
-                total_jobs += 1
-        else:
-            job_dicts.append(jd)
-            total_jobs += 1
-    return total_jobs, job_dicts
+    if filters.get('jobStatus'):
+        jobs = jobs.filter(current_status__in=filters["jobStatus"])
+
+    return jobs
+
+
+# sortBy values mapped to the field they sort on. context fields are sorted
+# with "context.<key>".
+JOB_SORT_FIELDS = {
+    "id": "id",
+    "job_type": "type__type",
+    "status": "current_status",
+    "pid": "pid",
+    "start": "start",
+    "end": "end",
+    "message": "message",
+    "created": "created",
+}
+
+
+def get_job_ordering(sort_by, sort_desc=False):
+    """
+    Return order_by arguments for the given sortBy filter. Nulls sort
+    before other values in ascending order and after them in descending
+    order. Jobs are always ordered by id last so that pages are stable.
+    Raises ValueError for fields that can't be sorted on.
+    """
+    if not sort_by:
+        return ["id"]
+    if sort_by.startswith("context."):
+        key = sort_by[len("context."):]
+        if not key.isidentifier():
+            raise ValueError(f"Invalid context field {key}.")
+        field = f"context__{key}"
+    elif sort_by in JOB_SORT_FIELDS:
+        field = JOB_SORT_FIELDS[sort_by]
+    else:
+        raise ValueError(f"Unable to sort jobs by {sort_by}.")
+    if sort_desc:
+        return [F(field).desc(nulls_last=True), "-id"]
+    return [F(field).asc(nulls_first=True), "id"]
+
+
+def get_job_dict(job):
+    jd = {}
+    jd["id"] = job.id
+    jd["context"] = job.context
+    jd["job_type"] = job.job_type
+    jd["pid"] = job.pid
+    jd["start"] = job.start.isoformat() if job.start else None
+    jd["end"] = job.end.isoformat() if job.end else None
+    jd["message"] = job.message
+    jd["created"] = job.created.isoformat() if job.created else None
+    jd["status"] = job.current_status
+    jd["selected"] = job.selected
+    return jd
 
 
 class JobChartDataView(RESTDispatch):
@@ -69,14 +105,11 @@ class JobChartDataView(RESTDispatch):
     def post(self, request, *args, **kwargs):
         filters = json.loads(request.body.decode('utf-8'))
 
-        _, job_dicts = get_filtered_jobs_list(filters)
-
-        jobs_by_status = {}
-        for jd in job_dicts:
-            if jd["status"] not in jobs_by_status:
-                jobs_by_status[jd["status"]] = 1
-            else:
-                jobs_by_status[jd["status"]] += 1
+        jobs_by_status = dict(
+            get_filtered_jobs(filters)
+            .order_by()
+            .values_list('current_status')
+            .annotate(count=Count('id')))
 
         # make sure all possible job statuses are accounted for
         for job_status_type in JobStatusTypes.types():
@@ -99,24 +132,22 @@ class JobView(RESTDispatch):
     def post(self, request, *args, **kwargs):
         filters = json.loads(request.body.decode('utf-8'))
 
-        total_jobs, job_dicts = get_filtered_jobs_list(filters)
+        jobs = get_filtered_jobs(filters)
+        total_jobs = jobs.count()
 
-        # sort in code since the django doesn't support sorting by properties
-        sort_by = filters.get("sortBy")
-        if sort_by:
-            sort_desc = True if filters.get("sortDesc") else False
-            job_dicts = sorted(job_dicts,
-                               key=lambda job: ("" if job[sort_by] is None
-                                                else job[sort_by]),
-                               reverse=sort_desc)
+        try:
+            ordering = get_job_ordering(filters.get("sortBy"),
+                                        bool(filters.get("sortDesc")))
+        except ValueError as e:
+            return self.error_response(400, message=str(e))
 
-        # calculate pagination
+        # only load the requested page
         currPage = filters["currPage"]
         perPage = filters["perPage"]
         page_start = (currPage - 1) * perPage
         page_end = (currPage * perPage)
-        # get current page
-        job_dicts = job_dicts[page_start:page_end]
+        job_dicts = [get_job_dict(job) for job in
+                     jobs.order_by(*ordering)[page_start:page_end]]
 
         return self.json_response(content={"jobs": job_dicts,
                                            "total_jobs": total_jobs})
@@ -58,7 +58,8 @@ class JobAdminDetailView(DetailView):
         related_objects = []
         if job["type"] == AnalyticTypes.assignment:
             related_objects = \
-                Assignment.objects.filter(job__id=job["id"]).values()
+                Assignment.objects.with_definitions() \
+                .filter(job__id=job["id"]).values()
         elif job["type"] == AnalyticTypes.participation:
             related_objects = \
                 Participation.objects.filter(job__id=job["id"]).values()
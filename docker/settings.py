@@ -6,6 +6,10 @@ INSTALLED_APPS += [
     'rest_framework'
 ]
 
+CANVAS_RATE_LIMIT_ENABLED = (
+    os.getenv('ENV') != 'localdev' and
+    os.getenv('CANVAS_RATE_LIMIT_ENABLED', 'False') == 'True')
+
 if os.getenv('ENV') == 'localdev':
     DEBUG = True
     DATA_AGGREGATOR_ACCESS_GROUP = 'u_test_group'
@@ -18,6 +22,10 @@ else:
     DATA_AGGREGATOR_THREADING_ENABLED = True
     # Restclient cache configuration
     RESTCLIENTS_DAO_CACHE_CLASS = 'data_aggregator.cache.DataAggregatorGCSCache'
+    if CANVAS_RATE_LIMIT_ENABLED:
+        # pace live canvas requests with the shared adaptive rate limiter
+        RESTCLIENTS_CANVAS_DAO_CLASS = \
+            'data_aggregator.ratelimit.RateLimitedCanvasLiveDAO'
     if os.getenv('ENV') == 'test':
         GCS_BUCKET_NAME = 'canvas-analytics-test'
         RAD_METADATA_BUCKET_NAME = 'canvas-analytics-test'
@@ -46,4 +54,16 @@ else:
 
 
 RESTCLIENTS_CANVAS_POOL_SIZE = 20
+if os.getenv('CANVAS_RECORD_RESPONSES', 'False') == 'True':
+    # record canvas responses so that jobs can be benchmarked offline with
+    # the benchmark_jobs command. recorded requests are still paced when
+    # the rate limiter is enabled.
+    if CANVAS_RATE_LIMIT_ENABLED:
+        RESTCLIENTS_CANVAS_DAO_CLASS = \
+            'data_aggregator.canvas_replay.RateLimitedRecordingCanvasLiveDAO'
+    else:
+        RESTCLIENTS_CANVAS_DAO_CLASS = \
+            'data_aggregator.canvas_replay.RecordingCanvasLiveDAO'
+    DATA_AGGREGATOR_CANVAS_REPLAY_DIR = os.getenv(
+        'CANVAS_RECORDING_DIR', 'canvas_recordings')
 ACADEMIC_CANVAS_ACCOUNT_ID = '84378'